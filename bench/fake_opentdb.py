@@ -0,0 +1,126 @@
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CATEGORIES = ["General Knowledge", "Science &amp; Nature", "Entertainment: Japanese Anime &amp; Manga", "History"]
+
+class FakeOpenTDB:
+    """Local stand-in for opentdb.com/api.php with configurable latency and 429 rate.
+
+    Questions are entity-encoded like the real API, and every question text is
+    unique so repeat filtering behaves as it would against a large bank.
+    """
+
+    def __init__(self, port=0, latency=0.0, rate_429=0.0, seed=None):
+        self.latency = latency # Seconds added to every response
+        self.rate_429 = rate_429 # Fraction of requests answered with HTTP 429
+        self.random = random.Random(seed)
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/api.php"
+
+    def make_question(self, difficulty, question_type):
+        n = next(self.counter)
+        if question_type == 'boolean':
+            return {
+                "category": self.random.choice(CATEGORIES),
+                "type": "boolean",
+                "difficulty": difficulty,
+                "question": f"Is &quot;statement {n}&quot; true?",
+                "correct_answer": "True",
+                "incorrect_answers": ["False"]
+            }
+        return {
+            "category": self.random.choice(CATEGORIES),
+            "type": "multiple",
+            "difficulty": difficulty,
+            "question": f"Which option is correct for question #{n} &amp; why isn&#039;t it &lt;B&gt;?",
+            "correct_answer": f"Answer {n}",
+            "incorrect_answers": [f"Wrong {n}-{i}" for i in range(3)]
+        }
+
+    def respond(self, params):
+        """Returns (status, body) for one api.php request."""
+        with self.lock:
+            self.requests += 1
+            limited = self.random.random() < self.rate_429
+            if limited:
+                self.rate_limited += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if limited:
+            return 429, {"response_code": 5, "results": []}
+        amount = min(int(params.get('amount', 1)), 50)
+        difficulty = params.get('difficulty') or self.random.choice(['easy', 'medium', 'hard'])
+        question_type = params.get('type', 'multiple')
+        return 200, {
+            "response_code": 0,
+            "results": [self.make_question(difficulty, question_type) for _ in range(amount)]
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, like the real API behind its CDN
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path != '/api.php':
+                    self.send_error(404)
+                    return
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                status, data = fake.respond(params)
+                body = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if status == 429:
+                    self.send_header('Retry-After', '5')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Keep benchmark output readable
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-opentdb", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_stats(self):
+        with self.lock:
+            return {"requests": self.requests, "rate_limited": self.rate_limited}
+
+if __name__ == '__main__':
+    # python -m bench.fake_opentdb --port 8001 --latency 0.2 --rate-429 0.1
+    parser = argparse.ArgumentParser(description="Serve a fake opentdb API locally")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+    fake = FakeOpenTDB(args.port, args.latency, args.rate_429)
+    print(f"Fake opentdb listening on {fake.url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,171 @@
+import argparse
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import time
+
+from bench.fake_opentdb import FakeOpenTDB
+from bench.run import InProcessClient, server_env, wait_until_ready
+
+def play_rooms(client, args, rng):
+    """Create rooms in every phase through the API: lobbies, games mid-round and finished games."""
+    for i in range(args.played):
+        status, body = client.post('/create_room', {"player_name": "player-0", "num_questions": args.questions, "time_limit": 0})
+        room_id = body['room_id']
+        for p in range(1, args.players):
+            client.post('/join_room', {"room_id": room_id, "player_name": f"player-{p}"})
+        if i % 3 == 0:
+            continue # Stays in the lobby
+        client.post('/start_game', {"room_id": room_id})
+        rounds = 1 if i % 3 == 1 else args.questions
+        for _ in range(rounds):
+            status, state = client.get(f'/room_state/{room_id}')
+            question = state and state.get('current_question')
+            if not question:
+                break
+            for p in range(args.players):
+                client.post('/submit_answer', {
+                    "room_id": room_id,
+                    "player_name": f"player-{p}",
+                    "question_id": question['id'],
+                    "answer": rng.choice(question['options'])
+                })
+
+def play_large_rooms(client, sizes, rng, wall, cpu):
+    """One room per size, played through a round. Returns (size, wall, cpu) journal samples for its answers."""
+    results = []
+    for size in sizes:
+        status, body = client.post('/create_room', {"player_name": "player-0", "num_questions": 2, "time_limit": 0})
+        room_id = body['room_id']
+        for p in range(1, size):
+            client.post('/join_room', {"room_id": room_id, "player_name": f"player-{p}"})
+        client.post('/start_game', {"room_id": room_id})
+        status, state = client.get(f'/room_state/{room_id}')
+        question = state['current_question']
+        first = len(wall)
+        for p in range(size):
+            client.post('/submit_answer', {
+                "room_id": room_id,
+                "player_name": f"player-{p}",
+                "question_id": question['id'],
+                "answer": rng.choice(question['options'])
+            })
+        results.append((size, wall[first:], cpu[first:]))
+    return results
+
+def clone_rooms(store, count):
+    # Playing 50k games through the test client takes far too long; copies of the
+    # played rooms under new codes give the journal the same kind of records
+    from src.config import games_lock
+    from src.models.game import games
+    from src.room_codes import room_codes
+    from src.state_store import dump_room, init_room_runtime, restore_room
+    with games_lock:
+        templates = list(games.values())
+    for i in range(count):
+        template = templates[i % len(templates)]
+        with template.lock:
+            data = dump_room(template)
+        game = restore_room(pickle.loads(data))
+        game.room_id = room_codes.allocate()
+        init_room_runtime(game)
+        store.add(game)
+        with game.lock:
+            game.version += 1
+            store.save(game, game.version - 1)
+
+def time_journal_appends(store):
+    # Wraps the only journaling step on the request path. CPU time leaves out
+    # waiting for the GIL behind the fake API's and the journal's own threads.
+    wall, cpu = [], []
+    journal_changes = store._journal_changes
+    def timed(game):
+        started, started_cpu = time.perf_counter(), time.thread_time()
+        journal_changes(game)
+        wall.append(time.perf_counter() - started)
+        cpu.append(time.thread_time() - started_cpu)
+    store._journal_changes = timed
+    return wall, cpu
+
+def summary(samples):
+    samples = sorted(samples)
+    return (f"mean {sum(samples) / len(samples) * 1e6:.1f}us p50 {samples[len(samples) // 2] * 1e6:.1f}us "
+            f"p99 {samples[int(len(samples) * 0.99)] * 1e6:.1f}us")
+
+def recover_fresh(directory):
+    # What a restarted process does: new journal object, empty registry
+    from src.config import games_lock
+    from src.journal import RoomJournal
+    from src.models.game import games
+    from src.state_store import InMemoryStateStore
+    with games_lock:
+        games.clear()
+    store = InMemoryStateStore(RoomJournal(directory))
+    started = time.perf_counter()
+    recovered = store.recover()
+    return len(recovered), time.perf_counter() - started
+
+def dir_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure room journal overhead, snapshot time and restart recovery time")
+    parser.add_argument('--rooms', type=int, default=50000)
+    parser.add_argument('--played', type=int, default=300, help="rooms played through the API; the rest are copies of them")
+    parser.add_argument('--players', type=int, default=2, help="players per room")
+    parser.add_argument('--room-sizes', default='100,1000,5000',
+                        help="comma-separated players for the large rooms, played once each after the copies")
+    parser.add_argument('--questions', type=int, default=3, help="questions per game")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--dir', help="journal directory (default: a temporary one, removed afterwards)")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix='trivia-journal-')
+    fake = FakeOpenTDB(latency=0, seed=args.seed).start()
+    try:
+        os.environ.update(server_env(argparse.Namespace(upstream_rate=1000), fake), JOURNAL_DIR=directory)
+        from src.main import app, start_background_services
+        from src.state_store import state_store
+        start_background_services()
+        client = InProcessClient(app)
+        wait_until_ready(lambda: client.get('/ready')[0])
+
+        wall, cpu = time_journal_appends(state_store)
+        started = time.perf_counter()
+        rng = random.Random(args.seed)
+        play_rooms(client, args, rng)
+        played_changes = len(wall)
+        clone_rooms(state_store, args.rooms - args.played)
+        large_rooms = play_large_rooms(client, [int(size) for size in args.room_sizes.split(',') if size], rng, wall, cpu)
+        populate_seconds = time.perf_counter() - started
+        state_store.journal.commit()
+        journal_bytes = dir_bytes(directory)
+
+        replay_rooms, replay_seconds = recover_fresh(directory)
+        started = time.perf_counter()
+        state_store.journal.snapshot()
+        snapshot_seconds = time.perf_counter() - started
+        snapshot_bytes = dir_bytes(directory)
+        snapshot_rooms, snapshot_recovery_seconds = recover_fresh(directory)
+    finally:
+        fake.stop()
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"rooms={args.rooms} (played={args.played}) players={args.players} questions={args.questions} "
+          f"large rooms={args.room_sizes}")
+    print(f"populate: {populate_seconds:.1f}s, {len(wall)} journaled changes ({played_changes} from the small played rooms)")
+    print(f"journal append per played-room change, wall: {summary(wall[:played_changes])}")
+    print(f"journal append per played-room change, cpu:  {summary(cpu[:played_changes])}")
+    for size, size_wall, size_cpu in large_rooms:
+        print(f"journal append per answer, {size} players, wall: {summary(size_wall)}")
+        print(f"journal append per answer, {size} players, cpu:  {summary(size_cpu)}")
+    print(f"journal only: {journal_bytes / 1e6:.1f} MB, recovered {replay_rooms} rooms in {replay_seconds:.2f}s")
+    print(f"snapshot: written in {snapshot_seconds:.2f}s, {snapshot_bytes / 1e6:.1f} MB, "
+          f"recovered {snapshot_rooms} rooms in {snapshot_recovery_seconds:.2f}s")
+
+if __name__ == '__main__':
+    # python -m bench.recovery --rooms 50000
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import random
+import time
+
+from bench.fake_opentdb import FakeOpenTDB
+from bench.run import InProcessClient, percentile, server_env, wait_until_ready
+
+def timed(samples, fn, *args, **kwargs):
+    # Server time only: bodies are not parsed, since room-wide responses grow with the room
+    started = time.perf_counter()
+    fn(*args, **kwargs)
+    samples.append(time.perf_counter() - started)
+
+def measure_room(client, players, polls, rng):
+    """Latency of the per-player hot paths in one room of `players` players.
+
+    join_room answers with the full player list, so its body (not the lookup) grows with the room.
+    """
+    raw = client.app.test_client()
+    joins, state_polls, answers = [], [], []
+    status, body = client.post('/create_room', {"player_name": "player-0", "num_questions": 2, "time_limit": 0})
+    room_id = body['room_id']
+    for p in range(1, players):
+        timed(joins, raw.post, '/join_room', json={"room_id": room_id, "player_name": f"player-{p}"})
+    client.post('/start_game', {"room_id": room_id})
+    status, state = client.get(f'/room_state/{room_id}')
+    question = state['current_question']
+    for i in range(polls):
+        # Looks the player up by name; the room is unchanged, so the snapshot is served as built
+        timed(state_polls, raw.get, f'/room_state/{room_id}?player_name=player-{rng.randrange(players)}')
+    for p in range(players - 1): # The last answer also advances the round
+        timed(answers, raw.post, '/submit_answer', json={
+            "room_id": room_id,
+            "player_name": f"player-{p}",
+            "question_id": question['id'],
+            "answer": rng.choice(question['options'])
+        })
+    return {"join_room": joins, "room_state": state_polls, "submit_answer": answers}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-request latency of joins, polls and answers as one room grows")
+    parser.add_argument('--sizes', default='10,100,1000,5000', help="comma-separated players per room")
+    parser.add_argument('--polls', type=int, default=2000, help="room_state polls per room")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    fake = FakeOpenTDB(latency=0, seed=args.seed).start()
+    try:
+        os.environ.update(server_env(argparse.Namespace(upstream_rate=1000), fake))
+        from src.main import app, start_background_services
+        start_background_services()
+        client = InProcessClient(app)
+        wait_until_ready(lambda: client.get('/ready')[0])
+        rng = random.Random(args.seed)
+        results = [(int(size), measure_room(client, int(size), args.polls, rng)) for size in args.sizes.split(',')]
+    finally:
+        fake.stop()
+
+    print(f"{'players':>8}  {'endpoint':<14}{'p50 ms':>8}{'p99 ms':>8}")
+    for size, endpoints in results:
+        for endpoint, samples in endpoints.items():
+            samples.sort()
+            print(f"{size:>8}  {endpoint:<14}{percentile(samples, 50) * 1000:>8.3f}{percentile(samples, 99) * 1000:>8.3f}")
+
+if __name__ == '__main__':
+    # python -m bench.room_size --sizes 10,100,1000,5000
+    main()
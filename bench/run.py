@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench.fake_opentdb import FakeOpenTDB
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+current = threading.local() # Endpoint the calling thread is driving, for lock attribution
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+class Recorder:
+    """Latency samples and error counts per endpoint, plus lock waits per (lock, endpoint)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {} # endpoint -> [seconds]
+        self.errors = {} # endpoint -> count of unexpected statuses
+        self.lock_waits = {} # (lock name, endpoint) -> [seconds waited on contended acquires]
+        self.lock_acquires = {} # (lock name, endpoint) -> blocking acquires
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        current.endpoint = endpoint
+        started = time.perf_counter()
+        try:
+            status, body = fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            current.endpoint = None
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            if status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return status, body
+
+    def record_lock(self, name, waited, contended):
+        key = (name, getattr(current, 'endpoint', None) or 'background')
+        with self.lock:
+            self.lock_acquires[key] = self.lock_acquires.get(key, 0) + 1
+            if contended:
+                self.lock_waits.setdefault(key, []).append(waited)
+
+    def report(self, wall):
+        total = sum(len(v) for v in self.latencies.values())
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            samples = sorted(samples)
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": self.errors.get(endpoint, 0),
+                "p50_ms": percentile(samples, 50) * 1000,
+                "p99_ms": percentile(samples, 99) * 1000,
+                "max_ms": samples[-1] * 1000,
+                "throughput_rps": len(samples) / wall if wall else 0.0
+            }
+        locks = {}
+        for (name, endpoint), acquires in sorted(self.lock_acquires.items()):
+            waits = sorted(self.lock_waits.get((name, endpoint), []))
+            locks[f"{name} @ {endpoint}"] = {
+                "acquires": acquires,
+                "contended": len(waits),
+                "wait_total_ms": sum(waits) * 1000,
+                "wait_p99_ms": percentile(waits, 99) * 1000
+            }
+        return {
+            "wall_seconds": wall,
+            "requests": total,
+            "throughput_rps": total / wall if wall else 0.0,
+            "endpoints": endpoints,
+            "locks": locks
+        }
+
+class ContentionLock:
+    """threading.Lock stand-in that reports how long blocking acquires waited."""
+
+    def __init__(self, name, recorder):
+        self.name = name
+        self.recorder = recorder
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            if blocking:
+                self.recorder.record_lock(self.name, 0.0, False)
+            return True
+        if not blocking:
+            return False # Condition uses non-blocking probes to check ownership
+        started = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        self.recorder.record_lock(self.name, time.perf_counter() - started, True)
+        return acquired
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+def instrument_locks(recorder):
+    # In-process only: swap games_lock and every new room's lock for timed versions
+    import src.config
+    import src.routes.game
+    import src.state_store
+
+    registry_lock = ContentionLock('games_lock', recorder)
+    original = src.config.games_lock
+    for name, module in list(sys.modules.items()):
+        if name.startswith('src') and getattr(module, 'games_lock', None) is original:
+            module.games_lock = registry_lock
+
+    init_room_runtime = src.state_store.init_room_runtime
+    def instrumented(game):
+        init_room_runtime(game)
+        game.lock = ContentionLock('game.lock', recorder)
+        game.changed = threading.Condition(game.lock)
+    src.state_store.init_room_runtime = instrumented
+    src.routes.game.init_room_runtime = instrumented
+
+class InProcessClient:
+    """Drives the Flask app through its test client; no sockets involved."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def get(self, path):
+        response = self.app.test_client().get(path)
+        return response.status_code, response.get_json(silent=True)
+
+    def post(self, path, payload):
+        response = self.app.test_client().post(path, json=payload)
+        return response.status_code, response.get_json(silent=True)
+
+class HttpClient:
+    """Talks to a running server over real sockets, one keep-alive session per thread."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.local = threading.local()
+
+    def session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    def get(self, path):
+        response = self.session().get(self.base_url + path, timeout=60)
+        return response.status_code, response.json() if response.content else None
+
+    def post(self, path, payload):
+        response = self.session().post(self.base_url + path, json=payload, timeout=60)
+        return response.status_code, response.json() if response.content else None
+
+def play_room(client, recorder, args, rng):
+    """One game lifecycle: create, joins, start, then poll-and-answer rounds until it ends."""
+    status, body = recorder.call('create_room', client.post, '/create_room', {
+        "player_name": "player-0",
+        "num_questions": args.questions,
+        "time_limit": 0 # Rounds advance on answers only, so runs are repeatable
+    })
+    if status != 201:
+        return False
+    room_id = body['room_id']
+    player_ids = [body['player_id']]
+    for i in range(1, args.players):
+        status, body = recorder.call('join_room', client.post, '/join_room', {"room_id": room_id, "player_name": f"player-{i}"})
+        if status == 200:
+            player_ids.append(body['player_id'])
+
+    status, _ = recorder.call('start_game', client.post, '/start_game', {"room_id": room_id})
+    if status != 200:
+        return False
+
+    for _ in range(args.questions):
+        state = None
+        for player_id in player_ids:
+            for _ in range(args.polls):
+                status, state = recorder.call('room_state', client.get, f'/room_state/{room_id}?player_id={player_id}')
+        if not state or state.get('game_ended') or not state.get('current_question'):
+            break
+        question = state['current_question']
+        for player_id in player_ids:
+            recorder.call('submit_answer', client.post, '/submit_answer', {
+                "room_id": room_id,
+                "player_id": player_id,
+                "question_id": question['id'],
+                "answer": rng.choice(question['options'])
+            })
+    return True
+
+def run_load(client, recorder, args):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(play_room, client, recorder, args, random.Random(args.seed + i)) for i in range(args.rooms)]
+        completed = sum(1 for f in futures if f.result())
+    return completed, time.perf_counter() - started
+
+def server_env(args, fake):
+    return dict(
+        os.environ,
+        TRIVIA_API_URL=fake.url,
+        TRIVIA_API_RATE=str(args.upstream_rate),
+        TRIVIA_API_BURST=str(max(1, int(args.upstream_rate))),
+        ROUND_TIME_LIMIT='0',
+        # Simulated players poll far faster than real ones; only rate-limit them when asked to
+        ADMISSION_ENABLED='1' if getattr(args, 'admission', False) else '0'
+    )
+
+def run_in_process(args, fake, recorder):
+    os.environ.update(server_env(args, fake)) # Read by src.config at import
+    from src.main import app, start_background_services
+    instrument_locks(recorder)
+    start_background_services()
+    client = InProcessClient(app)
+    wait_until_ready(lambda: client.get('/ready')[0])
+    return run_load(client, recorder, args)
+
+def wait_until_ready(probe, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if probe() == 200:
+                return
+        except requests.exceptions.ConnectionError:
+            pass # Server still booting
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not become ready")
+        time.sleep(0.1)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def run_gunicorn(args, fake, recorder):
+    port = free_port()
+    env = server_env(args, fake)
+    state_dir = tempfile.mkdtemp(prefix='trivia-bench-')
+    if args.workers > 1:
+        # Rooms must be shared for requests to land on any worker
+        env.update(STATE_BACKEND='sqlite', STATE_DB_PATH=os.path.join(state_dir, 'rooms.db'))
+    server = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', 'src.main:app',
+        '-b', f'127.0.0.1:{port}', '-w', str(args.workers),
+        '-k', 'gthread', '--threads', str(args.threads)
+    ], cwd=REPO_ROOT, env=env)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        def probe():
+            if server.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            return requests.get(base_url + '/ready', timeout=1).status_code
+        wait_until_ready(probe) # Only the worker that answers is checked; the others warm up the same way
+        return run_load(HttpClient(base_url), recorder, args)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+def format_report(args, report, completed, upstream):
+    lines = [
+        f"mode={args.mode} rooms={args.rooms} players={args.players} questions={args.questions} "
+        f"polls={args.polls} concurrency={args.concurrency} latency={args.latency}s rate_429={args.rate_429}",
+        f"completed rooms: {completed}/{args.rooms}  wall: {report['wall_seconds']:.2f}s  "
+        f"requests: {report['requests']}  throughput: {report['throughput_rps']:.0f} req/s",
+        f"upstream: {upstream['requests']} requests, {upstream['rate_limited']} answered 429",
+        "",
+        f"{'endpoint':<16}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'req/s':>10}"
+    ]
+    for endpoint, stats in report['endpoints'].items():
+        lines.append(
+            f"{endpoint:<16}{stats['requests']:>10}{stats['errors']:>8}{stats['p50_ms']:>10.2f}"
+            f"{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}{stats['throughput_rps']:>10.0f}"
+        )
+    if report['locks']:
+        lines += ["", f"{'lock @ endpoint':<36}{'acquires':>10}{'contended':>11}{'wait ms':>10}{'p99 ms':>10}"]
+        for name, stats in report['locks'].items():
+            lines.append(
+                f"{name:<36}{stats['acquires']:>10}{stats['contended']:>11}"
+                f"{stats['wait_total_ms']:>10.2f}{stats['wait_p99_ms']:>10.2f}"
+            )
+    elif args.mode == 'gunicorn':
+        lines += ["", "(lock contention is only measured in-process)"]
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the trivia game API against a fake opentdb")
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn'], default='inprocess')
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--players', type=int, default=8, help="players per room")
+    parser.add_argument('--questions', type=int, default=5, help="questions per game")
+    parser.add_argument('--polls', type=int, default=3, help="room_state polls per player per round")
+    parser.add_argument('--concurrency', type=int, default=16, help="rooms played at once")
+    parser.add_argument('--latency', type=float, default=0.05, help="fake opentdb latency in seconds")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="fraction of upstream calls answered 429")
+    parser.add_argument('--upstream-rate', type=float, default=50, help="TRIVIA_API_RATE for the server (0.2 matches opentdb)")
+    parser.add_argument('--workers', type=int, default=1, help="gunicorn workers")
+    parser.add_argument('--threads', type=int, default=32, help="gunicorn threads per worker")
+    parser.add_argument('--admission', action='store_true', help="keep per-client/per-room rate limits on (429s count as errors)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the raw report to this file")
+    parser.add_argument('--output', help="also write the text report to this file (e.g. bench_output.txt)")
+    args = parser.parse_args(argv)
+
+    fake = FakeOpenTDB(latency=args.latency, rate_429=args.rate_429, seed=args.seed).start()
+    recorder = Recorder()
+    try:
+        if args.mode == 'inprocess':
+            completed, wall = run_in_process(args, fake, recorder)
+        else:
+            completed, wall = run_gunicorn(args, fake, recorder)
+    finally:
+        fake.stop()
+
+    report = recorder.report(wall)
+    text = format_report(args, report, completed, fake.get_stats())
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(dict(report, completed_rooms=completed, upstream=fake.get_stats()), f, indent=2)
+
+if __name__ == '__main__':
+    # python -m bench.run --mode inprocess --rooms 100 --players 10
+    main()
@@ -0,0 +1,11 @@
+import sys
+
+# Picked up automatically by gunicorn when started from the repo root.
+
+def post_worker_init(worker):
+    # Background threads (question refiller, room expiry, round timer, log writer) start
+    # once per worker after it has loaded the app; they would not survive the fork.
+    # The router (src.router:app) holds no game state and has nothing to start.
+    main = sys.modules.get('src.main')
+    if main is not None:
+        main.start_background_services()
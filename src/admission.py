@@ -0,0 +1,156 @@
+import math
+import threading
+import time
+
+from flask import jsonify, request
+
+from src.config import (
+    ADMISSION_ENABLED, ADMISSION_MAX_INFLIGHT,
+    CLIENT_POLL_RATE, CLIENT_POLL_BURST, ROOM_POLL_RATE, ROOM_POLL_BURST,
+    CLIENT_ANSWER_RATE, CLIENT_ANSWER_BURST, ROOM_ANSWER_RATE, ROOM_ANSWER_BURST
+)
+from src.metrics import registry
+from src.room_expiry import room_phase
+from src.trivia_client import TokenBucket
+
+MAX_BUCKETS = 100000 # Per table; idle buckets are dropped once this many exist
+# Suggested seconds between room_state polls per game phase, before load is factored in
+POLL_INTERVALS = {'lobby': 2.0, 'in_progress': 1.0, 'ended': 10.0}
+MIN_POLL_INTERVAL = 0.25
+LOAD_BACKOFF = 3 # At full pressure clients are told to poll this many times less often, on top of the base
+OVERLOAD_RETRY = 1.0 # Seconds suggested to polls shed because too many requests are in flight
+
+ADMISSION_REJECTED = registry.counter('trivia_admission_rejected_total', 'Requests rejected with 429 before touching room state.', ('endpoint', 'reason'))
+
+class BucketTable:
+    """Token buckets created on first use per key (client or room)."""
+
+    def __init__(self, rate, burst, max_keys=MAX_BUCKETS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = {}
+        self.lock = threading.Lock() # Only taken to create buckets
+
+    def get(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(key)
+                if bucket is None:
+                    if len(self.buckets) >= self.max_keys:
+                        self._prune()
+                    bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def peek(self, key):
+        return self.buckets.get(key)
+
+    def _prune(self):
+        # Caller holds self.lock. A bucket idle long enough to be full again holds no state worth keeping.
+        now = time.monotonic()
+        refill_time = self.burst / self.rate
+        for key in [k for k, b in self.buckets.items() if now - b.updated >= refill_time]:
+            del self.buckets[key]
+        if len(self.buckets) >= self.max_keys:
+            # Flooded with distinct keys: forget the oldest half rather than grow without bound
+            for key in list(self.buckets)[:len(self.buckets) // 2]:
+                del self.buckets[key]
+
+def bucket_pressure(bucket):
+    # 0 when the bucket is full, 1 when it is empty. Read without the bucket's lock; a hint only.
+    if bucket is None:
+        return 0.0
+    tokens = min(bucket.capacity, bucket.tokens + (time.monotonic() - bucket.updated) * bucket.rate)
+    return max(0.0, 1 - tokens / bucket.capacity)
+
+class AdmissionController:
+    """Cheap early rejection for room polls and answers, plus next-poll hints.
+
+    Runs before a request looks up or locks its room: a client or room over
+    its token bucket gets 429 with Retry-After, and once too many requests are
+    in flight, polls are shed so answers (which move games forward) still get
+    through. Successful polls carry X-Poll-Interval, which grows with the
+    room's and the server's load.
+    """
+
+    def __init__(self, enabled=ADMISSION_ENABLED):
+        self.enabled = enabled
+        self.tables = {
+            'poll': (BucketTable(CLIENT_POLL_RATE, CLIENT_POLL_BURST), BucketTable(ROOM_POLL_RATE, ROOM_POLL_BURST)),
+            'answer': (BucketTable(CLIENT_ANSWER_RATE, CLIENT_ANSWER_BURST), BucketTable(ROOM_ANSWER_RATE, ROOM_ANSWER_BURST))
+        }
+        self.lock = threading.Lock()
+        self.inflight = 0
+
+    def begin(self):
+        with self.lock:
+            self.inflight += 1
+
+    def end(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def server_pressure(self):
+        return min(1.0, self.inflight / ADMISSION_MAX_INFLIGHT)
+
+    def admit(self, kind, client_key, room_id):
+        """None if admitted, else (reason, seconds until a retry can succeed)."""
+        if not self.enabled:
+            return None
+        if kind == 'poll' and self.inflight > ADMISSION_MAX_INFLIGHT:
+            return 'overload', OVERLOAD_RETRY
+        clients, rooms = self.tables[kind]
+        wait = clients.get(client_key).try_acquire()
+        if wait:
+            return 'client', wait
+        if room_id:
+            wait = rooms.get(room_id).try_acquire()
+            if wait:
+                return 'room', wait
+        return None
+
+    def check(self, kind):
+        """Admission for the current Flask request: None, or a 429 response to return as is."""
+        room_id = request.view_args.get('room_id') if request.view_args else None
+        data = None
+        if room_id is None and request.method == 'POST':
+            data = request.get_json(silent=True) # Parsed once; the view reuses Flask's cached copy
+            room_id = data.get('room_id') if isinstance(data, dict) else None
+        rejection = self.admit(kind, client_key(), room_id)
+        if rejection is None:
+            return None
+        reason, wait = rejection
+        ADMISSION_REJECTED.labels(request.endpoint, reason).inc()
+        retry_after = round(max(wait, MIN_POLL_INTERVAL), 2)
+        return (
+            jsonify({"error": "Too many requests, slow down", "reason": reason, "retry_after": retry_after}),
+            429,
+            {"Retry-After": str(math.ceil(retry_after))}
+        )
+
+    def next_poll(self, game):
+        """Seconds a client should wait before polling this room again. Caller holds game.lock."""
+        phase = room_phase(game)
+        interval = POLL_INTERVALS[phase]
+        if phase == 'in_progress' and game.round_deadline:
+            # Come back right after the round times out rather than a full interval later
+            interval = min(interval, max(MIN_POLL_INTERVAL, game.round_deadline - time.time()))
+        pressure = max(self.server_pressure(), bucket_pressure(self.tables['poll'][1].peek(game.room_id)))
+        return round(interval * (1 + LOAD_BACKOFF * pressure), 1)
+
+    def get_stats(self):
+        return {
+            "enabled": self.enabled,
+            "inflight": self.inflight,
+            "buckets": {kind: {"clients": len(clients.buckets), "rooms": len(rooms.buckets)} for kind, (clients, rooms) in self.tables.items()}
+        }
+
+def client_key():
+    # The only identity a client cannot pick for itself: player ids and names come from the
+    # request, so rotating them would get a fresh bucket each time. Behind TRUSTED_PROXIES,
+    # ProxyFix has already replaced remote_addr with the address the nearest proxy saw.
+    return 'ip:' + (request.remote_addr or '')
+
+admission = AdmissionController()
+registry.gauge_callback('trivia_admission_inflight', 'Requests in flight on the game endpoints.', lambda: admission.inflight)
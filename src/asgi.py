@@ -0,0 +1,175 @@
+import asyncio
+import json
+import random
+import time
+from urllib.parse import parse_qs
+
+import httpx
+import requests
+from asgiref.wsgi import WsgiToAsgi
+
+from src.config import TRIVIA_API_URL, TRIVIA_API_ENABLED, CACHE_FILL_AMOUNT
+from src.main import app, start_background_services
+from src.question_bank import question_bank
+from src.question_pool import question_pool, build_question, parse_filter, InvalidFilterError
+from src.trivia_client import (trivia_client as sync_client, TriviaUnavailableError,
+                               UPSTREAM_LATENCY, read_results, upstream_outcome)
+
+# ASGI entry point: `uvicorn src.asgi:application`.
+# /question is served natively on the event loop; every other route goes to the Flask app.
+flask_app = WsgiToAsgi(app)
+
+def async_upstream_outcome(error):
+    if isinstance(error, httpx.TimeoutException):
+        return 'timeout'
+    if isinstance(error, httpx.TransportError):
+        return 'connection_error'
+    return upstream_outcome(error)
+
+class AsyncTriviaClient:
+    """Non-blocking opentdb client with a pooled keep-alive connection and per-key coalescing."""
+
+    def __init__(self):
+        self.client = None
+        self.in_flight = {} # (difficulty, category, type) -> asyncio.Task
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _fetch(self, amount, difficulty, category, question_type):
+        params = {
+            "amount": amount,
+            "type": question_type
+        }
+        if difficulty != 'any':
+            params["difficulty"] = difficulty
+        if category != 'any':
+            params["category"] = category
+
+        # Share the threaded client's breaker, rate limit and retry rules so both modes treat opentdb alike
+        for attempt in range(sync_client.retries + 1):
+            sync_client.admit()
+            started = time.perf_counter()
+            try:
+                try:
+                    response = await self.client.get(TRIVIA_API_URL, params=params)
+                finally:
+                    UPSTREAM_LATENCY.observe(time.perf_counter() - started)
+                results = read_results(response)
+            except (httpx.HTTPError, requests.exceptions.RequestException) as e:
+                status = e.response.status_code if isinstance(e, requests.exceptions.HTTPError) and e.response is not None else None
+                delay = sync_client.record_failure(async_upstream_outcome(e), attempt, status)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                sync_client.breaker.release() # Including cancellation: never leave the probe slot taken
+                raise
+            sync_client.record_success()
+            return results
+
+    async def _fetch_into_pool(self, key):
+        results = await self._fetch(CACHE_FILL_AMOUNT, *key)
+        batch = [build_question(q_data) for q_data in results]
+        question_pool.add(batch, *key)
+        if results and question_bank is not None:
+            await asyncio.get_running_loop().run_in_executor(None, question_bank.add_questions, results)
+        return batch
+
+    async def fetch(self, difficulty='any', category='any', question_type='multiple'):
+        """Fetch a batch for this filter into the question pool and return it.
+
+        Concurrent callers for the same key share a single upstream request.
+        """
+        key = question_pool.make_key(difficulty, category, question_type)
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_into_pool(key))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+trivia_client = AsyncTriviaClient()
+
+async def send_json(send, payload, status=200, headers=()):
+    # Questions carry their own pre-rendered JSON; only error dicts are encoded here
+    body = (payload if isinstance(payload, str) else json.dumps(payload)).encode('utf-8')
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode('ascii')),
+            (b"access-control-allow-origin", b"*"),
+            *headers
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def get_question(scope, send):
+    args = {k: v[0] for k, v in parse_qs(scope['query_string'].decode('latin-1')).items()}
+    try:
+        difficulty, category, question_type = parse_filter(args.get('difficulty', 'any'), args.get('category', 'any'), args.get('type', 'multiple'))
+    except InvalidFilterError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+
+    # Skip the pool's threaded refill here: this request fetches for the key itself
+    question = question_pool.get(difficulty, category, question_type, refill=False)
+    if question:
+        return await send_json(send, question["json"])
+
+    if question_bank is not None:
+        # SQLite reads block, so keep them off the event loop
+        drawn = await asyncio.get_running_loop().run_in_executor(None, question_bank.draw, 1, difficulty, category, question_type)
+        if drawn:
+            return await send_json(send, build_question(drawn[0])["json"])
+    if not TRIVIA_API_ENABLED:
+        return await send_json(send, {"error": "Could not fetch question. Try different parameters or check API response."}, 404)
+
+    try:
+        batch = await trivia_client.fetch(difficulty, category, question_type)
+    except TriviaUnavailableError as e:
+        # Same hint as the Flask route, so clients back off alike on either server
+        retry_after = str(int(e.retry_after) + 1).encode('ascii')
+        return await send_json(send, {"error": f"Trivia API unavailable: {e}"}, 503, [(b"retry-after", retry_after)])
+    except httpx.TimeoutException:
+        return await send_json(send, {"error": "Request to trivia API timed out."}, 504)
+    except (httpx.HTTPError, requests.exceptions.RequestException) as e:
+        return await send_json(send, {"error": f"Error fetching question from external API: {e}"}, 500)
+    except Exception as e:
+        return await send_json(send, {"error": f"An unexpected error occurred: {e}"}, 500)
+
+    if not batch:
+        return await send_json(send, {"error": "Could not fetch question. Try different parameters or check API response."}, 404)
+
+    # Waiters share the batch through the pool; a burst larger than the batch reuses its questions
+    question = question_pool.get(difficulty, category, question_type) or random.choice(batch)
+    return await send_json(send, question["json"])
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_background_services()
+            await trivia_client.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message['type'] == 'lifespan.shutdown':
+            await trivia_client.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['path'] == '/question' and scope['method'] == 'GET':
+        return await get_question(scope, send)
+    return await flask_app(scope, receive, send)
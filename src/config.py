@@ -1,4 +1,73 @@
-import threading
+import os
 
-TRIVIA_API_URL = "https://opentdb.com/api.php"
-games_lock = threading.Lock( )
+from src.metrics import TimedLock
+
+TRIVIA_API_URL = os.environ.get('TRIVIA_API_URL', "https://opentdb.com/api.php")
+# Set to 0 to run purely from the local question bank (no calls to opentdb)
+TRIVIA_API_ENABLED = os.environ.get('TRIVIA_API_ENABLED', '1') != '0'
+# opentdb allows one request per 5 seconds per IP
+TRIVIA_API_RATE = float(os.environ.get('TRIVIA_API_RATE', 0.2)) # Requests per second
+TRIVIA_API_BURST = int(os.environ.get('TRIVIA_API_BURST', 1))
+# Circuit breaker: fail fast after this many consecutive upstream failures...
+TRIVIA_API_FAILURE_THRESHOLD = 3
+# ...and probe the API again after this many seconds
+TRIVIA_API_RESET_TIMEOUT = 30
+# SQLite file for the local question bank; unset disables it
+QUESTION_BANK_PATH = os.environ.get('QUESTION_BANK_PATH')
+# Where rooms live: 'memory' (this process only) or 'sqlite' (shared by all workers on the host)
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'memory')
+STATE_DB_PATH = os.environ.get('STATE_DB_PATH', 'rooms.db')
+# Directory for the in-memory backend's crash-recovery journal and snapshots; unset disables it
+JOURNAL_DIR = os.environ.get('JOURNAL_DIR')
+# 'async': acknowledge requests before their change is fsynced (up to one commit interval
+# can be lost in a crash); 'commit': each request waits for the group commit holding its change
+JOURNAL_SYNC = os.environ.get('JOURNAL_SYNC', 'async')
+JOURNAL_COMMIT_INTERVAL = 0.005 # Seconds between group commits
+JOURNAL_SNAPSHOT_INTERVAL = int(os.environ.get('JOURNAL_SNAPSHOT_INTERVAL', 300)) # Seconds between snapshots
+JOURNAL_SEGMENT_BYTES = 64 * 1024 * 1024 # Also snapshot once the current segment grows this large
+# SQLAlchemy URL for the durable room store (/create-room, /room/<id>/...); unset disables it
+DATABASE_URL = os.environ.get('DATABASE_URL')
+# Idle time (seconds) before a room is expired, per game phase
+ROOM_TTLS = {
+    'lobby': int(os.environ.get('ROOM_TTL_LOBBY', 3600)),
+    'in_progress': int(os.environ.get('ROOM_TTL_IN_PROGRESS', 3600)),
+    'ended': int(os.environ.get('ROOM_TTL_ENDED', 600)),
+}
+EXPIRY_BATCH_SIZE = 100 # Rooms checked per expiry tick, so no tick runs long
+# Default seconds per question before the server moves the room on (0 disables the timer)
+ROUND_TIME_LIMIT = int(os.environ.get('ROUND_TIME_LIMIT', 30))
+# Admission control on room_state/room_events polls and answers (set to 0 to disable)
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') != '0'
+# Token buckets: sustained requests per second and burst, per client address and per room.
+# A classroom behind one NAT shares an address, so the per-client limits leave room for ~30 players.
+CLIENT_POLL_RATE = float(os.environ.get('CLIENT_POLL_RATE', 50))
+CLIENT_POLL_BURST = int(os.environ.get('CLIENT_POLL_BURST', 100))
+ROOM_POLL_RATE = float(os.environ.get('ROOM_POLL_RATE', 200))
+ROOM_POLL_BURST = int(os.environ.get('ROOM_POLL_BURST', 400))
+CLIENT_ANSWER_RATE = float(os.environ.get('CLIENT_ANSWER_RATE', 20))
+CLIENT_ANSWER_BURST = int(os.environ.get('CLIENT_ANSWER_BURST', 50))
+ROOM_ANSWER_RATE = float(os.environ.get('ROOM_ANSWER_RATE', 100))
+ROOM_ANSWER_BURST = int(os.environ.get('ROOM_ANSWER_BURST', 200))
+# Proxies in front of this process that append to X-Forwarded-For (a load balancer, src.router).
+# 0 uses the socket's peer address as is; the header can be forged and is ignored.
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+# Requests in flight on the game endpoints above which polls are shed (answers still go through)
+ADMISSION_MAX_INFLIGHT = int(os.environ.get('ADMISSION_MAX_INFLIGHT', 64))
+# Requests slower than this (seconds) are kept by the slow-request recorder; adjustable at runtime
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 0.5))
+# When set, /debug/* endpoints require this value in the X-Admin-Token header
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+# Shard this process issues room codes for (0-35, the code's first character); must be
+# unique per node behind the router, and equal to the node's position in ROUTER_BACKENDS
+ROOM_SHARD_ID = int(os.environ.get('ROOM_SHARD_ID', 0))
+# Router mode (src.router): comma-separated backend base URLs, indexed by shard id
+ROUTER_BACKENDS = [url.strip().rstrip('/') for url in os.environ.get('ROUTER_BACKENDS', '').split(',') if url.strip()]
+# Registry lock: only guards inserting into / removing from `games`.
+# Game state itself is protected by each room's own `game.lock`.
+games_lock = TimedLock('games_lock')
+
+# Question pool buffers (one per difficulty/category/type)
+CACHE_FILL_THRESHOLD = 5 # If a buffer has less than this many questions, refill it
+CACHE_FILL_AMOUNT = 20 # How many questions each buffer holds when full
+# Optional JSON file the question pool is loaded from at startup and saved to at exit
+QUESTION_POOL_SNAPSHOT = os.environ.get('QUESTION_POOL_SNAPSHOT')
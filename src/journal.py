@@ -0,0 +1,264 @@
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+
+from src.config import JOURNAL_COMMIT_INTERVAL, JOURNAL_SNAPSHOT_INTERVAL, JOURNAL_SEGMENT_BYTES, JOURNAL_SYNC
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Record layout: length and crc32 of the body, then the body itself:
+# kind (1 byte), room version (8), room_id length (1), room_id, payload.
+HEADER = struct.Struct('<II')
+BODY = struct.Struct('<BQB')
+ROOM_FULL = 1 # Payload is the complete room state
+ROOM_PARTIAL = 2 # Payload only holds the changes since the previous record
+ROOM_DELETE = 3
+
+SEGMENT_NAME = re.compile(r'^journal-(\d{8})\.bin$')
+SNAPSHOT_NAME = re.compile(r'^snapshot-(\d{8})\.bin$')
+
+def encode_record(kind, room_id, version, payload=b''):
+    room_id = room_id.encode('utf-8')
+    body = BODY.pack(kind, version, len(room_id)) + room_id + payload
+    return HEADER.pack(len(body), zlib.crc32(body)) + body
+
+def iter_records(buffer):
+    """Yield (kind, room_id, version, payload, end offset) until the data ends or is torn."""
+    with memoryview(buffer) as view: # No copy of the whole (possibly mmapped) buffer
+        offset = 0
+        while offset + HEADER.size <= len(view):
+            length, crc = HEADER.unpack_from(view, offset)
+            start = offset + HEADER.size
+            end = start + length
+            if length < BODY.size or end > len(view) or zlib.crc32(view[start:end]) != crc:
+                return # Torn write at crash time; everything before it is intact
+            kind, version, id_length = BODY.unpack_from(view, start)
+            id_start = start + BODY.size
+            room_id = bytes(view[id_start:id_start + id_length]).decode('utf-8')
+            yield kind, room_id, version, bytes(view[id_start + id_length:end]), end
+            offset = end
+
+class RoomJournal:
+    """Append-only binary redo log of room changes, with group commit and snapshots.
+
+    Request threads only encode a record and append it to an in-memory batch.
+    One writer thread writes and fsyncs each batch every commit interval, and
+    periodically rolls over to a new segment and writes a snapshot of every
+    room so older segments can be deleted. Recovery loads the newest snapshot
+    through mmap and replays the segments written after it.
+    """
+
+    def __init__(self, directory, commit_interval=JOURNAL_COMMIT_INTERVAL, sync=JOURNAL_SYNC):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.sync = sync # 'async': don't wait; 'commit': requests wait for their batch's fsync
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.committed = threading.Condition(self.lock)
+        self.write_lock = threading.RLock() # Serializes writes to the current segment
+        self.snapshot_lock = threading.Lock() # One snapshot at a time; snapshot() may be called from any thread
+        self.batch = []
+        self.appended = 0 # Sequence number of the last appended record
+        self.durable = 0 # Sequence number of the last fsynced record
+        self.local = threading.local() # Last record appended by this thread, for sync='commit'
+        self.snapshot_source = None
+        self.segment = 0
+        self.file = None
+        self.segment_bytes = 0
+        self.thread = None
+
+        self.records = 0
+        self.bytes_written = 0
+        self.commits = 0
+        self.commit_seconds_max = 0.0
+        self.snapshots = 0
+        self.snapshot_seconds_last = 0.0
+        self.recovered_rooms = 0
+        self.recovery_seconds = 0.0
+
+    def _path(self, kind, number):
+        return os.path.join(self.directory, f"{kind}-{number:08d}.bin")
+
+    def _files(self, pattern):
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = pattern.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def append(self, kind, room_id, version, payload=b''):
+        record = encode_record(kind, room_id, version, payload)
+        with self.lock:
+            self.batch.append(record)
+            self.appended += 1
+            self.local.seq = self.appended
+            self.records += 1
+
+    def wait_for_commit(self, timeout=5):
+        """With sync='commit', block until this thread's last record is on disk."""
+        seq = getattr(self.local, 'seq', 0)
+        self.local.seq = 0
+        if self.sync != 'commit' or not seq:
+            return
+        with self.lock:
+            self.committed.wait_for(lambda: self.durable >= seq, timeout)
+
+    def recover(self):
+        """Read the latest snapshot and the journal after it.
+
+        Returns {room_id: (version, payloads)}: a full room payload followed by
+        the partial ones to apply on top of it, in order.
+        """
+        started = time.monotonic()
+        rooms = {}
+        snapshots = self._files(SNAPSHOT_NAME)
+        first_segment = 0
+        if snapshots:
+            first_segment = snapshots[-1]
+            with open(self._path('snapshot', first_segment), 'rb') as f:
+                if os.fstat(f.fileno()).st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        for kind, room_id, version, payload, _ in iter_records(data):
+                            rooms[room_id] = (version, [payload])
+        segments = [n for n in self._files(SEGMENT_NAME) if n >= first_segment]
+        for number in segments:
+            path = self._path('journal', number)
+            with open(path, 'rb') as f:
+                data = f.read()
+            valid = 0
+            for kind, room_id, version, payload, end in iter_records(data):
+                valid = end
+                if kind == ROOM_DELETE:
+                    rooms.pop(room_id, None)
+                    continue
+                current = rooms.get(room_id)
+                if kind == ROOM_FULL:
+                    if current is None or version >= current[0]:
+                        rooms[room_id] = (version, [payload])
+                elif current is not None and version > current[0]:
+                    current[1].append(payload)
+                    rooms[room_id] = (version, current[1])
+            if valid < len(data):
+                logger.warning("Truncating torn journal tail", extra={"segment": number, "bytes": len(data) - valid})
+                with open(path, 'r+b') as f:
+                    f.truncate(valid)
+
+        self.segment = max([first_segment] + segments) + 1
+        self.recovered_rooms = len(rooms)
+        self.recovery_seconds = time.monotonic() - started
+        return rooms
+
+    def _open_segment(self):
+        # Caller holds write_lock (or is start())
+        self.file = open(self._path('journal', self.segment), 'ab')
+        self.segment_bytes = 0
+
+    def commit(self):
+        """Write and fsync everything appended so far, as one write."""
+        with self.write_lock:
+            with self.lock:
+                batch, self.batch = self.batch, []
+                seq = self.appended
+            if batch:
+                started = time.monotonic()
+                data = b''.join(batch)
+                self.file.write(data)
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.segment_bytes += len(data)
+                elapsed = time.monotonic() - started
+                with self.lock:
+                    self.bytes_written += len(data)
+                    self.commits += 1
+                    self.commit_seconds_max = max(self.commit_seconds_max, elapsed)
+            with self.lock:
+                self.durable = seq
+                self.committed.notify_all()
+
+    def snapshot(self):
+        """Roll to a new segment and write every room into a snapshot covering the old ones."""
+        with self.snapshot_lock:
+            self._snapshot()
+
+    def _snapshot(self):
+        started = time.monotonic()
+        with self.write_lock:
+            self.commit()
+            self.file.close()
+            self.segment += 1
+            self._open_segment()
+            number = self.segment
+
+        # Group commits carry on into the new segment while rooms are dumped. Rooms
+        # changed meanwhile are in both; replay skips records older than the snapshot.
+        tmp_path = self._path('snapshot', number) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for room_id, version, payload in self.snapshot_source():
+                f.write(encode_record(ROOM_FULL, room_id, version, payload))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._path('snapshot', number))
+
+        for old in self._files(SEGMENT_NAME):
+            if old < number:
+                os.remove(self._path('journal', old))
+        for old in self._files(SNAPSHOT_NAME):
+            if old < number:
+                os.remove(self._path('snapshot', old))
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.snapshots += 1
+            self.snapshot_seconds_last = elapsed
+        logger.info("Wrote journal snapshot", extra={"segment": number, "seconds": round(elapsed, 3)})
+
+    def _run(self):
+        last_snapshot = time.monotonic()
+        while True:
+            time.sleep(self.commit_interval)
+            try:
+                self.commit()
+                if (time.monotonic() - last_snapshot >= JOURNAL_SNAPSHOT_INTERVAL
+                        or self.segment_bytes >= JOURNAL_SEGMENT_BYTES):
+                    last_snapshot = time.monotonic()
+                    self.snapshot()
+            except OSError:
+                logger.exception("Journal write failed")
+
+    def start(self, snapshot_source):
+        """Begin appending to a fresh segment. `snapshot_source` yields (room_id, version, payload)."""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.snapshot_source = snapshot_source
+            self._open_segment()
+            self.thread = threading.Thread(target=self._run, name="room-journal", daemon=True)
+        self.thread.start()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "segment": self.segment,
+                "records": self.records,
+                "pending": len(self.batch),
+                "bytes_written": self.bytes_written,
+                "commits": self.commits,
+                "commit_seconds_max": self.commit_seconds_max,
+                "snapshots": self.snapshots,
+                "snapshot_seconds_last": self.snapshot_seconds_last,
+                "recovered_rooms": self.recovered_rooms,
+                "recovery_seconds": self.recovery_seconds,
+                "sync": self.sync
+            }
+
+def register_journal_metrics(journal):
+    registry.counter_callback('trivia_journal_records_total', 'Room records appended to the journal.', lambda: journal.records)
+    registry.counter_callback('trivia_journal_bytes_total', 'Bytes written to journal segments.', lambda: journal.bytes_written)
+    registry.gauge_callback('trivia_journal_pending_records', 'Records waiting for the next group commit.', lambda: len(journal.batch))
@@ -0,0 +1,217 @@
+import itertools
+import random
+
+from src.metrics import TimedLock
+
+MAX_LEVEL = 32 # Enough for 4**32 entries with P = 1/4
+LEVEL_PROBABILITY = 0.25
+HALL_OF_FAME_SIZE = 1000 # Best (room, player) scores kept across all rooms
+
+class _Node:
+    __slots__ = ('key', 'value', 'next', 'width')
+
+    def __init__(self, key, value, level):
+        self.key = key
+        self.value = value
+        self.next = [None] * level
+        self.width = [1] * level # Positions skipped by next[level] (to one past the end if None)
+
+class SkipList:
+    """Sorted map with O(log n) insert, remove and "how many keys are smaller".
+
+    Every forward link also stores how many positions it skips, which is what
+    makes counting (and so ranking) logarithmic instead of a walk.
+    """
+
+    def __init__(self, seed=None):
+        self.head = _Node(None, None, MAX_LEVEL)
+        self.level = 1
+        self.size = 0
+        self.random = random.Random(seed)
+
+    def __len__(self):
+        return self.size
+
+    def _random_level(self):
+        level = 1
+        while level < MAX_LEVEL and self.random.random() < LEVEL_PROBABILITY:
+            level += 1
+        return level
+
+    def _find(self, key):
+        # Last node before `key` on every level, and its position (head is 0)
+        update = [self.head] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+        node = self.head
+        position = 0
+        for level in reversed(range(self.level)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = position
+        return update, positions
+
+    def insert(self, key, value):
+        update, positions = self._find(key)
+        level = self._random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                self.head.width[i] = self.size + 1
+            self.level = level
+        node = _Node(key, value, level)
+        position = positions[0] + 1
+        for i in range(level):
+            prev = update[i]
+            node.next[i] = prev.next[i]
+            prev.next[i] = node
+            node.width[i] = prev.width[i] - (position - positions[i]) + 1
+            prev.width[i] = position - positions[i]
+        for i in range(level, self.level):
+            update[i].width[i] += 1
+        self.size += 1
+
+    def remove(self, key):
+        update, _ = self._find(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for i in range(self.level):
+            prev = update[i]
+            if prev.next[i] is node:
+                prev.width[i] += node.width[i] - 1
+                prev.next[i] = node.next[i]
+            else:
+                prev.width[i] -= 1
+        while self.level > 1 and self.head.next[self.level - 1] is None:
+            self.level -= 1
+        self.size -= 1
+
+    def count_less(self, key):
+        """Number of keys strictly smaller than `key`."""
+        node = self.head
+        position = 0
+        for level in reversed(range(self.level)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+    def last(self):
+        node = self.head
+        for level in reversed(range(self.level)):
+            while node.next[level] is not None:
+                node = node.next[level]
+        return None if node is self.head else (node.key, node.value)
+
+    def items(self, limit=None):
+        node = self.head.next[0]
+        while node is not None and (limit is None or limit > 0):
+            yield node.key, node.value
+            node = node.next[0]
+            if limit is not None:
+                limit -= 1
+
+class Leaderboard:
+    """Members ordered by score, highest first, updated one score change at a time.
+
+    Ties keep the order in which members reached the score. Ranks are
+    competition ranks ("1, 2, 2, 4"). With a capacity, only the best
+    `capacity` members are kept; that stays exact as long as scores only grow.
+    Not thread-safe: callers hold the lock of whatever owns the board.
+    """
+
+    def __init__(self, capacity=None):
+        self.entries = SkipList()
+        self.keys = {} # member -> (-score, sequence) key in self.entries
+        self.sequence = itertools.count()
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, member):
+        return member in self.keys
+
+    def update(self, member, score):
+        key = self.keys.get(member)
+        if key is not None:
+            if -key[0] == score:
+                return
+            self.entries.remove(key)
+        elif self.capacity and len(self.entries) >= self.capacity and score <= -self.entries.last()[0][0]:
+            return # Would be evicted straight away
+        key = (-score, next(self.sequence))
+        self.entries.insert(key, member)
+        self.keys[member] = key
+        if self.capacity and len(self.entries) > self.capacity:
+            last_key, last_member = self.entries.last()
+            self.entries.remove(last_key)
+            del self.keys[last_member]
+
+    def remove(self, member):
+        key = self.keys.pop(member, None)
+        if key is not None:
+            self.entries.remove(key)
+
+    def score(self, member):
+        key = self.keys.get(member)
+        return None if key is None else -key[0]
+
+    def rank(self, member):
+        """1-based rank, or None if the member is not on the board."""
+        key = self.keys.get(member)
+        if key is None:
+            return None
+        return self.entries.count_less((key[0],)) + 1 # (-score,) sorts before every (-score, seq)
+
+    def top(self, k):
+        """[(rank, member, score)] for the best k members."""
+        result = []
+        rank = 0
+        previous = None
+        for position, (key, member) in enumerate(self.entries.items(k), 1):
+            if key[0] != previous:
+                rank, previous = position, key[0]
+            result.append((rank, member, -key[0]))
+        return result
+
+def room_leaderboard(game):
+    board = Leaderboard()
+    for player in game.players.values():
+        board.update(player.player_id, player.score)
+    return board
+
+class HallOfFame:
+    """Best scores across every room this process has seen, kept after rooms expire."""
+
+    def __init__(self, size=HALL_OF_FAME_SIZE):
+        self.board = Leaderboard(capacity=size)
+        self.lock = TimedLock('hall_of_fame')
+
+    def record(self, room_id, player):
+        if player.score <= 0:
+            return
+        with self.lock:
+            self.board.update((room_id, player.player_id, player.name), player.score)
+
+    def record_room(self, game):
+        for player in game.players.values():
+            self.record(game.room_id, player)
+
+    def top(self, k):
+        with self.lock:
+            entries = self.board.top(k)
+        return [
+            {"rank": rank, "room_id": room_id, "player_id": player_id, "player_name": name, "score": score}
+            for rank, (room_id, player_id, name), score in entries
+        ]
+
+    def rank(self, room_id, player):
+        with self.lock:
+            return self.board.rank((room_id, player.player_id, player.name))
+
+    def __len__(self):
+        return len(self.board)
+
+hall_of_fame = HallOfFame()
@@ -0,0 +1,152 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+from src.metrics import registry
+
+# Request threads only put records on an in-memory queue; one listener thread
+# formats them as JSON lines and writes them out. A slow or blocked sink then
+# costs a full queue (and dropped records), never request latency.
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_QUEUE_SIZE = 10000 # Records buffered before new ones are dropped
+RATE_LIMIT_WINDOW = 10 # Seconds per window for repeated-message limiting
+RATE_LIMIT_BURST = 5 # Identical messages let through per window
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'suppressed'}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with room_id/player_id and any other extras as fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if getattr(record, 'suppressed', 0):
+            entry["suppressed"] = record.suppressed # Identical messages dropped since the last one sent
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class RateLimitFilter(logging.Filter):
+    """Lets through RATE_LIMIT_BURST records per (logger, message template) per window.
+
+    A storm of identical upstream timeouts becomes a handful of lines plus a
+    `suppressed` count on the next one that gets through.
+    """
+
+    def __init__(self, window=RATE_LIMIT_WINDOW, burst=RATE_LIMIT_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self.counts = {} # (logger, msg) -> [window start, sent in window, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True # Only repeated warnings and errors storm
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        with self.lock:
+            state = self.counts.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self.counts[key] = [now, 1, 0]
+                if len(self.counts) > 1000:
+                    self._prune(now)
+            elif state[1] < self.burst:
+                state[1] += 1
+                suppressed = state[2]
+                state[2] = 0
+            else:
+                state[2] += 1
+                return False
+        record.suppressed = suppressed
+        return True
+
+    def _prune(self, now):
+        # Caller holds self.lock
+        for key in [k for k, state in self.counts.items() if now - state[0] >= self.window]:
+            del self.counts[key]
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message on the caller's thread but keep the traceback in its own field
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+queue_handler = None
+output_handler = None
+listener = None
+writer_pid = None # Process the writer thread runs in; threads do not survive a fork
+
+def setup_logging(stream=None):
+    """Route the `src` loggers through the queue. Safe to call more than once.
+
+    No thread is started here: records queue up until start_log_writer() runs
+    in the serving process (after any fork).
+    """
+    global queue_handler, output_handler
+    if queue_handler is not None:
+        return
+    output_handler = logging.StreamHandler(stream or sys.stdout)
+    output_handler.setFormatter(JsonFormatter())
+    queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RateLimitFilter())
+
+    logger = logging.getLogger('src')
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+
+def start_log_writer():
+    global listener, writer_pid
+    if queue_handler is None or writer_pid == os.getpid():
+        return
+    writer_pid = os.getpid()
+    listener = logging.handlers.QueueListener(queue_handler.queue, output_handler)
+    listener.start()
+    atexit.register(listener.stop) # Flush what is queued on a clean exit
+
+def get_stats():
+    return {
+        "queued": queue_handler.queue.qsize() if queue_handler else 0,
+        "dropped": queue_handler.dropped if queue_handler else 0
+    }
+
+registry.counter_callback('trivia_log_dropped_total', 'Log records dropped because the log queue was full.', lambda: get_stats()["dropped"])
+registry.gauge_callback('trivia_log_queued', 'Log records waiting for the writer thread.', lambda: get_stats()["queued"])
@@ -1,93 +1,134 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, g
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+import atexit
+import functools
+import hmac
+import logging
+import os
 import requests
-import random
 import time
 import threading
-from datetime import datetime, timedelta
-from collections import deque # Import deque for efficient queue operations
 
-from src.config import TRIVIA_API_URL, games_lock
+from src.admission import admission
+from src.config import ADMIN_TOKEN, DATABASE_URL, QUESTION_POOL_SNAPSHOT, TRUSTED_PROXIES, games_lock
+from src.journal import register_journal_metrics
+from src.leaderboard import hall_of_fame
+from src.log import setup_logging, start_log_writer
+from src.memory_report import room_memory_report
+from src.metrics import registry, CONTENT_TYPE
+from src.profiler import profiler, slow_requests, DEFAULT_PROFILE_SECONDS, DEFAULT_SAMPLE_INTERVAL
+from src.room_expiry import room_expiry, room_phase
+from src.round_timer import round_timer
+from src.state_store import state_store
+from src.question_pool import question_pool, fetch_questions, parse_filter, InvalidFilterError
+from src.trivia_client import TriviaUnavailableError
 from src.routes.game import game_bp
-from src.models.game import games, Game, Player
+from src.models.game import games
+
+# JSON log lines written from a background thread (started with the other services), never from request threads
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
+if TRUSTED_PROXIES:
+    # remote_addr becomes the client address the nearest trusted proxy saw (see admission.client_key)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
 
 app.register_blueprint(game_bp)
 
-# --- Question Caching Logic ---
-question_cache = deque() # Use a deque for efficient appends and pops
-CACHE_FILL_THRESHOLD = 5 # If less than this many questions, refill
-CACHE_FILL_AMOUNT = 20 # How many questions to fetch at once
-last_cache_fill_time = datetime.min # To prevent rapid refilling
-
-def fetch_and_fill_cache(difficulty='any', category='any'):
-    global last_cache_fill_time
-    # Only fetch if cache is low AND enough time has passed since last fetch
-    if len(question_cache) < CACHE_FILL_THRESHOLD and \
-       (datetime.now() - last_cache_fill_time) > timedelta(seconds=5): # Add a 5-second cooldown
-        print(f"Cache low ({len(question_cache)} questions). Refilling with {CACHE_FILL_AMOUNT} new questions...")
-        params = {
-            "amount": CACHE_FILL_AMOUNT,
-            "type": "multiple"
-        }
-        if difficulty != 'any':
-            params["difficulty"] = difficulty
-        if category != 'any':
-            params["category"] = category
-
-        try:
-            response = requests.get(TRIVIA_API_URL, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            if data['response_code'] == 0 and data['results']:
-                for q_data in data['results']:
-                    question = {
-                        "id": str(random.randint(100000, 999999)),
-                        "category": q_data['category'],
-                        "type": q_data['type'],
-                        "difficulty": q_data['difficulty'],
-                        "question": q_data['question'],
-                        "correct_answer": q_data['correct_answer'],
-                        "incorrect_answers": q_data['incorrect_answers']
-                    }
-                    question_cache.append(question)
-                print(f"Cache refilled. Total questions in cache: {len(question_cache)}")
-                last_cache_fill_time = datetime.now()
-            else:
-                print(f"Could not fetch questions from external API. Response code: {data['response_code']}")
-        except requests.exceptions.Timeout:
-            print("Request to trivia API timed out during cache fill.")
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching questions from external API during cache fill: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred during cache fill: {e}")
-
-# Initial cache fill on startup
-with app.app_context(): # Use app_context for initial fetch
-    fetch_and_fill_cache()
-
-# Schedule cleanup for inactive games (existing logic)
-def cleanup_inactive_games():
+REQUEST_LATENCY = registry.histogram('trivia_http_request_duration_seconds', 'Request latency per route.', ('endpoint', 'method'))
+REQUESTS = registry.counter('trivia_http_requests_total', 'Requests per route and status code.', ('endpoint', 'method', 'status'))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    slow_requests.begin()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    endpoint = request.endpoint or 'unknown' # Route names, never raw paths, to keep label sets bounded
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        REQUEST_LATENCY.labels(endpoint, request.method).observe(elapsed)
+        slow_requests.end(endpoint, request.method, request.path, response.status_code, elapsed)
+    REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    return response
+
+def admin_only(view):
+    # Debug endpoints are open unless ADMIN_TOKEN is configured
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if ADMIN_TOKEN and not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+            return jsonify({"error": "Admin token required"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+def rooms_by_phase():
+    # Rooms held by this worker (all rooms with the memory backend)
+    with games_lock:
+        rooms = list(games.values())
+    counts = {('lobby',): 0, ('in_progress',): 0, ('ended',): 0}
+    for game in rooms:
+        counts[(room_phase(game),)] += 1
+    return counts
+
+def active_players():
     with games_lock:
-        inactive_threshold = datetime.now() - timedelta(hours=1)
-        keys_to_delete = [
-            room_id for room_id, game in games.items()
-            if game.last_activity < inactive_threshold
-        ]
-        for room_id in keys_to_delete:
-            print(f"Cleaning up inactive room: {room_id}")
-            del games[room_id]
-
-def start_cleanup_scheduler():
-    cleanup_inactive_games()
-    threading.Timer(1800, start_cleanup_scheduler).start()
-
-if not hasattr(app, 'cleanup_scheduler_started'):
-    app.cleanup_scheduler_started = True
-    start_cleanup_scheduler()
+        rooms = list(games.values())
+    return sum(len(game.players) for game in rooms if not game.game_ended)
+
+registry.gauge_callback('trivia_rooms', 'Rooms held by this worker, by phase.', rooms_by_phase, ('phase',))
+registry.gauge_callback('trivia_players', 'Players in rooms that have not ended.', active_players)
+registry.gauge_callback('trivia_rooms_stored', 'Rooms in the state store (shared across workers with sqlite).', state_store.count)
+if state_store.journal:
+    register_journal_metrics(state_store.journal)
+
+# Durable SQL-backed rooms, only when a database is configured
+if DATABASE_URL:
+    from src.routes.room import init_room_store, start_room_reaper
+    init_room_store(app, DATABASE_URL)
+
+# --- Background services ---
+# Nothing below runs at import: importing the app never touches the network or starts
+# threads. Each serving process calls start_background_services() once (gunicorn.conf.py,
+# the ASGI lifespan, or __main__), after any fork, since threads do not survive one.
+services_lock = threading.Lock()
+services_pid = None
+
+def start_background_services():
+    global services_pid
+    with services_lock:
+        if services_pid == os.getpid():
+            return
+        services_pid = os.getpid()
+
+    start_log_writer()
+    # Rebuild rooms from the journal before anything can create or expire one
+    recovered = state_store.recover()
+    for game in recovered:
+        room_expiry.track(game)
+        hall_of_fame.record_room(game)
+        if getattr(game, 'round_deadline', None) and not game.game_ended:
+            round_timer.schedule(game.room_id, game.current_question_index, game.round_deadline)
+    if recovered:
+        logger.info("Recovered %d rooms from journal", len(recovered))
+    state_store.start_journal()
+    if QUESTION_POOL_SNAPSHOT:
+        loaded = question_pool.load_snapshot(QUESTION_POOL_SNAPSHOT)
+        logger.info("Loaded %d questions from pool snapshot %s", loaded, QUESTION_POOL_SNAPSHOT)
+        atexit.register(question_pool.save_snapshot, QUESTION_POOL_SNAPSHOT)
+    # The default buffer warms up on the refiller thread; /ready reports when it has been tried
+    question_pool.start()
+    question_pool.warm_up()
+    # Expire idle rooms incrementally from a single background thread
+    room_expiry.start()
+    # One scheduler thread for every room's question deadline
+    round_timer.start()
+    if DATABASE_URL:
+        start_room_reaper(app)
 
 @app.route('/')
 def home():
@@ -95,56 +136,124 @@ def home():
 
 @app.route('/health')
 def health_check():
+    # Liveness: the process is up and serving requests
     return jsonify({"status": "healthy"}), 200
 
+@app.route('/ready')
+def readiness_check():
+    # Readiness: this worker's background services run and the question cache has been warmed (or tried)
+    checks = {
+        "background_services": services_pid == os.getpid(),
+        "question_cache": question_pool.warmed_up.is_set()
+    }
+    if all(checks.values()):
+        return jsonify({"status": "ready", "checks": checks}), 200
+    return jsonify({"status": "starting", "checks": checks}), 503
+
 @app.route('/question')
 def get_question():
-    difficulty = request.args.get('difficulty', 'any')
-    category = request.args.get('category', 'any')
-
-    # Attempt to refill cache in background if needed
-    threading.Thread(target=fetch_and_fill_cache, args=(difficulty, category)).start()
-
-    if question_cache:
-        question = question_cache.popleft() # Get question from cache
-        return jsonify(question)
-    else:
-        # If cache is empty, try a direct fetch as a fallback (might still hit 429)
-        print("Cache empty, attempting direct fetch for question.")
-        params = {
-            "amount": 1,
-            "type": "multiple"
-        }
-        if difficulty != 'any':
-            params["difficulty"] = difficulty
-        if category != 'any':
-            params["category"] = category
-
-        try:
-            response = requests.get(TRIVIA_API_URL, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            if data['response_code'] == 0 and data['results']:
-                question_data = data['results'][0]
-                question = {
-                    "id": str(random.randint(100000, 999999)),
-                    "category": question_data['category'],
-                    "type": question_data['type'],
-                    "difficulty": question_data['difficulty'],
-                    "question": question_data['question'],
-                    "correct_answer": question_data['correct_answer'],
-                    "incorrect_answers": question_data['incorrect_answers']
-                }
-                return jsonify(question)
-            else:
-                return jsonify({"error": "Could not fetch question. Try different parameters or check API response."}), 404
-        except requests.exceptions.Timeout:
-            return jsonify({"error": "Request to trivia API timed out."}), 504
-        except requests.exceptions.RequestException as e:
-            return jsonify({"error": f"Error fetching question from external API: {e}"}), 500
-        except Exception as e:
-            return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
+    try:
+        difficulty, category, question_type = parse_filter(
+            request.args.get('difficulty', 'any'),
+            request.args.get('category', 'any'),
+            request.args.get('type', 'multiple')
+        )
+    except InvalidFilterError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Low buffers are refilled by the pool's background thread
+    question = question_pool.get(difficulty, category, question_type)
+    if question:
+        return Response(question["json"], mimetype='application/json') # Rendered once at ingestion
+
+    # If this filter's buffer is empty, try a direct fetch as a fallback (might still hit 429)
+    logger.info("Cache empty for %s/%s/%s, attempting direct fetch for question", difficulty, category, question_type)
+    try:
+        questions = fetch_questions(1, difficulty, category, question_type)
+        if questions:
+            return Response(questions[0]["json"], mimetype='application/json')
+        else:
+            return jsonify({"error": "Could not fetch question. Try different parameters or check API response."}), 404
+    except TriviaUnavailableError as e:
+        # Circuit open or rate limited: fail fast instead of queueing on opentdb
+        return jsonify({"error": f"Trivia API unavailable: {e}"}), 503, {"Retry-After": str(int(e.retry_after) + 1)}
+    except requests.exceptions.Timeout:
+        return jsonify({"error": "Request to trivia API timed out."}), 504
+    except requests.exceptions.RequestException as e:
+        return jsonify({"error": f"Error fetching question from external API: {e}"}), 500
+    except Exception as e:
+        return jsonify({"error": f"An unexpected error occurred: {e}"}), 500
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+@app.route('/debug/memory')
+@admin_only
+def debug_memory():
+    # Walks every room; meant for sizing instances, not for frequent polling
+    with games_lock:
+        rooms = list(games.values())
+    return jsonify(room_memory_report(rooms, top=request.args.get('top', 10, type=int))), 200
+
+@app.route('/debug/profile', methods=['GET', 'POST', 'DELETE'])
+@admin_only
+def debug_profile():
+    # Per worker: POST ?seconds=10&interval=0.01 starts sampling (add wait=1 to get the result
+    # in the response), GET returns the last profile as collapsed stacks, DELETE stops early
+    if request.method == 'POST':
+        seconds = request.args.get('seconds', DEFAULT_PROFILE_SECONDS, type=float)
+        interval = request.args.get('interval', DEFAULT_SAMPLE_INTERVAL, type=float)
+        if not profiler.start(seconds, interval):
+            return jsonify(dict(profiler.get_stats(), error="A profile is already running")), 409
+        if not request.args.get('wait'):
+            return jsonify(profiler.get_stats()), 202
+        profiler.wait()
+    elif request.method == 'DELETE':
+        profiler.stop()
+        return jsonify(profiler.get_stats()), 200
+    elif request.args.get('format') == 'json':
+        return jsonify(profiler.get_stats()), 200
+    stats = profiler.get_stats()
+    return Response(profiler.collapsed(), mimetype='text/plain', headers={
+        "X-Profile-Samples": str(stats["samples"]),
+        "X-Profile-Running": str(stats["running"]).lower(),
+        "X-Worker-Pid": str(stats["pid"])
+    })
+
+@app.route('/debug/slow_requests', methods=['GET', 'POST'])
+@admin_only
+def debug_slow_requests():
+    # POST ?threshold=0.2 changes this worker's threshold (seconds)
+    if request.method == 'POST':
+        threshold = request.args.get('threshold', type=float)
+        if threshold is None or threshold < 0:
+            return jsonify({"error": "threshold must be a number of seconds"}), 400
+        slow_requests.threshold = threshold
+    return jsonify(slow_requests.get_stats()), 200
+
+@app.route('/admission/stats')
+def admission_stats():
+    return jsonify(admission.get_stats()), 200
+
+@app.route('/room_expiry/stats')
+def room_expiry_stats():
+    return jsonify(room_expiry.get_stats()), 200
+
+@app.route('/round_timer/stats')
+def round_timer_stats():
+    return jsonify(round_timer.get_stats()), 200
+
+@app.route('/journal/stats')
+def journal_stats():
+    if not state_store.journal:
+        return jsonify({"error": "Journal is not enabled"}), 404
+    return jsonify(state_store.journal.get_stats()), 200
+
+@app.route('/question_pool/stats')
+def question_pool_stats():
+    return jsonify(question_pool.get_stats()), 200
 
 if __name__ == '__main__':
+    start_background_services()
     app.run(debug=True, host='0.0.0.0', port=5000)
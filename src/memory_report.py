@@ -0,0 +1,68 @@
+import sys
+import threading
+
+from src.models.game import Game
+from src.question_table import question_table
+
+LOCK_TYPE = type(threading.Lock())
+
+def deep_sizeof(obj, seen):
+    """Approximate bytes reachable from `obj`, counting shared objects once across calls with the same `seen`.
+
+    Walks with an explicit stack: linked structures such as the leaderboard's
+    skip list are far deeper than Python's recursion limit.
+    """
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen[id(obj)] = obj # Keep temporaries alive so their ids are not reused mid-walk
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)) or type(obj).__name__ == 'deque':
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__') and not isinstance(obj, LOCK_TYPE):
+            stack.append(vars(obj))
+        elif hasattr(obj, '__slots__'):
+            stack.extend(getattr(obj, slot) for slot in obj.__slots__ if hasattr(obj, slot))
+    return size
+
+def room_memory_report(games, top=10):
+    """Bytes per room, split into game state and per-worker runtime (locks, event history, cached JSON).
+
+    `games` is a list of Game objects; each is measured under its own lock. The
+    shared question table is reported once, and rooms are not charged for it.
+    """
+    shared = {} # Interned strings and shared question dicts are only counted once overall
+    question_table_bytes = deep_sizeof(dict(question_table.questions), shared)
+    rooms = []
+    for game in games:
+        with game.lock:
+            state = {name: getattr(game, name) for name in Game.STATE_FIELDS}
+            runtime = {name: getattr(game, name) for name in Game.RUNTIME_FIELDS if hasattr(game, name)}
+            state_bytes = sys.getsizeof(game) + deep_sizeof(state, shared)
+            runtime_bytes = deep_sizeof(runtime, shared)
+            rooms.append({
+                "room_id": game.room_id,
+                "players": len(game.players),
+                "state_bytes": state_bytes,
+                "runtime_bytes": runtime_bytes,
+                "total_bytes": state_bytes + runtime_bytes
+            })
+
+    total = sum(room["total_bytes"] for room in rooms)
+    per_room = total / len(rooms) if rooms else 0
+    rooms.sort(key=lambda room: room["total_bytes"], reverse=True)
+    return {
+        "rooms": len(rooms),
+        "total_bytes": total,
+        "bytes_per_room": round(per_room),
+        "bytes_per_player": round(total / max(1, sum(room["players"] for room in rooms))),
+        "projected_bytes_for_100k_rooms": round(per_room * 100000),
+        "question_table": {"questions": len(question_table), "bytes": question_table_bytes},
+        "largest_rooms": rooms[:top]
+    }
@@ -0,0 +1,257 @@
+import bisect
+import threading
+import time
+
+# Prometheus text exposition without a client library: counters, histograms,
+# and gauges read from a callback at scrape time. Metrics are per process, so
+# with several gunicorn workers each worker reports its own numbers.
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LOCK_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+# Seconds spent waiting on locks and upstream calls by the request running on this
+# thread, for the slow-request recorder (src/profiler.py). Only set while a request runs.
+request_timings = threading.local()
+
+def add_request_time(kind, seconds):
+    values = getattr(request_timings, 'values', None)
+    if values is not None:
+        values[kind] = values.get(kind, 0.0) + seconds
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {} # label values -> child
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = self._new_child()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.children[()].inc(amount)
+
+    def render(self):
+        lines = self.header()
+        for values, child in list(self.children.items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, values)} {format_value(child.value)}")
+        return lines
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.children[()].observe(value)
+
+    def time(self):
+        return self.children[()].time()
+
+    def render(self):
+        lines = self.header()
+        for values, child in list(self.children.items()):
+            with child.lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                labels = format_labels(self.labelnames, values, [('le', format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class CallbackMetric:
+    """A gauge or counter whose value is read from `fn` at scrape time.
+
+    `fn` returns a number, or a dict of label-value tuples to numbers.
+    """
+
+    def __init__(self, name, help, fn, labelnames=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in values.items():
+            lines.append(f"{self.name}{format_labels(self.labelnames, label_values)} {format_value(value)}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric already registered: {metric.name}")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(self, name, help, fn, labelnames=()):
+        return self.register(CallbackMetric(name, help, fn, labelnames))
+
+    def counter_callback(self, name, help, fn, labelnames=()):
+        return self.register(CallbackMetric(name, help, fn, labelnames, kind='counter'))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # One broken callback should not take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+LOCK_WAIT = registry.histogram('trivia_lock_wait_seconds', 'Time spent waiting to acquire a lock.', ('lock',), LOCK_BUCKETS)
+LOCK_HOLD = registry.histogram('trivia_lock_hold_seconds', 'Time a lock was held per acquisition.', ('lock',), LOCK_BUCKETS)
+
+class TimedLock:
+    """Drop-in threading.Lock that records wait and hold times per lock name.
+
+    Uncontended acquires cost one extra non-blocking attempt and two clock
+    reads. Time spent inside Condition.wait() is not counted as held.
+    """
+
+    def __init__(self, name):
+        self._lock = threading.Lock()
+        self.wait_time = LOCK_WAIT.labels(name)
+        self.hold_time = LOCK_HOLD.labels(name)
+        self.acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            waited = 0.0
+        elif not blocking:
+            return False
+        else:
+            started = time.perf_counter()
+            if not self._lock.acquire(True, timeout):
+                return False
+            waited = time.perf_counter() - started
+            add_request_time('lock_wait', waited)
+        self.acquired_at = time.perf_counter()
+        self.wait_time.observe(waited)
+        return True
+
+    def release(self):
+        held = time.perf_counter() - self.acquired_at
+        self._lock.release()
+        self.hold_time.observe(held)
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    # threading.Condition hooks: waiting on a condition neither waits for nor holds the lock
+    def _release_save(self):
+        self.hold_time.observe(time.perf_counter() - self.acquired_at)
+        self._lock.release()
+
+    def _acquire_restore(self, state):
+        self._lock.acquire()
+        self.acquired_at = time.perf_counter()
+
+    def _is_owned(self):
+        return self._lock.locked()
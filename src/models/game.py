@@ -1,324 +1,135 @@
-from flask import Blueprint, request, jsonify
-from src.models.user import db
-from src.models.game import Room, Player
-import random
-import string
-import requests
-import json
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import datetime
 
-game_bp = Blueprint('game', __name__)
+from src.question_table import question_table
 
-def generate_room_code():
-    """Genera un código único de 6 caracteres para la sala"""
-    while True:
-        code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        if not Room.query.filter_by(code=code).first():
-            return code
+POINTS_PER_ANSWER = 1 # Same scoring as the durable room store
+NOT_AN_OPTION = 0xFF # Packed answer for a reply that matches none of the options
 
-def decode_html(text):
-    """Decodifica entidades HTML"""
-    return text.replace('&quot;', '"').replace('&#039;', "'").replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>')
+class Player:
+    __slots__ = ('player_id', 'name', 'score', 'seat')
 
-def fetch_trivia_question(difficulty='', category=''):
-    """Obtiene una pregunta de trivia de la API con configuraciones opcionales"""
-    try:
-        url = 'https://opentdb.com/api.php?amount=1&type=multiple'
-        if difficulty:
-            url += f'&difficulty={difficulty}'
-        if category:
-            url += f'&category={category}'
-            
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        
-        if data['response_code'] == 0 and data['results']:
-            question_data = data['results'][0]
-            
-            # Formatear la pregunta
-            question = {
-                'question': decode_html(question_data['question']),
-                'options': [
-                    decode_html(question_data['correct_answer']),
-                    *[decode_html(ans) for ans in question_data['incorrect_answers']]
-                ],
-                'category': question_data['category'],
-                'difficulty': question_data['difficulty']
-            }
-            
-            # Mezclar las opciones y encontrar el índice correcto
-            correct_answer = question['options'][0]
-            random.shuffle(question['options'])
-            question['correct_answer'] = question['options'].index(correct_answer)
-            
-            return question
-    except Exception as e:
-        print(f"Error fetching question: {e}")
-    
-    return None
+    def __init__(self, player_id, name, seat):
+        self.player_id = player_id
+        self.name = name
+        self.score = 0
+        self.seat = seat # Index of this player's byte in Game.answers
 
-def cleanup_inactive_rooms():
-    """Limpia salas inactivas (más de 1 hora sin actividad)"""
-    try:
-        cutoff_time = datetime.utcnow() - timedelta(hours=1)
-        inactive_rooms = Room.query.filter(Room.created_at < cutoff_time).all()
-        for room in inactive_rooms:
-            # Eliminar jugadores de la sala
-            Player.query.filter_by(room_id=room.id).delete()
-            # Eliminar la sala
-            db.session.delete(room)
-        db.session.commit()
-    except Exception as e:
-        print(f"Error cleaning up rooms: {e}")
-        db.session.rollback()
+class Game:
+    """One multiplayer room. Not thread-safe: callers hold the room's lock."""
 
-@game_bp.route('/create-room', methods=['POST'])
-def create_room():
-    """Crea una nueva sala de juego"""
-    try:
-        # Limpiar salas inactivas primero
-        cleanup_inactive_rooms()
-        
-        data = request.get_json()
-        player_name = data.get('player_name', '').strip()
-        settings = data.get('settings', {})
-        
-        if not player_name:
-            return jsonify({'error': 'Player name is required'}), 400
-        
-        # Crear nueva sala con configuraciones
-        room_code = generate_room_code()
-        room = Room(
-            code=room_code,
-            is_active=True,
-            created_at=datetime.utcnow(),
-            # Guardar configuraciones como JSON en un campo de texto
-            current_question=json.dumps({
-                'settings': {
-                    'difficulty': settings.get('difficulty', ''),
-                    'category': settings.get('category', ''),
-                    'amount': settings.get('amount', 10)
-                }
-            })
-        )
-        db.session.add(room)
-        db.session.flush()  # Para obtener el ID de la sala
-        
-        # Crear el jugador creador
-        player = Player(
-            name=player_name, 
-            room_id=room.id,
-            last_seen=datetime.utcnow()
-        )
-        db.session.add(player)
-        db.session.commit()
-        
-        return jsonify({
-            'room_code': room_code,
-            'room_id': room.id,
-            'player_id': player.id,
-            'player_name': player_name
-        })
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error creating room: {e}")
-        return jsonify({'error': 'Failed to create room. Please try again.'}), 500
+    # Saved and restored with the room (see src.state_store)
+    STATE_FIELDS = ('room_id', 'difficulty', 'category', 'num_questions', 'time_limit', 'version',
+                    'players', 'players_by_name', 'scores', 'answered_count', 'answers',
+                    'game_started', 'game_ended', 'current_question', 'question_instance',
+                    'current_question_index', 'asked_questions', 'question_queue',
+                    'round_deadline', 'last_activity')
+    # Per-process attributes that never leave the worker: locks, event history, cached JSON, indexes
+    RUNTIME_FIELDS = ('lock', 'changed', 'events', 'snapshot_version', 'snapshot_body', 'persisted_activity',
+                      'leaderboard', 'changes')
+    __slots__ = STATE_FIELDS + RUNTIME_FIELDS
 
-@game_bp.route('/join-room', methods=['POST'])
-def join_room():
-    """Se une a una sala existente"""
-    try:
-        data = request.get_json()
-        room_code = data.get('room_code', '').strip().upper()
-        player_name = data.get('player_name', '').strip()
-        
-        if not room_code or not player_name:
-            return jsonify({'error': 'Room code and player name are required'}), 400
-        
-        # Buscar la sala
-        room = Room.query.filter_by(code=room_code, is_active=True).first()
-        if not room:
-            return jsonify({'error': 'Room not found or inactive'}), 404
-        
-        # Verificar si ya hay un jugador con ese nombre en la sala
-        existing_player = Player.query.filter_by(room_id=room.id, name=player_name).first()
-        if existing_player:
-            # Si el jugador ya existe, actualizar su last_seen y devolver sus datos
-            existing_player.last_seen = datetime.utcnow()
-            db.session.commit()
-            return jsonify({
-                'room_code': room_code,
-                'room_id': room.id,
-                'player_id': existing_player.id,
-                'player_name': player_name
-            })
-        
-        # Crear el nuevo jugador
-        player = Player(
-            name=player_name, 
-            room_id=room.id,
-            last_seen=datetime.utcnow()
-        )
-        db.session.add(player)
-        db.session.commit()
-        
-        return jsonify({
-            'room_code': room_code,
-            'room_id': room.id,
-            'player_id': player.id,
-            'player_name': player_name
-        })
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error joining room: {e}")
-        return jsonify({'error': 'Failed to join room. Please try again.'}), 500
+    def __init__(self, room_id, host_id, host_name, difficulty='any', category='any', num_questions=10, time_limit=0):
+        self.room_id = room_id
+        self.difficulty = difficulty
+        self.category = category
+        self.num_questions = num_questions
+        self.time_limit = time_limit # Seconds per question; 0 waits for every player
+        self.version = 0
+        host = Player(host_id, host_name, 0)
+        self.players = {host_id: host} # player_id -> Player
+        # Indexes kept in step with players, so hot paths never scan the room
+        self.players_by_name = {host_name: host}
+        self.scores = {host_name: 0} # name -> score
+        self.answered_count = 0 # Players who answered the current question
+        # One byte per seat for the current round: 0 unanswered, else option index + 1 (or NOT_AN_OPTION)
+        self.answers = bytearray(1)
+        self.game_started = False
+        self.game_ended = False
+        self.current_question = None # Id in the shared question table
+        self.question_instance = None # This room's id for the current question, sent to players
+        self.current_question_index = 0 # Questions asked so far
+        self.asked_questions = [] # Question texts, so a game never repeats one
+        self.question_queue = deque() # Ids of the questions reserved for the rest of the game
+        self.round_deadline = None
+        self.last_activity = datetime.now()
+        self.changes = None # Mutations since the last save, as (method, *args), when a journal records them
 
-@game_bp.route('/room/<room_id>/status', methods=['GET'])
-def get_room_status(room_id):
-    """Obtiene el estado actual de la sala"""
-    try:
-        room = Room.query.filter_by(id=room_id, is_active=True).first()
-        if not room:
-            return jsonify({'error': 'Room not found or inactive'}), 404
-        
-        # Actualizar last_seen del jugador que hace la consulta
-        player_id = request.args.get('player_id')
-        if player_id:
-            player = Player.query.get(player_id)
-            if player and player.room_id == int(room_id):
-                player.last_seen = datetime.utcnow()
-                db.session.commit()
-        
-        players = Player.query.filter_by(room_id=room_id).all()
-        
-        # Parsear la pregunta actual o configuraciones
-        current_data = json.loads(room.current_question) if room.current_question else {}
-        current_question = current_data if 'question' in current_data else None
-        
-        return jsonify({
-            'room_code': room.code,
-            'question_number': room.question_number,
-            'current_question': current_question,
-            'is_active': room.is_active,
-            'players': [{
-                'id': player.id,
-                'name': player.name,
-                'score': player.score,
-                'has_answered': player.has_answered
-            } for player in players]
-        })
-        
-    except Exception as e:
-        print(f"Error getting room status: {e}")
-        return jsonify({'error': 'Failed to get room status'}), 500
+    def _record(self, *change):
+        if self.changes is not None:
+            self.changes.append(change)
 
-@game_bp.route('/room/<room_id>/next-question', methods=['POST'])
-def next_question(room_id):
-    """Carga la siguiente pregunta para la sala"""
-    try:
-        room = Room.query.filter_by(id=room_id, is_active=True).first()
-        if not room:
-            return jsonify({'error': 'Room not found or inactive'}), 404
-        
-        # Obtener configuraciones de la sala
-        room_data = json.loads(room.current_question) if room.current_question else {}
-        settings = room_data.get('settings', {})
-        
-        # Verificar si se ha alcanzado el límite de preguntas
-        max_questions = settings.get('amount', 10)
-        if room.question_number >= max_questions:
-            return jsonify({'error': 'Game completed', 'game_finished': True}), 400
-        
-        # Obtener nueva pregunta con configuraciones
-        question = fetch_trivia_question(
-            difficulty=settings.get('difficulty', ''),
-            category=settings.get('category', '')
-        )
-        if not question:
-            return jsonify({'error': 'Failed to fetch question'}), 500
-        
-        # Actualizar la sala
-        room.current_question = json.dumps(question)
-        room.question_number += 1
-        
-        # Resetear respuestas de todos los jugadores
-        Player.query.filter_by(room_id=room_id).update({
-            'current_answer': None,
-            'has_answered': False
-        })
-        
-        db.session.commit()
-        
-        return jsonify({
-            'question': question,
-            'question_number': room.question_number,
-            'total_questions': max_questions
-        })
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error loading next question: {e}")
-        return jsonify({'error': 'Failed to load next question'}), 500
+    def add_player(self, name, player_id):
+        if self.game_ended or player_id in self.players or name in self.players_by_name:
+            return False # Names are unique in a room: scores and answers by name are keyed on them
+        player = self.players[player_id] = Player(player_id, name, len(self.players))
+        self.players_by_name[name] = player
+        self.scores[name] = 0
+        self.answers.append(0)
+        self._record('add_player', name, player_id)
+        return True
 
-@game_bp.route('/player/<player_id>/answer', methods=['POST'])
-def submit_answer(player_id):
-    """Envía la respuesta de un jugador"""
-    try:
-        data = request.get_json()
-        answer = data.get('answer')
-        
-        if answer is None:
-            return jsonify({'error': 'Answer is required'}), 400
-        
-        player = Player.query.get(player_id)
-        if not player:
-            return jsonify({'error': 'Player not found'}), 404
-        
-        room = Room.query.filter_by(id=player.room_id, is_active=True).first()
-        if not room or not room.current_question:
-            return jsonify({'error': 'No active question'}), 400
-        
-        # Actualizar respuesta del jugador
-        player.current_answer = answer
-        player.has_answered = True
-        player.last_seen = datetime.utcnow()
-        
-        # Verificar si la respuesta es correcta
-        question_data = json.loads(room.current_question)
-        is_correct = False
-        if 'question' in question_data and answer == question_data['correct_answer']:
-            player.score += 1
-            is_correct = True
-        
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'is_correct': is_correct,
-            'correct_answer': question_data.get('correct_answer', -1)
-        })
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error submitting answer: {e}")
-        return jsonify({'error': 'Failed to submit answer'}), 500
+    def get_players_list(self):
+        return [{"id": p.player_id, "name": p.name} for p in self.players.values()]
 
-@game_bp.route('/room/<room_id>/close', methods=['POST'])
-def close_room(room_id):
-    """Cierra una sala de juego"""
-    try:
-        room = Room.query.get(room_id)
-        if not room:
-            return jsonify({'error': 'Room not found'}), 404
-        
-        room.is_active = False
-        db.session.commit()
-        
-        return jsonify({'success': True})
-        
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error closing room: {e}")
-        return jsonify({'error': 'Failed to close room'}), 500
+    def get_player_scores(self):
+        return dict(self.scores)
+
+    def start_game(self):
+        self.game_started = True
+        self._record('start_game')
+
+    def end_game(self):
+        self.game_ended = True
+        self.question_queue = deque() # Unused reserved questions are released right away
+        self._record('end_game')
+
+    def reserve_questions(self, question_ids):
+        """Queue shared question ids for the rest of the game."""
+        self.question_queue = deque(question_ids)
+        self._record('reserve_questions', tuple(question_ids))
+
+    def get_current_question(self):
+        return question_table.get(self.current_question) if self.current_question else None
+
+    def set_current_question(self, question, instance_id):
+        """Ask `question` (a shared question table entry) under this room's `instance_id`.
+
+        Takes it off the reserved queue when it is next there.
+        """
+        if self.question_queue and self.question_queue[0] == question['id']:
+            self.question_queue.popleft()
+        self.current_question = question['id']
+        self.question_instance = instance_id
+        self.current_question_index += 1
+        self.asked_questions.append(question['question'])
+        self.answered_count = 0
+        self.answers = bytearray(len(self.players))
+        self._record('set_current_question', question, instance_id)
+
+    def has_answered(self, player):
+        return self.answers[player.seat] != 0
+
+    def submit_answer(self, player_id, question_id, answer):
+        """Record a player's answer to the current question. False if it is not accepted."""
+        player = self.players.get(player_id)
+        if player is None or self.current_question is None or self.game_ended or self.answers[player.seat]:
+            return False
+        if question_id != self.question_instance:
+            return False # Stale question (the round moved on)
+        question = question_table.get(self.current_question)
+        options = question['options']
+        self.answers[player.seat] = options.index(answer) + 1 if answer in options else NOT_AN_OPTION
+        self.answered_count += 1
+        if answer == question['correct_answer']:
+            player.score += POINTS_PER_ANSWER
+            self.scores[player.name] = player.score
+        self._record('submit_answer', player_id, question_id, answer)
+        return True
+
+    def all_players_answered(self):
+        return self.answered_count >= len(self.players)
+
+# room_id -> Game for every room this process holds. Only insert/remove under
+# src.config.games_lock; each game's state is guarded by its own game.lock.
+games = {}
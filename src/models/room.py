@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+# Objects stay readable after commit, so building a response never triggers a reload
+db = SQLAlchemy(session_options={'expire_on_commit': False})
+
+class Room(db.Model):
+    __tablename__ = 'rooms'
+
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(6), nullable=False, unique=True, index=True)
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_activity = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    question_number = db.Column(db.Integer, nullable=False, default=0)
+    # Typed settings instead of JSON text hidden inside current_question
+    difficulty = db.Column(db.String(16), nullable=False, default='')
+    category = db.Column(db.String(16), nullable=False, default='')
+    amount = db.Column(db.Integer, nullable=False, default=10)
+    current_question = db.Column(db.JSON) # Decoded by the driver, no json.loads per poll
+
+    players = db.relationship('Player', backref='room', lazy='selectin',
+                              cascade='all, delete-orphan', passive_deletes=True)
+
+class Player(db.Model):
+    __tablename__ = 'players'
+    __table_args__ = (
+        db.UniqueConstraint('room_id', 'name', name='uq_players_room_name'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id', ondelete='CASCADE'), nullable=False, index=True)
+    last_seen = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    score = db.Column(db.Integer, nullable=False, default=0)
+    has_answered = db.Column(db.Boolean, nullable=False, default=False)
+    current_answer = db.Column(db.Integer)
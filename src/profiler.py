@@ -0,0 +1,177 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from src.config import SLOW_REQUEST_THRESHOLD
+from src.metrics import registry, request_timings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_SECONDS = 10
+MAX_PROFILE_SECONDS = 120
+DEFAULT_SAMPLE_INTERVAL = 0.01 # 100 Hz; each sample walks every thread's stack while holding the GIL
+MIN_SAMPLE_INTERVAL = 0.001
+SLOW_REQUEST_HISTORY = 200 # Slow requests kept per worker
+
+THREAD_NUMBER = re.compile(r'[-_ ]?\d+') # "Thread-12 (process_request_thread)" -> "Thread (process_request_thread)"
+
+class SamplingProfiler:
+    """Statistical profiler over sys._current_frames(), started on demand for a few seconds.
+
+    A background thread snapshots every thread's Python stack at a fixed
+    interval and counts identical stacks. The result is in collapsed-stack
+    format ("root;caller;callee count" per line), which flamegraph.pl and
+    speedscope read directly. Nothing is hooked into the interpreter, so when
+    no profile is running it costs nothing.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self.interval = DEFAULT_SAMPLE_INTERVAL
+        self.stop_requested = threading.Event()
+        self.labels = {} # code object -> frame label, so samples don't re-format names
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, seconds=DEFAULT_PROFILE_SECONDS, interval=DEFAULT_SAMPLE_INTERVAL):
+        """Begin a profile of `seconds`. Returns False if one is already running."""
+        with self.lock:
+            if self.running():
+                return False
+            self.stacks = Counter()
+            self.samples = 0
+            self.started_at = time.time()
+            self.duration = min(max(seconds, 0), MAX_PROFILE_SECONDS)
+            self.interval = max(interval, MIN_SAMPLE_INTERVAL)
+            self.stop_requested.clear()
+            self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self.thread.start()
+        logger.info("Profiler started", extra={"seconds": self.duration, "interval": self.interval})
+        return True
+
+    def stop(self):
+        self.stop_requested.set()
+
+    def wait(self):
+        thread = self.thread
+        if thread is not None:
+            thread.join()
+
+    def _label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self.labels[code] = label
+        return label
+
+    def _sample(self, own_id, names):
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, 'unknown'))
+            labels.reverse()
+            stacks.append(';'.join(labels))
+        return stacks
+
+    def _run(self):
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + self.duration
+        names = {}
+        while not self.stop_requested.is_set() and time.monotonic() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: THREAD_NUMBER.sub('', t.name) for t in threading.enumerate()}
+            stacks = self._sample(own_id, names)
+            with self.lock:
+                self.stacks.update(stacks)
+                self.samples += 1
+            self.stop_requested.wait(self.interval)
+        logger.info("Profiler finished", extra={"samples": self.samples})
+
+    def collapsed(self):
+        with self.lock:
+            return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "running": self.running(),
+                "started_at": self.started_at,
+                "seconds": self.duration,
+                "interval": self.interval,
+                "samples": self.samples,
+                "distinct_stacks": len(self.stacks),
+                "pid": os.getpid()
+            }
+
+class SlowRequestRecorder:
+    """Keeps the most recent requests that took longer than a threshold.
+
+    Each entry says where the time went: waiting on locks (any TimedLock),
+    waiting on opentdb, and how many players the room had.
+    """
+
+    def __init__(self, threshold=SLOW_REQUEST_THRESHOLD, history=SLOW_REQUEST_HISTORY):
+        self.threshold = threshold # Seconds; changeable at runtime
+        self.requests = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self.recorded = 0
+
+    def begin(self):
+        request_timings.values = {}
+
+    def note_room(self, game):
+        # Called by the routes once they have the room
+        values = getattr(request_timings, 'values', None)
+        if values is not None:
+            values['room_id'] = game.room_id
+            values['room_players'] = len(game.players)
+
+    def end(self, endpoint, method, path, status, duration):
+        values = getattr(request_timings, 'values', None)
+        request_timings.values = None
+        if values is None or duration < self.threshold:
+            return
+        entry = {
+            "ts": round(time.time(), 3),
+            "endpoint": endpoint,
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration": round(duration, 6),
+            "lock_wait": round(values.get('lock_wait', 0.0), 6),
+            "upstream": round(values.get('upstream', 0.0), 6),
+            "room_id": values.get('room_id'),
+            "room_players": values.get('room_players')
+        }
+        with self.lock:
+            self.requests.append(entry)
+            self.recorded += 1
+        logger.warning("Slow request", extra=entry)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "threshold": self.threshold,
+                "recorded": self.recorded,
+                "pid": os.getpid(),
+                "requests": list(reversed(self.requests)) # Newest first
+            }
+
+profiler = SamplingProfiler()
+slow_requests = SlowRequestRecorder()
+registry.counter_callback('trivia_slow_requests_total', 'Requests slower than the slow-request threshold.', lambda: slow_requests.recorded)
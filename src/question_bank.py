@@ -0,0 +1,169 @@
+import html
+import json
+import random
+import sqlite3
+import sys
+import threading
+
+from src.config import QUESTION_BANK_PATH
+
+# opentdb category ids, so dumps fetched without a category filter can still be looked up by id
+OPENTDB_CATEGORIES = {
+    "General Knowledge": 9,
+    "Entertainment: Books": 10,
+    "Entertainment: Film": 11,
+    "Entertainment: Music": 12,
+    "Entertainment: Musicals & Theatres": 13,
+    "Entertainment: Television": 14,
+    "Entertainment: Video Games": 15,
+    "Entertainment: Board Games": 16,
+    "Science & Nature": 17,
+    "Science: Computers": 18,
+    "Science: Mathematics": 19,
+    "Mythology": 20,
+    "Sports": 21,
+    "Geography": 22,
+    "History": 23,
+    "Politics": 24,
+    "Art": 25,
+    "Celebrities": 26,
+    "Animals": 27,
+    "Vehicles": 28,
+    "Entertainment: Comics": 29,
+    "Science: Gadgets": 30,
+    "Entertainment: Japanese Anime & Manga": 31,
+    "Entertainment: Cartoon & Animations": 32,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER,
+    category TEXT NOT NULL,
+    type TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    question TEXT NOT NULL UNIQUE,
+    correct_answer TEXT NOT NULL,
+    incorrect_answers TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_category ON questions (category_id, difficulty, type);
+CREATE INDEX IF NOT EXISTS idx_questions_difficulty ON questions (difficulty, type);
+"""
+
+MAX_DRAW_ATTEMPTS = 8 # Random probes per question before giving up on avoiding repeats
+
+class QuestionBank:
+    """Local SQLite question store with O(1) random draws per (difficulty, category, type)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.ids = {} # (difficulty, category_id, type) -> list of row ids, built on first draw
+
+    def add_questions(self, questions, category_id=None):
+        """Insert opentdb-shaped question dicts, skipping ones already in the bank."""
+        rows = []
+        for q in questions:
+            row_category_id = category_id
+            if row_category_id is None:
+                row_category_id = OPENTDB_CATEGORIES.get(html.unescape(q['category']))
+            rows.append((
+                row_category_id,
+                q['category'],
+                q['type'],
+                q['difficulty'],
+                q['question'],
+                q['correct_answer'],
+                json.dumps(q['incorrect_answers'])
+            ))
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO questions "
+                "(category_id, category, type, difficulty, question, correct_answer, incorrect_answers) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+            added = self.conn.total_changes - before
+            if added:
+                self.ids.clear() # New rows: rebuild the draw indexes lazily
+        return added
+
+    def import_dump(self, path, category_id=None):
+        """Bulk-import an opentdb JSON dump (an API response or a plain list of results)."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            data = data.get('results', [])
+        return self.add_questions(data, category_id)
+
+    def _ids_for(self, key):
+        # Caller holds self.lock
+        ids = self.ids.get(key)
+        if ids is None:
+            difficulty, category_id, question_type = key
+            clauses, params = ["type = ?"], [question_type]
+            if difficulty != 'any':
+                clauses.append("difficulty = ?")
+                params.append(difficulty)
+            if category_id is not None:
+                clauses.append("category_id = ?")
+                params.append(category_id)
+            sql = "SELECT id FROM questions WHERE " + " AND ".join(clauses)
+            ids = [row[0] for row in self.conn.execute(sql, params)]
+            self.ids[key] = ids
+        return ids
+
+    def draw(self, amount, difficulty='any', category='any', question_type='multiple', exclude=()):
+        """Return up to `amount` distinct random questions whose (decoded) text is not in `exclude`."""
+        category_id = None
+        if category not in (None, '', 'any'):
+            try:
+                category_id = int(category)
+            except (TypeError, ValueError):
+                return [] # Not an opentdb category id, so nothing in the bank can match
+        key = (difficulty or 'any', category_id, question_type or 'multiple')
+        with self.lock:
+            ids = self._ids_for(key)
+            if not ids:
+                return []
+            picked = set()
+            questions = []
+            for _ in range(amount):
+                for _ in range(MAX_DRAW_ATTEMPTS):
+                    row_id = ids[random.randrange(len(ids))]
+                    if row_id in picked:
+                        continue
+                    picked.add(row_id)
+                    row = self.conn.execute("SELECT * FROM questions WHERE id = ?", (row_id,)).fetchone()
+                    if row is None or html.unescape(row['question']) in exclude:
+                        continue
+                    questions.append({
+                        "category": row['category'],
+                        "type": row['type'],
+                        "difficulty": row['difficulty'],
+                        "question": row['question'],
+                        "correct_answer": row['correct_answer'],
+                        "incorrect_answers": json.loads(row['incorrect_answers'])
+                    })
+                    break
+            return questions
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+question_bank = QuestionBank(QUESTION_BANK_PATH) if QUESTION_BANK_PATH else None
+
+if __name__ == '__main__':
+    # python -m src.question_bank import <dump.json> [category_id]
+    if len(sys.argv) < 3 or sys.argv[1] != 'import' or question_bank is None:
+        print("Usage: QUESTION_BANK_PATH=questions.db python -m src.question_bank import <dump.json> [category_id]")
+        sys.exit(1)
+    category_id = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    added = question_bank.import_dump(sys.argv[2], category_id)
+    print(f"Imported {added} new questions. Total questions in bank: {question_bank.count()}")
@@ -0,0 +1,354 @@
+import html
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+import requests
+
+from src.config import TRIVIA_API_ENABLED, CACHE_FILL_THRESHOLD, CACHE_FILL_AMOUNT
+from src.metrics import registry
+from src.question_bank import question_bank, OPENTDB_CATEGORIES
+from src.question_table import question_table, question_id
+from src.trivia_client import trivia_client, TriviaUnavailableError
+
+logger = logging.getLogger(__name__)
+
+REFILL_MAX_WAIT = 10 # Seconds the background refiller may wait for a rate-limit token
+
+PUBLIC_FIELDS = ("id", "category", "type", "difficulty", "question", "options") # Safe to send to players
+RENDERED_FIELDS = ("json", "public_body")
+
+# The filters opentdb actually has. Anything else would only create pool buffers
+# and refills for keys that can never be served.
+DIFFICULTIES = ('any', 'easy', 'medium', 'hard')
+QUESTION_TYPES = ('multiple', 'boolean')
+CATEGORY_IDS = frozenset(str(category_id) for category_id in OPENTDB_CATEGORIES.values())
+
+class InvalidFilterError(ValueError):
+    """A difficulty, category or type that opentdb does not have."""
+
+def parse_filter(difficulty='any', category='any', question_type='multiple'):
+    """Normalize a client's (difficulty, category, type), raising InvalidFilterError for unknown values.
+
+    Categories are opentdb's numeric ids (as int or string); the result uses the string form.
+    """
+    difficulty = difficulty or 'any'
+    category = 'any' if category in (None, '') else str(category)
+    question_type = question_type or 'multiple'
+    if difficulty not in DIFFICULTIES:
+        raise InvalidFilterError(f"Unknown difficulty: {difficulty}")
+    if category != 'any' and category not in CATEGORY_IDS:
+        raise InvalidFilterError(f"Unknown category: {category}")
+    if question_type not in QUESTION_TYPES:
+        raise InvalidFilterError(f"Unknown question type: {question_type}")
+    return difficulty, category, question_type
+
+def build_question(q_data):
+    """Normalize an opentdb question once: decoded text, shuffled options and pre-rendered JSON.
+
+    Returns the shared copy from the question table, so a question fetched again
+    (or by another room) is not stored twice.
+    """
+    text = html.unescape(q_data['question'])
+    correct_answer = html.unescape(q_data['correct_answer'])
+    known = question_table.questions.get(question_id(text, correct_answer))
+    if known is not None:
+        return known
+    incorrect_answers = [html.unescape(answer) for answer in q_data['incorrect_answers']]
+    options = incorrect_answers + [correct_answer]
+    random.shuffle(options)
+    # Category/type/difficulty repeat across thousands of questions; intern them so they are stored once
+    return question_table.intern(render_question({
+        "id": question_id(text, correct_answer),
+        "category": sys.intern(html.unescape(q_data['category'])),
+        "type": sys.intern(q_data['type']),
+        "difficulty": sys.intern(q_data['difficulty']),
+        "question": text,
+        "correct_answer": correct_answer,
+        "incorrect_answers": incorrect_answers,
+        "options": options,
+        "correct_index": options.index(correct_answer)
+    }))
+
+def render_question(question):
+    # Serialize once per question instead of per request. "json" is the full question for
+    # single-player /question; "public_body" is the answer-free rest of a room's question
+    # after its per-room id (see room_question_json).
+    question = stored_question(question)
+    full_json = json.dumps(question)
+    question["public_body"] = json.dumps({k: question[k] for k in PUBLIC_FIELDS if k != "id"})[1:]
+    question["json"] = full_json
+    return question
+
+def stored_question(question):
+    # The question without its renderings, as saved to disk
+    return {k: v for k, v in question.items() if k not in RENDERED_FIELDS}
+
+def load_question(stored):
+    """The shared copy of a question read back from disk, rendering it if this process has not seen it."""
+    known = question_table.questions.get(stored['id'])
+    if known is not None:
+        return known
+    # Older files carry random ids; the table is keyed by content
+    stored = dict(stored, id=question_id(stored['question'], stored['correct_answer']))
+    return question_table.intern(render_question(stored))
+
+def public_question(question, instance_id=None):
+    # What players see; rooms send their own instance id in place of the shared one
+    public = {k: question[k] for k in PUBLIC_FIELDS}
+    if instance_id is not None:
+        public["id"] = instance_id
+    return public
+
+def room_question_json(question, instance_id):
+    # The shared public rendering with this room's instance id spliced in; no per-room copy or re-encode
+    return f'{{"id": {json.dumps(instance_id)}, {question["public_body"]}'
+
+def fetch_raw_questions(amount, difficulty='any', category='any', question_type='multiple', max_wait=0):
+    # Raises requests exceptions; returns [] when the API has nothing for this filter
+    return trivia_client.fetch(amount, difficulty, category, question_type, max_wait=max_wait)
+
+def fetch_questions(amount, difficulty='any', category='any', question_type='multiple', exclude=(), max_wait=0):
+    """Load questions from the local bank first, using opentdb only to make up the difference.
+
+    Anything fetched upstream is saved into the bank. Raises requests exceptions
+    only when the upstream call fails and the bank had nothing to offer.
+    """
+    results = []
+    if question_bank is not None:
+        results = [build_question(q_data) for q_data in question_bank.draw(amount, difficulty, category, question_type, exclude)]
+
+    if len(results) < amount and TRIVIA_API_ENABLED:
+        try:
+            fetched = fetch_raw_questions(amount - len(results), difficulty, category, question_type, max_wait)
+        except requests.exceptions.RequestException:
+            if not results:
+                raise
+            fetched = []
+        if fetched and question_bank is not None:
+            # Rows are filed under the requested category id; otherwise it is looked up by name
+            category_id = int(category) if str(category).isdigit() else None
+            question_bank.add_questions(fetched, category_id)
+        seen = {q['question'] for q in results}
+        for q_data in fetched:
+            q = build_question(q_data)
+            if q['question'] not in seen and q['question'] not in exclude:
+                results.append(q)
+
+    return results
+
+class QuestionPool:
+    """Bounded question buffers keyed by (difficulty, category, type).
+
+    Each key is refilled up to `high_water` by a single background thread once
+    it drops below `low_water`. Keys that have not been used recently are
+    evicted once more than `max_keys` are held.
+    """
+
+    def __init__(self, low_water=5, high_water=20, max_keys=32, refill_cooldown=5):
+        self.low_water = low_water
+        self.high_water = high_water
+        self.max_keys = max_keys
+        self.refill_cooldown = refill_cooldown # Seconds between refills of the same key
+
+        self.lock = threading.Lock()
+        self.refill_needed = threading.Condition(self.lock)
+        self.buffers = OrderedDict() # key -> deque, least recently used first
+        self.last_fill = {} # key -> time.monotonic() of the last refill attempt
+        self.pending = deque() # keys waiting for the refiller
+        self.pending_keys = set()
+        self.thread = None
+        self.warm_key = None
+        self.warmed_up = threading.Event() # Set once the warm-up refill was tried or a snapshot loaded
+
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_errors = 0
+        self.refill_seconds_total = 0.0
+        self.refill_seconds_max = 0.0
+
+    @staticmethod
+    def make_key(difficulty='any', category='any', question_type='multiple'):
+        return (difficulty or 'any', str(category or 'any'), question_type or 'multiple')
+
+    def _buffer(self, key):
+        # Caller holds self.lock
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = deque(maxlen=self.high_water)
+            self.buffers[key] = buffer
+            while len(self.buffers) > self.max_keys:
+                cold_key, _ = self.buffers.popitem(last=False)
+                self.last_fill.pop(cold_key, None)
+        else:
+            self.buffers.move_to_end(key)
+        return buffer
+
+    def _schedule_refill(self, key):
+        # Caller holds self.lock
+        if key not in self.pending_keys:
+            self.pending_keys.add(key)
+            self.pending.append(key)
+            self.refill_needed.notify()
+
+    def get(self, difficulty='any', category='any', question_type='multiple', refill=True):
+        """Pop a question for this filter, or return None on a miss.
+
+        Pass refill=False when the caller is about to fetch for this key itself.
+        """
+        key = self.make_key(difficulty, category, question_type)
+        with self.lock:
+            buffer = self._buffer(key)
+            question = buffer.popleft() if buffer else None
+            if question is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if refill and len(buffer) < self.low_water:
+                self._schedule_refill(key)
+        return question
+
+    def prefetch(self, difficulty='any', category='any', question_type='multiple'):
+        """Ask the refiller to top up this filter's buffer without taking a question."""
+        key = self.make_key(difficulty, category, question_type)
+        with self.lock:
+            if len(self._buffer(key)) < self.high_water:
+                self._schedule_refill(key)
+
+    def add(self, questions, difficulty='any', category='any', question_type='multiple'):
+        """Put questions fetched elsewhere (e.g. the async client) into this filter's buffer."""
+        key = self.make_key(difficulty, category, question_type)
+        with self.lock:
+            self._buffer(key).extend(questions)
+            self.last_fill[key] = time.monotonic() # Counts as a refill for the cooldown
+
+    def warm_up(self, key=None):
+        """Queue the first refill of `key` (the default filter) for the background thread."""
+        key = key or self.make_key()
+        with self.lock:
+            self.warm_key = key
+            self._schedule_refill(key)
+
+    def save_snapshot(self, path):
+        """Write every buffer to `path` so the next boot can serve before its first refill."""
+        with self.lock:
+            entries = [
+                {"key": list(key), "questions": [stored_question(q) for q in buffer]}
+                for key, buffer in self.buffers.items()
+            ]
+        tmp_path = f"{path}.{os.getpid()}.tmp" # Workers may save at the same time; the rename is atomic
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path):
+        """Fill buffers from a file written by save_snapshot. Returns how many questions were loaded."""
+        try:
+            with open(path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable question pool snapshot %s: %s", path, e)
+            return 0
+        loaded = 0
+        with self.lock:
+            for entry in entries:
+                questions = [load_question(q) for q in entry['questions']]
+                self._buffer(tuple(entry['key'])).extend(questions)
+                loaded += len(questions)
+        if loaded:
+            self.warmed_up.set()
+        return loaded
+
+    def refill(self, key):
+        """Fetch up to high_water questions for `key`. Runs without holding the pool lock."""
+        with self.lock:
+            last = self.last_fill.get(key)
+            if last is not None and time.monotonic() - last < self.refill_cooldown:
+                return
+            missing = self.high_water - len(self._buffer(key))
+            if missing <= 0:
+                return
+            self.last_fill[key] = time.monotonic()
+
+        started = time.monotonic()
+        try:
+            # The refiller runs off the request path, so it can wait out the rate limit
+            questions = fetch_questions(missing, *key, max_wait=REFILL_MAX_WAIT)
+        except TriviaUnavailableError as e:
+            questions = None
+            logger.warning("Trivia API unavailable during refill of %s: %s", key, e)
+        except requests.exceptions.Timeout:
+            questions = None
+            logger.warning("Request to trivia API timed out during refill of %s", key)
+        except requests.exceptions.RequestException as e:
+            questions = None
+            logger.warning("Error fetching questions from external API during refill of %s: %s", key, e)
+        except Exception:
+            questions = None
+            logger.exception("An unexpected error occurred during refill of %s", key)
+        elapsed = time.monotonic() - started
+
+        with self.lock:
+            self.refill_seconds_total += elapsed
+            self.refill_seconds_max = max(self.refill_seconds_max, elapsed)
+            if questions is None:
+                self.refill_errors += 1
+                return
+            self.refills += 1
+            self._buffer(key).extend(questions)
+        logger.info("Refilled %s with %d questions in %.2fs", key, len(questions), elapsed)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.pending:
+                    self.refill_needed.wait()
+                key = self.pending.popleft()
+                self.pending_keys.discard(key)
+            self.refill(key)
+            if key == self.warm_key:
+                self.warmed_up.set() # Tried, even if it failed: /question still falls back per request
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="question-pool-refiller", daemon=True)
+        self.thread.start()
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            attempts = self.refills + self.refill_errors
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "refills": self.refills,
+                "refill_errors": self.refill_errors,
+                "refill_latency_avg_seconds": self.refill_seconds_total / attempts if attempts else 0.0,
+                "refill_latency_max_seconds": self.refill_seconds_max,
+                "pending_refills": len(self.pending),
+                "buffers": {'|'.join(key): len(buffer) for key, buffer in self.buffers.items()}
+            }
+
+question_pool = QuestionPool(low_water=CACHE_FILL_THRESHOLD, high_water=CACHE_FILL_AMOUNT)
+
+def pool_depths():
+    with question_pool.lock:
+        return {key: len(buffer) for key, buffer in question_pool.buffers.items()}
+
+registry.gauge_callback('trivia_question_pool_depth', 'Questions buffered per filter.', pool_depths, ('difficulty', 'category', 'type'))
+registry.counter_callback('trivia_question_pool_hits_total', 'Pool lookups served from a buffer.', lambda: question_pool.hits)
+registry.counter_callback('trivia_question_pool_misses_total', 'Pool lookups that found the buffer empty.', lambda: question_pool.misses)
+registry.gauge_callback('trivia_question_pool_hit_ratio', 'Share of pool lookups served from a buffer.', lambda: question_pool.get_stats()['hit_ratio'])
+registry.gauge_callback('trivia_question_pool_pending_refills', 'Filters waiting for the refiller.', lambda: len(question_pool.pending))
+registry.counter_callback('trivia_question_pool_refill_errors_total', 'Refills that failed upstream.', lambda: question_pool.refill_errors)
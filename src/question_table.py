@@ -0,0 +1,31 @@
+import hashlib
+
+def question_id(question_text, correct_answer):
+    # Derived from the content, so the same question gets the same id in every process
+    # and ids saved with a room still resolve after a restart or on another worker
+    content = f"{question_text}\x00{correct_answer}".encode('utf-8')
+    return hashlib.blake2b(content, digest_size=8).hexdigest()
+
+class QuestionTable:
+    """Every question this process holds, stored once and shared by all rooms.
+
+    Rooms keep only question ids. Entries are never evicted: ids are content
+    hashes, so the table is bounded by the question corpus (a few thousand
+    questions for opentdb), not by the number of rooms.
+    """
+
+    def __init__(self):
+        self.questions = {} # id -> question dict (see question_pool.build_question)
+
+    def intern(self, question):
+        """Return the shared copy of `question`, adding it if this id is new."""
+        # dict.setdefault is atomic, so racing threads still end up sharing one copy
+        return self.questions.setdefault(question['id'], question)
+
+    def get(self, question_id):
+        return self.questions[question_id]
+
+    def __len__(self):
+        return len(self.questions)
+
+question_table = QuestionTable()
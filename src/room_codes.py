@@ -0,0 +1,48 @@
+import itertools
+import random
+
+from src.config import ROOM_SHARD_ID
+
+CODE_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+SEQUENCE_LENGTH = 5 # Characters after the shard character
+SEQUENCE_SPACE = len(CODE_ALPHABET) ** SEQUENCE_LENGTH # 60,466,176 codes per shard
+# x -> (x * STRIDE + OFFSET) mod SEQUENCE_SPACE is a bijection because STRIDE shares
+# no factor with 36 (it is neither even nor a multiple of 3)
+STRIDE = 7777777
+OFFSET = 12345678
+
+class RoomCodeAllocator:
+    """Issues 6-character room codes: the owning shard's character, then five
+    characters from a per-process sequence.
+
+    The sequence goes through an affine permutation of the 36**5 space, so
+    codes do not look sequential but never repeat until the space wraps.
+    Allocation is O(1) with no lookups; the state store's insert check only
+    guards against other processes that share this shard id.
+    """
+
+    def __init__(self, shard_id=ROOM_SHARD_ID, start=None):
+        if not 0 <= shard_id < len(CODE_ALPHABET):
+            raise ValueError(f"ROOM_SHARD_ID must be between 0 and {len(CODE_ALPHABET) - 1}")
+        self.shard_id = shard_id
+        self.prefix = CODE_ALPHABET[shard_id]
+        if start is None:
+            start = random.randrange(SEQUENCE_SPACE) # Restarts do not replay the previous run's codes
+        self.counter = itertools.count(start) # next() is atomic, so no lock is needed
+
+    def allocate(self):
+        n = (next(self.counter) * STRIDE + OFFSET) % SEQUENCE_SPACE
+        chars = []
+        for _ in range(SEQUENCE_LENGTH):
+            n, digit = divmod(n, len(CODE_ALPHABET))
+            chars.append(CODE_ALPHABET[digit])
+        return self.prefix + ''.join(chars)
+
+def shard_of(room_id):
+    """Shard id embedded in a room code, or None if it is not one of ours."""
+    if not room_id or len(room_id) != SEQUENCE_LENGTH + 1:
+        return None
+    shard_id = CODE_ALPHABET.find(room_id[0])
+    return shard_id if shard_id >= 0 else None
+
+room_codes = RoomCodeAllocator()
@@ -0,0 +1,151 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from src.config import games_lock, ROOM_TTLS, EXPIRY_BATCH_SIZE
+from src.models.game import games
+from src.state_store import state_store
+
+logger = logging.getLogger(__name__)
+
+SHARED_SWEEP_INTERVAL = 600 # Seconds between bulk sweeps of the shared store (rooms no worker tracks)
+MAX_TICK_SLEEP = 5 # Upper bound on how long the expiry thread sleeps between ticks
+RECHECK_DELAY = 60 # Seconds before re-checking a room the shared store says is still active
+
+def room_phase(game):
+    if game.game_ended:
+        return 'ended'
+    if game.game_started:
+        return 'in_progress'
+    return 'lobby'
+
+def room_deadline(game):
+    return game.last_activity.timestamp() + ROOM_TTLS[room_phase(game)]
+
+class RoomExpiry:
+    """Min-heap of (deadline, room_id) drained a small batch at a time.
+
+    Entries are not updated when a room sees activity; instead a popped entry
+    is re-checked against the room's current last_activity and phase and
+    pushed back if the room is still alive. A phase change that brings the
+    deadline forward (a game ending) calls track() again; the earlier entry
+    supersedes the old one, which is skipped when popped. Each room is checked
+    under its own lock, so no lock is ever held across the whole set of rooms.
+    """
+
+    def __init__(self, batch_size=EXPIRY_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.heap = []
+        self.scheduled = {} # room_id -> deadline of its live heap entry
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.last_sweep = time.monotonic()
+
+        self.ticks = 0
+        self.expired_total = 0
+        self.expired_last_tick = 0
+        self.rescheduled_total = 0
+        self.swept_total = 0
+        self.tick_seconds_max = 0.0
+
+    def track(self, game):
+        """Schedule the room, or move its deadline forward. Later deadlines are found when the entry pops."""
+        deadline = room_deadline(game)
+        with self.lock:
+            scheduled = self.scheduled.get(game.room_id)
+            if scheduled is not None and scheduled <= deadline:
+                return
+            self.scheduled[game.room_id] = deadline
+            heapq.heappush(self.heap, (deadline, game.room_id))
+            first = self.heap[0][1] == game.room_id
+        if first:
+            self.wakeup.set() # New earliest deadline
+
+    def tick(self, now=None):
+        """Expire up to batch_size due rooms. Returns how many were removed."""
+        now = time.time() if now is None else now
+        started = time.monotonic()
+        expired = rescheduled = 0
+        for _ in range(self.batch_size):
+            with self.lock:
+                if not self.heap or self.heap[0][0] > now:
+                    break
+                entry_deadline, room_id = heapq.heappop(self.heap)
+                if self.scheduled.get(room_id) != entry_deadline:
+                    continue # Superseded by an earlier deadline from track()
+                del self.scheduled[room_id]
+
+            with games_lock:
+                game = games.get(room_id)
+            if game is None:
+                continue # Already gone (e.g. removed by another worker)
+
+            with game.lock:
+                deadline = room_deadline(game)
+                phase = room_phase(game)
+                # The store re-checks activity itself: with a shared backend another
+                # worker may have seen this room more recently than our cached copy
+                if deadline <= now and not state_store.expire(room_id, datetime.fromtimestamp(now - ROOM_TTLS[phase])):
+                    deadline = now + RECHECK_DELAY
+                if deadline > now:
+                    with self.lock:
+                        # track() may have rescheduled the room since it was popped
+                        if deadline < self.scheduled.get(room_id, float('inf')):
+                            self.scheduled[room_id] = deadline
+                            heapq.heappush(self.heap, (deadline, room_id))
+                    rescheduled += 1
+                    continue
+            expired += 1
+            logger.info("Cleaning up inactive room", extra={"room_id": room_id, "phase": phase})
+
+        with self.lock:
+            self.ticks += 1
+            self.expired_total += expired
+            self.expired_last_tick = expired
+            self.rescheduled_total += rescheduled
+            self.tick_seconds_max = max(self.tick_seconds_max, time.monotonic() - started)
+        return expired
+
+    def sweep_shared_store(self):
+        # Rooms created by other (possibly dead) workers are not in this heap
+        threshold = datetime.now() - timedelta(seconds=max(ROOM_TTLS.values()))
+        removed = state_store.remove_inactive(threshold)
+        with self.lock:
+            self.swept_total += len(removed)
+
+    def _run(self):
+        while True:
+            if self.tick() == self.batch_size:
+                continue # Backlog: keep draining, one bounded batch at a time
+            if state_store.shared and time.monotonic() - self.last_sweep > SHARED_SWEEP_INTERVAL:
+                self.last_sweep = time.monotonic()
+                self.sweep_shared_store()
+            with self.lock:
+                sleep = self.heap[0][0] - time.time() if self.heap else MAX_TICK_SLEEP
+            self.wakeup.wait(min(max(sleep, 0), MAX_TICK_SLEEP))
+            self.wakeup.clear()
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="room-expiry", daemon=True)
+        self.thread.start()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "tracked": len(self.scheduled),
+                "ticks": self.ticks,
+                "expired_total": self.expired_total,
+                "expired_last_tick": self.expired_last_tick,
+                "rescheduled_total": self.rescheduled_total,
+                "swept_total": self.swept_total,
+                "tick_seconds_max": self.tick_seconds_max,
+                "ttls": ROOM_TTLS
+            }
+
+room_expiry = RoomExpiry()
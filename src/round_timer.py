@@ -0,0 +1,64 @@
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class RoundTimer:
+    """One thread and one heap for every room's question deadline.
+
+    Entries are (deadline, room_id, question_index). Nothing is cancelled when a
+    round ends early; the handler just ignores entries whose question_index
+    no longer matches the room.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.handler = None # handler(room_id, question_index), set by the routes
+        self.thread = None
+
+        self.fired = 0
+        self.handler_errors = 0
+
+    def set_handler(self, handler):
+        self.handler = handler
+
+    def schedule(self, room_id, question_index, deadline):
+        with self.lock:
+            heapq.heappush(self.heap, (deadline, room_id, question_index))
+            if self.heap[0][1] == room_id:
+                self.wakeup.notify() # New earliest deadline
+
+    def _run(self):
+        while True:
+            with self.lock:
+                while not self.heap or self.heap[0][0] > time.time():
+                    self.wakeup.wait(self.heap[0][0] - time.time() if self.heap else None)
+                _, room_id, question_index = heapq.heappop(self.heap)
+                self.fired += 1
+            try:
+                self.handler(room_id, question_index)
+            except Exception:
+                with self.lock:
+                    self.handler_errors += 1
+                logger.exception("Round timer failed", extra={"room_id": room_id, "question_index": question_index})
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="round-timer", daemon=True)
+        self.thread.start()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "pending": len(self.heap),
+                "fired": self.fired,
+                "handler_errors": self.handler_errors
+            }
+
+round_timer = RoundTimer()
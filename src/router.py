@@ -0,0 +1,161 @@
+import bisect
+import hashlib
+import os
+import threading
+
+import requests
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from src.config import ROUTER_BACKENDS, TRUSTED_PROXIES
+from src.room_codes import shard_of
+
+# Thin front process for several game servers: `ROUTER_BACKENDS=http://a:5001,http://b:5001
+# gunicorn -k gthread --threads 200 src.router:app`. Backend i must run with ROOM_SHARD_ID=i.
+# Room requests go to the node whose shard id is embedded in the room code, so all
+# state for a room stays in one process. New rooms are placed by consistent hashing.
+
+RING_REPLICAS = 100 # Virtual points per backend on the hash ring
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 60 # Longer than room_state long-polls and SSE heartbeats
+FORWARDED_REQUEST_HEADERS = {'content-type', 'if-none-match', 'last-event-id', 'accept'}
+FORWARDED_RESPONSE_HEADERS = {'content-type', 'etag', 'cache-control', 'retry-after', 'x-room-version', 'x-poll-interval', 'x-accel-buffering'}
+
+def hash_key(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+class HashRing:
+    """Consistent hashing: adding or removing a backend only moves ~1/n of the keys."""
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        points = sorted((hash_key(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self.hashes = [h for h, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        i = bisect.bisect(self.hashes, hash_key(key)) % len(self.hashes)
+        return self.nodes[i]
+
+app = Flask(__name__)
+CORS(app)
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
+backends = ROUTER_BACKENDS
+if not backends:
+    raise RuntimeError("Router mode needs ROUTER_BACKENDS (comma-separated backend URLs, indexed by shard id)")
+ring = HashRing(backends)
+local = threading.local() # One keep-alive session per router thread
+
+def session():
+    s = getattr(local, 'session', None)
+    if s is None:
+        s = local.session = requests.Session()
+    return s
+
+def backend_for_room(room_id):
+    shard_id = shard_of(room_id)
+    if shard_id is not None and shard_id < len(backends):
+        return backends[shard_id]
+    return ring.node_for(room_id) # Codes we cannot place (e.g. from before sharding) still route stably
+
+def backend_for_client():
+    # New rooms: keep one client's rooms together while spreading clients over the ring
+    return ring.node_for(request.remote_addr or '')
+
+def forward(backend, body=None):
+    url = backend + request.path
+    if request.query_string:
+        url += '?' + request.query_string.decode('latin-1')
+    headers = {k: v for k, v in request.headers.items() if k.lower() in FORWARDED_REQUEST_HEADERS}
+    # Append the peer, like any proxy: backends with TRUSTED_PROXIES=1 take the last entry
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    headers['X-Forwarded-For'] = f"{forwarded_for}, {request.remote_addr}" if forwarded_for else (request.remote_addr or '')
+    try:
+        upstream = session().request(
+            request.method, url,
+            data=request.get_data() if body is None else body,
+            headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+    except requests.exceptions.RequestException as e:
+        return jsonify({"error": f"Room server unavailable: {e}"}), 502
+    response_headers = {k: v for k, v in upstream.headers.items() if k.lower() in FORWARDED_RESPONSE_HEADERS}
+    if upstream.headers.get('Content-Type', '').startswith('text/event-stream'):
+        # Relay SSE chunks as they arrive instead of buffering the whole stream
+        def relay():
+            try:
+                yield from upstream.iter_content(chunk_size=None)
+            finally:
+                upstream.close() # Client went away: drop the backend stream too
+        return Response(relay(), status=upstream.status_code, headers=response_headers)
+    return Response(upstream.content, status=upstream.status_code, headers=response_headers)
+
+def room_id_from_body():
+    data = request.get_json(silent=True)
+    room_id = data.get('room_id') if isinstance(data, dict) else None
+    return room_id if isinstance(room_id, str) else None # Anything else is the backend's 400 to report
+
+@app.route('/health')
+def health_check():
+    return jsonify({"status": "healthy", "backends": len(backends)}), 200
+
+@app.route('/create_room', methods=['POST'])
+def create_room():
+    return forward(backend_for_client())
+
+@app.route('/join_room', methods=['POST'])
+@app.route('/start_game', methods=['POST'])
+@app.route('/submit_answer', methods=['POST'])
+def room_post():
+    room_id = room_id_from_body()
+    if not room_id:
+        return forward(backend_for_client()) # The backend reports the missing field
+    return forward(backend_for_room(room_id))
+
+@app.route('/room_state/<room_id>')
+@app.route('/room_events/<room_id>')
+@app.route('/leaderboard/<room_id>')
+@app.route('/leaderboard/<room_id>/rank')
+def room_get(room_id):
+    return forward(backend_for_room(room_id))
+
+@app.route('/submit_answers', methods=['POST'])
+def submit_answers():
+    # Split a mixed batch by owning backend, then merge the per-item results back in order
+    data = request.get_json(silent=True) or {}
+    items = data.get('answers')
+    if not isinstance(items, list):
+        return forward(backend_for_client())
+
+    groups = {} # backend -> indexes into items
+    for i, item in enumerate(items):
+        room_id = item.get('room_id') if isinstance(item, dict) else None
+        # Malformed items still go to a backend, which answers them with a per-item 400
+        backend = backend_for_room(room_id) if room_id and isinstance(room_id, str) else backends[0]
+        groups.setdefault(backend, []).append(i)
+
+    results = [None] * len(items)
+    for backend, indexes in groups.items():
+        try:
+            upstream = session().post(
+                backend + '/submit_answers', json={"answers": [items[i] for i in indexes]},
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+            )
+            if upstream.status_code != 200:
+                raise requests.exceptions.HTTPError(f"{upstream.status_code}: {upstream.text[:200]}")
+            for i, result in zip(indexes, upstream.json()['results']):
+                results[i] = result
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            for i in indexes:
+                results[i] = {"status": 502, "error": f"Room server unavailable: {e}"}
+    return jsonify({"results": results}), 200
+
+@app.route('/', defaults={'path': ''}, methods=['GET', 'POST'])
+@app.route('/<path:path>', methods=['GET', 'POST'])
+def other(path):
+    # Stateless endpoints (/question, ...) can be served by any backend
+    return forward(backend_for_client())
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)), threaded=True)
@@ -1,13 +1,311 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, g, request, jsonify
 import requests
-import random
+import json
 import uuid # For generating unique IDs
+import functools
+import logging
+import time
+from collections import deque
 from datetime import datetime
 
-from src.models.game import games, Game, Player
-from src.config import TRIVIA_API_URL, games_lock # CAMBIA ESTA LÍNEA
+from src.models.game import Game
+from src.question_bank import question_bank
+from src.question_pool import question_pool, fetch_questions, build_question, public_question, room_question_json, parse_filter, InvalidFilterError
+from src.question_table import question_table
+from src.admission import admission
+from src.config import ROUND_TIME_LIMIT
+from src.leaderboard import hall_of_fame
+from src.profiler import slow_requests
+from src.room_codes import room_codes
+from src.room_expiry import room_expiry
+from src.round_timer import round_timer
+from src.state_store import state_store, init_room_runtime, StaleRoomError
+from src.trivia_client import TriviaUnavailableError
 
 game_bp = Blueprint('game_bp', __name__)
+logger = logging.getLogger(__name__)
+
+MAX_QUESTIONS_PER_FETCH = 50 # opentdb rejects larger amounts
+EVENT_HEARTBEAT = 15 # Seconds between keep-alive comments on idle event streams
+MAX_LONG_POLL = 30 # Upper bound for room_state?since=<version>&timeout=<seconds>
+CAS_RETRIES = 3 # Attempts when another worker changed the room under us
+REMOTE_CHANGE_POLL = 1 # Seconds between re-reading a shared room while a request waits for it to change
+MIN_TIME_LIMIT = 5 # Seconds; shorter rounds would end before players see the question
+MAX_TIME_LIMIT = 3600
+MAX_NUM_QUESTIONS = 100 # Per game; past the first fetch's 50 the rest come from the shared pool
+MAX_ANSWER_BATCH = 5000 # Items accepted by one /submit_answers request
+ANSWER_FIELDS = ('room_id', 'player_id', 'player_name', 'question_id', 'answer') # Must be strings or numbers in a batch
+DEFAULT_LEADERBOARD_LIMIT = 10
+MAX_LEADERBOARD_LIMIT = 100 # Upper bound for ?limit= on leaderboard queries
+# Endpoints behind admission control, and which bucket kind they draw from.
+# /submit_answers is left out: it carries many players' answers from a gateway.
+ADMISSION_KINDS = {
+    'game_bp.get_room_state': 'poll',
+    'game_bp.room_events': 'poll',
+    'game_bp.submit_answer': 'answer'
+}
+
+def reserve_questions(game):
+    # One amount=N fetch up front so advancing a round never waits on the network.
+    # Returns the batch as shared question ids; the caller puts it on the room once the game really starts.
+    wanted = min(game.num_questions, MAX_QUESTIONS_PER_FETCH)
+    questions = deque(q['id'] for q in fetch_questions(wanted, game.difficulty, game.category, exclude=game.asked_questions))
+    if len(questions) < game.num_questions:
+        # Short batch: let the pool fetch the rest in the background
+        question_pool.prefetch(game.difficulty, game.category)
+    return questions
+
+def fallback_question(game):
+    # The reserved batch ran short: take one from the shared pool, or the local bank on a pool miss
+    q = question_pool.get(game.difficulty, game.category)
+    if q is None or q['question'] in game.asked_questions:
+        # Pool miss: the local bank can still serve without touching the network
+        drawn = question_bank.draw(1, game.difficulty, game.category, exclude=game.asked_questions) if question_bank else []
+        if not drawn:
+            return None
+        q = build_question(drawn[0])
+    return q
+
+def next_question(game):
+    # The next reserved question (set_current_question takes it off the queue),
+    # topping up from the shared pool if the batch ran short
+    queue = game.question_queue
+    q = question_table.get(queue[0]) if queue else fallback_question(game)
+    if q is None:
+        return None
+    reserved_after = len(queue) - 1 if queue else 0
+    if reserved_after < game.num_questions - game.current_question_index - 1:
+        question_pool.prefetch(game.difficulty, game.category)
+    return q
+
+def room_public_question(game):
+    # Caller holds game.lock. The current question as players see it, under this room's id.
+    return public_question(game.get_current_question(), game.question_instance)
+
+def find_player(game, player_id=None, player_name=None):
+    # Caller holds game.lock. O(1) by id (preferred) or by name.
+    if player_id:
+        return game.players.get(player_id)
+    return game.players_by_name.get(player_name)
+
+def set_question(game, question_obj):
+    # Caller holds game.lock. Everyone starts the new round unanswered, against the clock.
+    game.set_current_question(question_obj, str(uuid.uuid4())) # Unique ID for this specific question instance
+    game.round_deadline = None
+    if game.time_limit:
+        game.round_deadline = time.time() + game.time_limit
+        round_timer.schedule(game.room_id, game.current_question_index, game.round_deadline)
+
+def advance_round(game):
+    # Caller holds game.lock. Moves to the next reserved question or ends the game.
+    # Returns "ended", "next", or "failed" when no further question could be loaded.
+    if game.current_question_index >= game.num_questions:
+        finish_game(game)
+        return "ended"
+    # Advance from the reserved batch; no upstream call on this path
+    question_obj = next_question(game)
+    if question_obj is None:
+        logger.warning("Could not fetch next question, ending game", extra={"room_id": game.room_id})
+        finish_game(game) # End game if no question can be fetched
+        return "failed"
+    set_question(game, question_obj)
+    publish(game, "question", {
+        "question": room_public_question(game),
+        "current_question_index": game.current_question_index,
+        "round_deadline": game.round_deadline
+    })
+    return "next"
+
+def expire_round(room_id, question_index):
+    # Runs on the round timer thread when a question's deadline passes
+    for _ in range(CAS_RETRIES):
+        game = get_game(room_id)
+        if not game:
+            return
+        with game.lock:
+            if game.game_ended or game.current_question_index != question_index:
+                return # The round already ended because everyone answered
+            base_version = game.version
+            missed = [p.name for p in game.players.values() if not game.has_answered(p)]
+            publish(game, "round_timeout", {
+                "current_question_index": question_index,
+                "missed": missed
+            })
+            advance_round(game)
+            try:
+                save_game(game, base_version)
+                return
+            except StaleRoomError:
+                continue # Another worker changed the room; re-check against the fresh copy
+    logger.warning("Round timeout lost to concurrent updates", extra={"room_id": room_id, "question_index": question_index})
+
+def finish_game(game):
+    # Caller holds game.lock
+    game.end_game()
+    room_expiry.track(game) # Ended rooms have their own (usually shorter) TTL
+    publish(game, "game_ended", {"player_scores": dict(game.scores)})
+
+def room_snapshot(game):
+    # Caller holds game.lock
+    return {
+        "room_id": game.room_id,
+        "players": game.get_players_list(),
+        "game_started": game.game_started,
+        "current_question": game.get_current_question(),
+        "current_question_index": game.current_question_index,
+        "total_questions": game.num_questions,
+        "player_scores": dict(game.scores),
+        "player_answered": {p.name: game.has_answered(p) for p in game.players.values()},
+        "game_ended": game.game_ended,
+        "round_deadline": game.round_deadline
+    }
+
+def snapshot_body(game):
+    # Caller holds game.lock. The serialized room is only rebuilt when the version moves.
+    if game.snapshot_version != game.version:
+        snapshot = room_snapshot(game)
+        question = snapshot.pop("current_question")
+        # Splice in the question's pre-rendered, answer-free JSON instead of re-encoding it
+        question_json = room_question_json(question, game.question_instance) if question else "null"
+        game.snapshot_body = f'{json.dumps(snapshot)[:-1]}, "current_question": {question_json}}}'
+        game.snapshot_version = game.version
+    return game.snapshot_body
+
+def publish(game, event, data):
+    # Caller holds game.lock. Bumps the room version and wakes its event streams.
+    game.version += 1
+    game.events.append((game.version, event, data))
+    game.changed.notify_all()
+
+def wait_for_change(game, version, timeout):
+    # Caller holds game.lock. Changes made by other workers never notify this process,
+    # so with a shared store the wait is sliced and the room re-read between slices.
+    # Returns False if the room was removed meanwhile.
+    if not state_store.shared:
+        game.changed.wait_for(lambda: game.version != version, timeout)
+        return True
+    deadline = time.monotonic() + timeout
+    while game.version == version:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        game.changed.wait(min(remaining, REMOTE_CHANGE_POLL))
+        if not state_store.refresh(game):
+            return False
+    return True
+
+def format_event(version, event, data):
+    return f"id: {version}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+def apply_answer(game, player_obj, question_id, answer):
+    # Caller holds game.lock. Records one answer and advances the round once everyone is in.
+    # Returns None if the answer was rejected, else "answered", "next", "ended" or "failed".
+    score = player_obj.score
+    if not game.submit_answer(player_obj.player_id, question_id, answer):
+        return None
+    game.last_activity = datetime.now()
+    if player_obj.score != score:
+        # Points awarded: re-rank just this player (O(log n)) instead of sorting the room on reads
+        game.leaderboard.update(player_obj.player_id, player_obj.score)
+        hall_of_fame.record(game.room_id, player_obj)
+    publish(game, "player_answered", {
+        "player_name": player_obj.name,
+        "score": player_obj.score
+    })
+    # Check if all players have answered
+    if game.all_players_answered():
+        return advance_round(game)
+    return "answered"
+
+def answer_result(outcome):
+    # Response body and status for an accepted answer
+    if outcome == "ended":
+        return {"message": "Answer submitted, game ended"}, 200
+    if outcome == "failed":
+        return {"error": "Could not fetch next question"}, 500
+    return {"message": "Answer submitted"}, 200
+
+def apply_room_answers(room_id, items, indexes, results):
+    # One lock acquisition and one save for every answer in this room's batch
+    game = get_game(room_id)
+    if not game:
+        for i in indexes:
+            results[i] = {"status": 404, "error": "Room not found"}
+        return
+
+    with game.lock:
+        if not game.game_started:
+            for i in indexes:
+                results[i] = {"status": 400, "error": "Game has not started"}
+            return
+        base_version = game.version
+        batch = {}
+        for i in indexes:
+            item = items[i]
+            player_obj = find_player(game, item.get('player_id'), item.get('player_name'))
+            if not player_obj:
+                batch[i] = {"status": 404, "error": "Player not found in room"}
+                continue
+            outcome = apply_answer(game, player_obj, item['question_id'], item['answer'])
+            if outcome is None:
+                batch[i] = {"status": 400, "error": "Invalid submission or already answered"}
+                continue
+            body, status = answer_result(outcome)
+            batch[i] = dict(body, status=status)
+        if game.version != base_version:
+            save_game(game, base_version)
+    for i, result in batch.items():
+        results[i] = result
+
+def get_game(room_id):
+    # Only the registry lookup is shared; callers then work under game.lock
+    game = state_store.get(room_id)
+    if game is not None:
+        slow_requests.note_room(game)
+    return game
+
+def save_game(game, base_version):
+    # Caller holds game.lock. Compare-and-set against the version this request started from.
+    if not state_store.save(game, base_version):
+        raise StaleRoomError(game.room_id)
+
+@game_bp.before_request
+def admit_request():
+    # Runs before any room lookup or lock, so shedding a request costs almost nothing
+    admission.begin()
+    g.admission_counted = True
+    kind = ADMISSION_KINDS.get(request.endpoint)
+    if kind is not None:
+        return admission.check(kind)
+
+@game_bp.teardown_request
+def release_admission(exc):
+    if g.pop('admission_counted', False):
+        admission.end()
+
+def stop_counting_inflight():
+    # A parked long-poll or event stream only sleeps on its room; counting it as in
+    # flight would let idle waiters shed every other client's polls
+    release_admission(None)
+
+@game_bp.after_request
+def wait_for_journal(response):
+    # JOURNAL_SYNC=commit: only answer once the change is fsynced. Runs after the
+    # room lock is released, so other requests keep going during the wait.
+    state_store.wait_for_journal()
+    return response
+
+def retry_on_conflict(view):
+    # Re-run the whole view against a freshly loaded room if another worker won the race
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        for _ in range(CAS_RETRIES):
+            try:
+                return view(*args, **kwargs)
+            except StaleRoomError:
+                continue
+        return jsonify({"error": "Room is busy, please retry"}), 409
+    return wrapper
 
 @game_bp.route('/create_room', methods=['POST'])
 def create_room():
@@ -16,25 +314,41 @@ def create_room():
     difficulty = data.get('difficulty', 'any')
     category = data.get('category', 'any')
     num_questions = data.get('num_questions', 10) # Default to 10 questions for multiplayer
+    time_limit = data.get('time_limit', ROUND_TIME_LIMIT) # Seconds per question; 0 waits for everyone
 
     if not player_name:
         return jsonify({"error": "Player name is required"}), 400
+    try:
+        # Only filters opentdb has: rooms feed their filter to the shared question pool
+        difficulty, category, _ = parse_filter(difficulty, category)
+    except InvalidFilterError as e:
+        return jsonify({"error": str(e)}), 400
+    # Bad settings would only fail later (on the round timer thread, or in start_game) with players waiting
+    if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)) or \
+            not (time_limit == 0 or MIN_TIME_LIMIT <= time_limit <= MAX_TIME_LIMIT):
+        return jsonify({"error": f"time_limit must be 0 or between {MIN_TIME_LIMIT} and {MAX_TIME_LIMIT} seconds"}), 400
+    if isinstance(num_questions, bool) or not isinstance(num_questions, int) or not 1 <= num_questions <= MAX_NUM_QUESTIONS:
+        return jsonify({"error": f"num_questions must be a whole number from 1 to {MAX_NUM_QUESTIONS}"}), 400
 
-    room_id = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=6))
     player_id = str(uuid.uuid4()) # Unique ID for the player
 
-    with games_lock:
-        game = Game(room_id, player_id, player_name, difficulty, category, num_questions)
-        games[room_id] = game
-        game.last_activity = datetime.now() # Update activity on creation
+    while True:
+        room_id = room_codes.allocate() # Unique per process and carries this node's shard id
+        game = Game(room_id, player_id, player_name, difficulty, category, num_questions, time_limit)
+        init_room_runtime(game)
+        players = game.get_players_list() # Build before the room becomes visible to others
+        if state_store.add(game): # False only if the code is already taken
+            break
+    room_expiry.track(game)
 
     return jsonify({
         "room_id": room_id,
         "player_id": player_id,
-        "players": game.get_players_list()
+        "players": players
     }), 201
 
 @game_bp.route('/join_room', methods=['POST'])
+@retry_on_conflict
 def join_room():
     data = request.get_json()
     room_id = data.get('room_id')
@@ -43,177 +357,290 @@ def join_room():
     if not room_id or not player_name:
         return jsonify({"error": "Room ID and player name are required"}), 400
 
-    with games_lock:
-        game = games.get(room_id)
-        if not game:
-            return jsonify({"error": "Room not found"}), 404
+    game = get_game(room_id)
+    if not game:
+        return jsonify({"error": "Room not found"}), 404
 
+    with game.lock:
+        base_version = game.version
+        if player_name in game.players_by_name:
+            return jsonify({"error": "Player name already taken in this room"}), 409
         player_id = str(uuid.uuid4()) # Unique ID for the player
         if not game.add_player(player_name, player_id):
             return jsonify({"error": "Failed to add player to room"}), 500
+        game.leaderboard.update(player_id, 0)
         game.last_activity = datetime.now() # Update activity on join
+        publish(game, "player_joined", {"player_id": player_id, "player_name": player_name})
+        save_game(game, base_version)
 
-    return jsonify({
-        "room_id": room_id,
-        "player_id": player_id,
-        "players": game.get_players_list(),
-        "game_started": game.game_started,
-        "current_question_index": game.current_question_index,
-        "total_questions": game.num_questions,
-        "player_scores": game.get_player_scores(),
-        "player_answered": {p.name: p.answered_current_question for p in game.players.values()}
-    }), 200
+        return jsonify({
+            "room_id": room_id,
+            "player_id": player_id,
+            "players": game.get_players_list(),
+            "game_started": game.game_started,
+            "current_question_index": game.current_question_index,
+            "total_questions": game.num_questions,
+            "player_scores": dict(game.scores),
+            "player_answered": {p.name: game.has_answered(p) for p in game.players.values()}
+        }), 200
 
 @game_bp.route('/room_state/<room_id>', methods=['GET'])
 def get_room_state(room_id):
     player_name = request.args.get('player_name') # Get player_name from query params
+    player_id = request.args.get('player_id') # Or, cheaper, the player_id returned by join_room
+    # Optional long poll: hold the request until the room moves past this version
+    since = request.args.get('since', type=int)
+    timeout = min(request.args.get('timeout', MAX_LONG_POLL, type=float), MAX_LONG_POLL)
 
-    with games_lock:
-        game = games.get(room_id)
-        if not game:
-            return jsonify({"error": "Room not found"}), 404
+    game = get_game(room_id)
+    if not game:
+        return jsonify({"error": "Room not found"}), 404
 
+    with game.lock:
         # Update last activity for the room if a player is actively polling
         game.last_activity = datetime.now()
+        state_store.touch(game)
 
         # Check if the polling player is still in the game
-        if player_name and not any(p.name == player_name for p in game.players.values()):
+        if (player_id or player_name) and not find_player(game, player_id, player_name):
             return jsonify({"error": "Player not found in room"}), 404
 
-        return jsonify({
-            "room_id": game.room_id,
-            "players": game.get_players_list(),
-            "game_started": game.game_started,
-            "current_question": game.current_question,
-            "current_question_index": game.current_question_index,
-            "total_questions": game.num_questions,
-            "player_scores": game.get_player_scores(),
-            "player_answered": {p.name: p.answered_current_question for p in game.players.values()},
-            "game_ended": game.game_ended
-        }), 200
+        if since is not None and since == game.version:
+            stop_counting_inflight()
+            if not wait_for_change(game, since, timeout):
+                return jsonify({"error": "Room not found"}), 404
+
+        etag = f'"{game.room_id}-{game.version}"'
+        headers = {
+            "ETag": etag,
+            "X-Room-Version": str(game.version),
+            "X-Poll-Interval": str(admission.next_poll(game)), # Seconds until the next poll is worth making
+            "Cache-Control": "no-cache"
+        }
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+        return Response(snapshot_body(game), status=200, mimetype='application/json', headers=headers)
+
+@game_bp.route('/room_events/<room_id>', methods=['GET'])
+def room_events(room_id):
+    # Server-Sent Events: a full "snapshot" first, then one event per change to the room
+    game = get_game(room_id)
+    if not game:
+        return jsonify({"error": "Room not found"}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        since = None
+
+    def stream():
+        version = since
+        while True:
+            with game.lock:
+                if version is not None and version == game.version:
+                    # Idle rooms cost nothing here: the thread sleeps until publish() notifies
+                    if not wait_for_change(game, version, EVENT_HEARTBEAT):
+                        return
+                if version is not None and version == game.version:
+                    chunk = ": keep-alive\n\n"
+                elif version is None or not game.events or game.events[0][0] > version + 1:
+                    # New client, or it fell further behind than the history we keep
+                    chunk = f"id: {game.version}\nevent: snapshot\ndata: {snapshot_body(game)}\n\n"
+                else:
+                    chunk = ''.join(format_event(v, event, data) for v, event, data in game.events if v > version)
+                version = game.version
+                ended = game.game_ended
+            yield chunk
+            if ended:
+                return
+            if get_game(room_id) is not game:
+                return # Room was cleaned up (or reloaded; the client reconnects for a fresh snapshot)
+
+    stop_counting_inflight()
+    return Response(stream(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 @game_bp.route('/start_game', methods=['POST'])
+@retry_on_conflict
 def start_game():
     data = request.get_json()
     room_id = data.get('room_id')
 
-    with games_lock:
-        game = games.get(room_id)
-        if not game:
-            return jsonify({"error": "Room not found"}), 404
+    game = get_game(room_id)
+    if not game:
+        return jsonify({"error": "Room not found"}), 404
+
+    # A slow upstream fetch below only holds this room's lock, never games_lock
+    with game.lock:
         if game.game_started:
             return jsonify({"error": "Game already started"}), 400
+        base_version = game.version
 
-        game.start_game()
-        game.last_activity = datetime.now()
-
-        # Fetch first question
+        # Reserve the whole game's questions with one upstream call. Nothing on the room
+        # changes until the first question is in hand, so a failed fetch leaves it in
+        # the lobby and the host can simply try again.
         try:
-            params = {
-                "amount": 1,
-                "type": "multiple"
-            }
-            if game.difficulty != 'any':
-                params["difficulty"] = game.difficulty
-            if game.category != 'any':
-                params["category"] = game.category
-
-            response = requests.get(TRIVIA_API_URL, params=params, timeout=10)
-            response.raise_for_status()
-            question_data = response.json()
-
-            if question_data['response_code'] == 0 and question_data['results']:
-                q = question_data['results'][0]
-                question_obj = {
-                    "id": str(uuid.uuid4()), # Unique ID for this specific question instance
-                    "category": q['category'],
-                    "type": q['type'],
-                    "difficulty": q['difficulty'],
-                    "question": q['question'],
-                    "correct_answer": q['correct_answer'],
-                    "incorrect_answers": q['incorrect_answers']
-                }
-                game.set_current_question(question_obj)
-            else:
-                game.end_game() # End game if no question can be fetched
-                return jsonify({"error": "Could not fetch initial question"}), 500
+            reserved = reserve_questions(game)
+            fetch_error = None
         except requests.exceptions.RequestException as e:
-            game.end_game() # End game if API call fails
-            return jsonify({"error": f"Error fetching initial question from external API: {e}"}), 500
+            reserved, fetch_error = deque(), e
+        first = question_table.get(reserved[0]) if reserved else fallback_question(game)
+        if first is None:
+            logger.warning("Could not fetch initial question", extra={"room_id": room_id, "error": str(fetch_error)})
+            if isinstance(fetch_error, TriviaUnavailableError):
+                # Circuit open or rate limited: same answer as /question, so clients back off alike
+                return jsonify({"error": f"Trivia API unavailable: {fetch_error}"}), 503, {"Retry-After": str(int(fetch_error.retry_after) + 1)}
+            if fetch_error is not None:
+                return jsonify({"error": f"Error fetching initial question from external API: {fetch_error}"}), 500
+            return jsonify({"error": "Could not fetch initial question"}), 500
 
-    return jsonify({
-        "message": "Game started",
-        "question": game.current_question,
-        "total_questions": game.num_questions,
-        "player_scores": game.get_player_scores()
-    }), 200
+        game.start_game()
+        game.last_activity = datetime.now()
+        room_expiry.track(game)
+        game.reserve_questions(reserved)
+        set_question(game, first)
+        publish(game, "game_started", {
+            "question": room_public_question(game),
+            "current_question_index": game.current_question_index,
+            "total_questions": game.num_questions,
+            "round_deadline": game.round_deadline
+        })
+        save_game(game, base_version)
+
+        return jsonify({
+            "message": "Game started",
+            "question": room_public_question(game),
+            "total_questions": game.num_questions,
+            "player_scores": dict(game.scores)
+        }), 200
 
 @game_bp.route('/submit_answer', methods=['POST'])
+@retry_on_conflict
 def submit_answer():
     data = request.get_json()
     room_id = data.get('room_id')
     player_name = data.get('player_name')
+    player_id = data.get('player_id') # Optional; avoids the by-name lookup
     question_id = data.get('question_id')
     answer = data.get('answer')
 
-    if not room_id or not player_name or not question_id or answer is None:
+    if not room_id or not (player_id or player_name) or not question_id or answer is None:
         return jsonify({"error": "Missing required fields"}), 400
 
-    with games_lock:
-        game = games.get(room_id)
-        if not game:
-            return jsonify({"error": "Room not found"}), 404
+    game = get_game(room_id)
+    if not game:
+        return jsonify({"error": "Room not found"}), 404
+
+    with game.lock:
         if not game.game_started:
             return jsonify({"error": "Game has not started"}), 400
+        base_version = game.version
 
-        # Find the player by name (assuming names are unique for simplicity in this context)
-        # In a real app, you'd use player_id passed from frontend
-        player_obj = next((p for p in game.players.values() if p.name == player_name), None)
+        # Find the player by id, or by name (assuming names are unique in a room)
+        player_obj = find_player(game, player_id, player_name)
         if not player_obj:
             return jsonify({"error": "Player not found in room"}), 404
 
-        if game.submit_answer(player_obj.player_id, question_id, answer):
-            game.last_activity = datetime.now()
-            # Check if all players have answered
-            if game.all_players_answered():
-                # If it's the last question, end the game
-                if game.current_question_index >= game.num_questions:
-                    game.end_game()
-                    return jsonify({"message": "Answer submitted, game ended"}), 200
-                else:
-                    # Fetch next question
-                    try:
-                        params = {
-                            "amount": 1,
-                            "type": "multiple"
-                        }
-                        if game.difficulty != 'any':
-                            params["difficulty"] = game.difficulty
-                        if game.category != 'any':
-                            params["category"] = game.category
-
-                        response = requests.get(TRIVIA_API_URL, params=params, timeout=10)
-                        response.raise_for_status()
-                        question_data = response.json()
-
-                        if question_data['response_code'] == 0 and question_data['results']:
-                            q = question_data['results'][0]
-                            question_obj = {
-                                "id": str(uuid.uuid4()), # Unique ID for this specific question instance
-                                "category": q['category'],
-                                "type": q['type'],
-                                "difficulty": q['difficulty'],
-                                "question": q['question'],
-                                "correct_answer": q['correct_answer'],
-                                "incorrect_answers": q['incorrect_answers']
-                            }
-                            game.set_current_question(question_obj)
-                        else:
-                            game.end_game() # End game if no question can be fetched
-                            return jsonify({"error": "Could not fetch next question"}), 500
-                    except requests.exceptions.RequestException as e:
-                        game.end_game() # End game if API call fails
-                        return jsonify({"error": f"Error fetching next question from external API: {e}"}), 500
-            return jsonify({"message": "Answer submitted"}), 200
-        else:
+        outcome = apply_answer(game, player_obj, question_id, answer)
+        if outcome is None:
             return jsonify({"error": "Invalid submission or already answered"}), 400
+        save_game(game, base_version)
+        body, status = answer_result(outcome)
+        return jsonify(body), status
+
+def is_scalar(value):
+    return value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool))
+
+@game_bp.route('/submit_answers', methods=['POST'])
+def submit_answers():
+    # Bulk form of /submit_answer for gateways relaying many players' answers:
+    # {"answers": [{"room_id", "player_id", "question_id", "answer"}, ...]}
+    data = request.get_json(silent=True) or {}
+    items = data.get('answers')
+    if not isinstance(items, list):
+        return jsonify({"error": "answers must be a list"}), 400
+    if len(items) > MAX_ANSWER_BATCH:
+        return jsonify({"error": f"At most {MAX_ANSWER_BATCH} answers per request"}), 413
+
+    results = [None] * len(items)
+    by_room = {}
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {"status": 400, "error": "Missing required fields"}
+            continue
+        room_id = item.get('room_id')
+        if not room_id or not (item.get('player_id') or item.get('player_name')) or not item.get('question_id') or item.get('answer') is None:
+            results[i] = {"status": 400, "error": "Missing required fields"}
+            continue
+        # Checked before grouping: a list or dict would raise mid-batch, under the room lock
+        if not all(is_scalar(item.get(field)) for field in ANSWER_FIELDS):
+            results[i] = {"status": 400, "error": "Answer fields must be strings or numbers"}
+            continue
+        by_room.setdefault(room_id, []).append(i)
+
+    for room_id, indexes in by_room.items():
+        for _ in range(CAS_RETRIES):
+            try:
+                apply_room_answers(room_id, items, indexes, results)
+                break
+            except StaleRoomError:
+                continue # Reload and re-apply this room's whole batch
+        else:
+            for i in indexes:
+                results[i] = {"status": 409, "error": "Room is busy, please retry"}
+
+    return jsonify({"results": results}), 200
+
+def leaderboard_limit():
+    return max(1, min(request.args.get('limit', DEFAULT_LEADERBOARD_LIMIT, type=int), MAX_LEADERBOARD_LIMIT))
+
+@game_bp.route('/leaderboard/<room_id>', methods=['GET'])
+def get_leaderboard(room_id):
+    # Top players of one room, best first; ties share a rank
+    game = get_game(room_id)
+    if not game:
+        return jsonify({"error": "Room not found"}), 404
+
+    with game.lock:
+        players = [
+            {"rank": rank, "player_id": player_id, "player_name": game.players[player_id].name, "score": score}
+            for rank, player_id, score in game.leaderboard.top(leaderboard_limit())
+        ]
+        total = len(game.leaderboard)
+    return jsonify({"room_id": room_id, "players": players, "total_players": total}), 200
+
+@game_bp.route('/leaderboard/<room_id>/rank', methods=['GET'])
+def get_player_rank(room_id):
+    player_id = request.args.get('player_id')
+    player_name = request.args.get('player_name')
+    if not player_id and not player_name:
+        return jsonify({"error": "Player ID or name is required"}), 400
+
+    game = get_game(room_id)
+    if not game:
+        return jsonify({"error": "Room not found"}), 404
+
+    with game.lock:
+        player_obj = find_player(game, player_id, player_name)
+        if not player_obj:
+            return jsonify({"error": "Player not found in room"}), 404
+        result = {
+            "room_id": room_id,
+            "player_id": player_obj.player_id,
+            "player_name": player_obj.name,
+            "score": player_obj.score,
+            "rank": game.leaderboard.rank(player_obj.player_id),
+            "total_players": len(game.leaderboard)
+        }
+    result["hall_of_fame_rank"] = hall_of_fame.rank(room_id, player_obj) # None outside the kept top scores
+    return jsonify(result), 200
+
+@game_bp.route('/hall_of_fame', methods=['GET'])
+def get_hall_of_fame():
+    # Best scores across all rooms this server has run, including expired ones
+    return jsonify({"entries": hall_of_fame.top(leaderboard_limit()), "size": len(hall_of_fame)}), 200
+
+round_timer.set_handler(expire_round)
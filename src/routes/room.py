@@ -0,0 +1,349 @@
+from flask import Blueprint, request, jsonify, g
+from sqlalchemy import delete, event, exists, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from src.models.room import db, Room, Player
+from src.question_pool import fetch_questions
+import logging
+import random
+import string
+import threading
+import time
+import requests
+from datetime import datetime, timedelta
+
+room_bp = Blueprint('room', __name__)
+logger = logging.getLogger(__name__)
+
+ROOM_CODE_ATTEMPTS = 10 # Inserts to try before giving up on a free code
+ROOM_TTL = timedelta(hours=1) # Rooms with no activity for this long are reaped
+REAPER_INTERVAL = 60 # Seconds between background reaper runs
+
+# Statements issued per endpoint, to keep the durable mode's round trips visible
+db_stats = {}
+db_stats_lock = threading.Lock()
+
+def fetch_trivia_question(difficulty='', category=''):
+    """Obtiene una pregunta de trivia con configuraciones opcionales"""
+    try:
+        questions = fetch_questions(1, difficulty or 'any', category or 'any')
+        if questions:
+            question_data = questions[0]
+
+            # La pregunta ya viene decodificada y con las opciones mezcladas desde la ingesta
+            return {
+                'question': question_data['question'],
+                'options': question_data['options'],
+                'category': question_data['category'],
+                'difficulty': question_data['difficulty'],
+                'correct_answer': question_data['correct_index']
+            }
+    except requests.exceptions.RequestException as e:
+        logger.warning("Error fetching question: %s", e)
+
+    return None
+
+def inactive_room_ids(cutoff):
+    """Salas sin actividad ni jugadores vistos desde `cutoff`"""
+    return select(Room.id).where(
+        Room.last_activity < cutoff,
+        ~exists().where(Player.room_id == Room.id, Player.last_seen >= cutoff)
+    )
+
+def cleanup_inactive_rooms():
+    """Borra en bloque las salas inactivas y sus jugadores (dos sentencias)"""
+    try:
+        cutoff = datetime.utcnow() - ROOM_TTL
+        expired = inactive_room_ids(cutoff).scalar_subquery()
+        db.session.execute(delete(Player).where(Player.room_id.in_(expired)))
+        result = db.session.execute(delete(Room).where(Room.id.in_(inactive_room_ids(cutoff).scalar_subquery())))
+        db.session.commit()
+        return result.rowcount
+    except Exception:
+        logger.exception("Error cleaning up rooms")
+        db.session.rollback()
+        return 0
+
+def start_room_reaper(app):
+    """Limpia salas inactivas en segundo plano en lugar de en cada create-room"""
+    def run():
+        while True:
+            time.sleep(REAPER_INTERVAL)
+            with app.app_context():
+                removed = cleanup_inactive_rooms()
+            if removed:
+                logger.info("Reaped %d inactive rooms", removed)
+
+    threading.Thread(target=run, name="room-reaper", daemon=True).start()
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    try:
+        g.db_statements = g.get('db_statements', 0) + 1
+    except RuntimeError:
+        pass # Outside a request (reaper, create_all)
+
+def record_db_statements(response):
+    statements = g.pop('db_statements', 0)
+    response.headers['X-DB-Statements'] = str(statements)
+    endpoint = request.endpoint or 'unknown'
+    with db_stats_lock:
+        stats = db_stats.setdefault(endpoint, {"requests": 0, "statements": 0})
+        stats["requests"] += 1
+        stats["statements"] += statements
+    return response
+
+def init_room_store(app, database_url):
+    """Activa el modo persistente (SQLAlchemy) en la app"""
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+    room_bp.after_request(record_db_statements)
+    app.register_blueprint(room_bp)
+
+def insert_room(**fields):
+    """Inserta una sala con un código libre; el índice único detecta colisiones"""
+    for _ in range(ROOM_CODE_ATTEMPTS):
+        room = Room(code=''.join(random.choices(string.ascii_uppercase + string.digits, k=6)), **fields)
+        try:
+            with db.session.begin_nested():
+                db.session.add(room)
+            return room
+        except IntegrityError:
+            continue
+    raise RuntimeError("Could not allocate a free room code")
+
+@room_bp.route('/create-room', methods=['POST'])
+def create_room():
+    """Crea una nueva sala de juego"""
+    try:
+        data = request.get_json()
+        player_name = data.get('player_name', '').strip()
+        settings = data.get('settings', {})
+
+        if not player_name:
+            return jsonify({'error': 'Player name is required'}), 400
+
+        # Crear nueva sala con configuraciones en columnas propias
+        now = datetime.utcnow()
+        room = insert_room(
+            is_active=True,
+            created_at=now,
+            last_activity=now,
+            difficulty=settings.get('difficulty', ''),
+            category=str(settings.get('category', '')),
+            amount=settings.get('amount', 10)
+        )
+
+        # Crear el jugador creador
+        player = Player(
+            name=player_name,
+            room_id=room.id,
+            last_seen=now
+        )
+        db.session.add(player)
+        db.session.commit()
+
+        return jsonify({
+            'room_code': room.code,
+            'room_id': room.id,
+            'player_id': player.id,
+            'player_name': player_name
+        })
+
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error creating room")
+        return jsonify({'error': 'Failed to create room. Please try again.'}), 500
+
+@room_bp.route('/join-room', methods=['POST'])
+def join_room():
+    """Se une a una sala existente"""
+    try:
+        data = request.get_json()
+        room_code = data.get('room_code', '').strip().upper()
+        player_name = data.get('player_name', '').strip()
+
+        if not room_code or not player_name:
+            return jsonify({'error': 'Room code and player name are required'}), 400
+
+        # Buscar la sala (por el índice de code)
+        room_id = db.session.execute(
+            select(Room.id).where(Room.code == room_code, Room.is_active.is_(True))
+        ).scalar()
+        if room_id is None:
+            return jsonify({'error': 'Room not found or inactive'}), 404
+
+        # Crear el nuevo jugador; si el nombre ya existe en la sala, la restricción única lo detecta
+        now = datetime.utcnow()
+        player = Player(name=player_name, room_id=room_id, last_seen=now)
+        try:
+            with db.session.begin_nested():
+                db.session.add(player)
+        except IntegrityError:
+            # Si el jugador ya existe, actualizar su last_seen y devolver sus datos
+            player = Player.query.filter_by(room_id=room_id, name=player_name).first()
+            player.last_seen = now
+        db.session.commit()
+
+        return jsonify({
+            'room_code': room_code,
+            'room_id': room_id,
+            'player_id': player.id,
+            'player_name': player_name
+        })
+
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error joining room")
+        return jsonify({'error': 'Failed to join room. Please try again.'}), 500
+
+@room_bp.route('/room/<int:room_id>/status', methods=['GET'])
+def get_room_status(room_id):
+    """Obtiene el estado actual de la sala"""
+    try:
+        # Sala y jugadores en una sola consulta
+        room = Room.query.options(joinedload(Room.players)).filter_by(id=room_id, is_active=True).first()
+        if not room:
+            return jsonify({'error': 'Room not found or inactive'}), 404
+
+        # Actualizar last_seen del jugador que hace la consulta, sin leerlo antes
+        player_id = request.args.get('player_id', type=int)
+        if player_id:
+            db.session.execute(
+                update(Player)
+                .where(Player.id == player_id, Player.room_id == room_id)
+                .values(last_seen=datetime.utcnow())
+            )
+            db.session.commit()
+
+        return jsonify({
+            'room_code': room.code,
+            'question_number': room.question_number,
+            'current_question': room.current_question,
+            'is_active': room.is_active,
+            'players': [{
+                'id': player.id,
+                'name': player.name,
+                'score': player.score,
+                'has_answered': player.has_answered
+            } for player in room.players]
+        })
+
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error getting room status", extra={"room_id": room_id})
+        return jsonify({'error': 'Failed to get room status'}), 500
+
+@room_bp.route('/room/<int:room_id>/next-question', methods=['POST'])
+def next_question(room_id):
+    """Carga la siguiente pregunta para la sala"""
+    try:
+        room = db.session.execute(
+            select(Room).where(Room.id == room_id, Room.is_active.is_(True))
+        ).scalar()
+        if not room:
+            return jsonify({'error': 'Room not found or inactive'}), 404
+
+        # Verificar si se ha alcanzado el límite de preguntas
+        if room.question_number >= room.amount:
+            return jsonify({'error': 'Game completed', 'game_finished': True}), 400
+
+        # Obtener nueva pregunta con configuraciones
+        question = fetch_trivia_question(difficulty=room.difficulty, category=room.category)
+        if not question:
+            return jsonify({'error': 'Failed to fetch question'}), 500
+
+        # Actualizar la sala
+        room.current_question = question
+        room.question_number += 1
+        room.last_activity = datetime.utcnow()
+
+        # Resetear respuestas de todos los jugadores
+        db.session.execute(
+            update(Player).where(Player.room_id == room_id).values(current_answer=None, has_answered=False)
+        )
+
+        db.session.commit()
+
+        return jsonify({
+            'question': question,
+            'question_number': room.question_number,
+            'total_questions': room.amount
+        })
+
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error loading next question", extra={"room_id": room_id})
+        return jsonify({'error': 'Failed to load next question'}), 500
+
+@room_bp.route('/player/<int:player_id>/answer', methods=['POST'])
+def submit_answer(player_id):
+    """Envía la respuesta de un jugador"""
+    try:
+        data = request.get_json()
+        answer = data.get('answer')
+
+        if answer is None:
+            return jsonify({'error': 'Answer is required'}), 400
+
+        # Jugador y sala en una sola consulta
+        row = db.session.execute(
+            select(Player, Room.current_question)
+            .join(Room, Player.room_id == Room.id)
+            .where(Player.id == player_id, Room.is_active.is_(True))
+        ).first()
+        if not row:
+            return jsonify({'error': 'Player not found or room inactive'}), 404
+        player, question_data = row
+        if not question_data:
+            return jsonify({'error': 'No active question'}), 400
+
+        # Actualizar respuesta del jugador
+        player.current_answer = answer
+        player.has_answered = True
+        player.last_seen = datetime.utcnow()
+
+        # Verificar si la respuesta es correcta
+        is_correct = answer == question_data['correct_answer']
+        if is_correct:
+            player.score += 1
+
+        db.session.commit()
+
+        return jsonify({
+            'success': True,
+            'is_correct': is_correct,
+            'correct_answer': question_data['correct_answer']
+        })
+
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error submitting answer", extra={"player_id": player_id})
+        return jsonify({'error': 'Failed to submit answer'}), 500
+
+@room_bp.route('/room/<int:room_id>/close', methods=['POST'])
+def close_room(room_id):
+    """Cierra una sala de juego"""
+    try:
+        result = db.session.execute(update(Room).where(Room.id == room_id).values(is_active=False))
+        db.session.commit()
+        if result.rowcount == 0:
+            return jsonify({'error': 'Room not found'}), 404
+
+        return jsonify({'success': True})
+
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error closing room", extra={"room_id": room_id})
+        return jsonify({'error': 'Failed to close room'}), 500
+
+@room_bp.route('/room-store/stats', methods=['GET'])
+def room_store_stats():
+    """Sentencias SQL por petición en cada endpoint del modo persistente"""
+    with db_stats_lock:
+        return jsonify({
+            endpoint: dict(stats, per_request=stats["statements"] / stats["requests"])
+            for endpoint, stats in db_stats.items()
+        })
@@ -0,0 +1,382 @@
+import gc
+import logging
+import pickle
+import sqlite3
+import threading
+from collections import deque
+
+from src.config import games_lock, STATE_BACKEND, STATE_DB_PATH, JOURNAL_DIR
+from src.journal import RoomJournal, ROOM_FULL, ROOM_PARTIAL, ROOM_DELETE
+from src.leaderboard import room_leaderboard
+from src.metrics import TimedLock
+from src.models.game import games, Game
+from src.question_pool import stored_question, load_question
+from src.question_table import question_table
+
+logger = logging.getLogger(__name__)
+
+EVENT_HISTORY = 64 # Deltas kept per room for clients reconnecting with Last-Event-ID
+TOUCH_INTERVAL = 60 # Seconds between persisting last_activity for read-only polls
+
+RUNTIME_FIELDS = Game.RUNTIME_FIELDS
+
+def init_room_runtime(game):
+    game.lock = TimedLock('room') # Per-room lock for all game state
+    game.changed = threading.Condition(game.lock) # Notified on every published change
+    game.events = deque(maxlen=EVENT_HISTORY)
+    game.snapshot_version = -1 # Version that snapshot_body was built for
+    game.snapshot_body = None
+    game.persisted_activity = game.last_activity
+    game.leaderboard = room_leaderboard(game) # Players by score, kept in step as points are awarded
+    game.changes = None # Only journaled rooms record their mutations
+
+def room_state(game):
+    state = {name: getattr(game, name) for name in Game.STATE_FIELDS}
+    # Rooms hold shared question ids. The questions they refer to travel with the state,
+    # so a restarted process or another worker can rebuild its question table from it.
+    question_ids = list(game.question_queue)
+    if game.current_question:
+        question_ids.append(game.current_question)
+    state['questions'] = [stored_question(question_table.get(question_id)) for question_id in question_ids]
+    return state
+
+def restore_room(state, game=None):
+    """A Game from a saved room state, or `game` with that state loaded into it."""
+    for stored in state.pop('questions', ()):
+        load_question(stored)
+    if game is None:
+        game = Game.__new__(Game)
+        game.changes = None # Recorded only once a journaling store takes the room
+    for name, value in state.items():
+        setattr(game, name, value)
+    return game
+
+def dump_room(game):
+    return pickle.dumps(room_state(game), protocol=pickle.HIGHEST_PROTOCOL)
+
+def dump_changes(game):
+    """The room's mutations since its last save, for a journal record. Caller holds game.lock.
+
+    The record grows with the change, not the room: an answer is a few dozen
+    bytes whether the room has 2 players or 10,000. Questions a change brings
+    in travel with it, and the two fields the routes set directly are repeated.
+    """
+    questions, changes = [], []
+    for method, *args in game.changes:
+        if method == 'set_current_question':
+            question, instance_id = args
+            questions.append(stored_question(question))
+            args = (question['id'], instance_id)
+        elif method == 'reserve_questions':
+            questions.extend(stored_question(question_table.get(question_id)) for question_id in args[0])
+        changes.append((method, *args))
+    game.changes.clear()
+    return pickle.dumps((questions, changes, game.last_activity, game.round_deadline), protocol=pickle.HIGHEST_PROTOCOL)
+
+def replay_changes(game, payload):
+    """Apply a record written by dump_changes through the same model methods."""
+    questions, changes, last_activity, round_deadline = pickle.loads(payload)
+    for stored in questions:
+        load_question(stored)
+    for method, *args in changes:
+        if method == 'set_current_question':
+            args = (question_table.get(args[0]), args[1])
+        getattr(game, method)(*args)
+    game.last_activity = last_activity
+    game.round_deadline = round_deadline
+
+class StaleRoomError(Exception):
+    """The room was changed by another worker since this one loaded it."""
+
+class InMemoryStateStore:
+    """Rooms live only in this process's `games` dict.
+
+    With a journal, every saved change is also appended to it so the rooms
+    can be rebuilt after a crash or restart (see src/journal.py).
+    """
+
+    shared = False
+
+    def __init__(self, journal=None):
+        self.journal = journal
+
+    def _journal_changes(self, game):
+        # Caller holds game.lock. The whole room is only written when it is created
+        # and in snapshots; every later save journals just what changed.
+        if game.changes:
+            self.journal.append(ROOM_PARTIAL, game.room_id, game.version, dump_changes(game))
+
+    def get(self, room_id):
+        with games_lock:
+            return games.get(room_id)
+
+    def refresh(self, game):
+        # Every change to the room is made in this process, so the copy is always current
+        return True
+
+    def add(self, game):
+        with games_lock:
+            if game.room_id in games:
+                return False
+            games[game.room_id] = game
+        if self.journal:
+            self.journal.append(ROOM_FULL, game.room_id, game.version, dump_room(game))
+            game.changes = []
+        return True
+
+    def save(self, game, expected_version):
+        # The room lock already serializes writers inside one process
+        if self.journal:
+            self._journal_changes(game)
+        return True
+
+    def touch(self, game):
+        pass
+
+    def remove(self, room_id):
+        with games_lock:
+            removed = games.pop(room_id, None)
+        if removed is not None and self.journal:
+            self.journal.append(ROOM_DELETE, room_id, 0)
+
+    def expire(self, room_id, threshold):
+        """Remove the room if it has been idle since before `threshold`. Returns True if removed."""
+        with games_lock:
+            game = games.get(room_id)
+            if game is None or game.last_activity >= threshold:
+                return False
+            del games[room_id]
+        if self.journal:
+            self.journal.append(ROOM_DELETE, room_id, 0)
+        return True
+
+    def remove_inactive(self, threshold):
+        with games_lock:
+            room_ids = [room_id for room_id, game in games.items() if game.last_activity < threshold]
+            for room_id in room_ids:
+                del games[room_id]
+        if self.journal:
+            for room_id in room_ids:
+                self.journal.append(ROOM_DELETE, room_id, 0)
+        return room_ids
+
+    def wait_for_journal(self):
+        if self.journal:
+            self.journal.wait_for_commit()
+
+    def recover(self):
+        """Load the rooms recorded in the journal. Returns the recovered games."""
+        if not self.journal:
+            return []
+        recovered = []
+        # Loading only allocates, so cyclic GC passes over the growing heap are pure
+        # overhead (they roughly double recovery time for tens of thousands of rooms)
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for room_id, (version, payloads) in self.journal.recover().items():
+                game = restore_room(pickle.loads(payloads[0]))
+                for payload in payloads[1:]:
+                    replay_changes(game, payload)
+                game.version = version
+                init_room_runtime(game)
+                game.changes = []
+                recovered.append(game)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        with games_lock:
+            for game in recovered:
+                games[game.room_id] = game
+        return recovered
+
+    def _snapshot_rooms(self):
+        # Runs on the journal's writer thread; each room is only locked while it is pickled
+        with games_lock:
+            rooms = list(games.values())
+        for game in rooms:
+            with game.lock:
+                yield game.room_id, game.version, dump_room(game)
+
+    def start_journal(self):
+        if self.journal:
+            self.journal.start(self._snapshot_rooms)
+
+    def count(self):
+        with games_lock:
+            return len(games)
+
+class SQLiteStateStore:
+    """Rooms shared by every worker on the host through a WAL-mode SQLite file.
+
+    `games` stays a per-process cache: a request reloads a room only when the
+    stored version moved, and writes use compare-and-set on that version so
+    two workers can never both apply a change to the same room state.
+    """
+
+    shared = True
+    journal = None # Rooms already survive restarts in the database file
+
+    def __init__(self, path):
+        self.local = threading.local() # One connection per thread
+        self.path = path
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rooms ("
+            "room_id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+            "last_activity REAL NOT NULL, data BLOB NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_rooms_last_activity ON rooms (last_activity)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, room_id):
+        with games_lock:
+            cached = games.get(room_id)
+        row = self._conn().execute("SELECT version FROM rooms WHERE room_id = ?", (room_id,)).fetchone()
+        if row is None:
+            if cached is not None:
+                with games_lock:
+                    games.pop(room_id, None) # Expired or removed by another worker
+            return None
+        if cached is not None and cached.version == row[0]:
+            return cached
+
+        row = self._conn().execute("SELECT data FROM rooms WHERE room_id = ?", (room_id,)).fetchone()
+        if row is None:
+            return None
+        state = pickle.loads(row[0])
+        if cached is not None:
+            # Keep this worker's lock and listeners; only the game state is replaced
+            with cached.lock:
+                self._replace(cached, state)
+            return cached
+        game = restore_room(state)
+        init_room_runtime(game)
+        with games_lock:
+            game = games.setdefault(room_id, game)
+        return game
+
+    def refresh(self, game):
+        """Reload the room if another worker changed it. Caller holds game.lock.
+
+        Returns False if the room no longer exists.
+        """
+        row = self._conn().execute("SELECT version, data FROM rooms WHERE room_id = ? AND version != ?",
+                                   (game.room_id, game.version)).fetchone()
+        if row is not None:
+            self._replace(game, pickle.loads(row[1]))
+            return True
+        if self._conn().execute("SELECT 1 FROM rooms WHERE room_id = ?", (game.room_id,)).fetchone():
+            return True
+        with games_lock:
+            if games.get(game.room_id) is game:
+                del games[game.room_id]
+        return False
+
+    def _replace(self, game, state):
+        # Caller holds game.lock. The event history only covers changes made by this
+        # worker, so it is dropped: listeners see the gap and send a fresh snapshot.
+        restore_room(state, game)
+        game.events.clear()
+        game.persisted_activity = game.last_activity
+        game.leaderboard = room_leaderboard(game)
+        game.changed.notify_all()
+
+    def add(self, game):
+        try:
+            self._conn().execute(
+                "INSERT INTO rooms (room_id, version, last_activity, data) VALUES (?, ?, ?, ?)",
+                (game.room_id, game.version, game.last_activity.timestamp(), dump_room(game))
+            )
+        except sqlite3.IntegrityError:
+            return False
+        with games_lock:
+            games[game.room_id] = game
+        return True
+
+    def save(self, game, expected_version):
+        # Caller holds game.lock
+        cursor = self._conn().execute(
+            "UPDATE rooms SET version = ?, last_activity = ?, data = ? WHERE room_id = ? AND version = ?",
+            (game.version, game.last_activity.timestamp(), dump_room(game), game.room_id, expected_version)
+        )
+        if cursor.rowcount != 1:
+            with games_lock:
+                games.pop(game.room_id, None) # Drop the stale copy so the retry reloads it
+            return False
+        game.persisted_activity = game.last_activity
+        return True
+
+    def touch(self, game):
+        # Caller holds game.lock. Polls only refresh the shared expiry clock once a minute.
+        if (game.last_activity - game.persisted_activity).total_seconds() >= TOUCH_INTERVAL:
+            self._conn().execute(
+                "UPDATE rooms SET last_activity = MAX(last_activity, ?) WHERE room_id = ?",
+                (game.last_activity.timestamp(), game.room_id)
+            )
+            game.persisted_activity = game.last_activity
+
+    def remove(self, room_id):
+        self._conn().execute("DELETE FROM rooms WHERE room_id = ?", (room_id,))
+        with games_lock:
+            games.pop(room_id, None)
+
+    def expire(self, room_id, threshold):
+        # The row's last_activity reflects every worker's touches, not just ours
+        cursor = self._conn().execute(
+            "DELETE FROM rooms WHERE room_id = ? AND last_activity < ?",
+            (room_id, threshold.timestamp())
+        )
+        if cursor.rowcount != 1:
+            return False
+        with games_lock:
+            games.pop(room_id, None)
+        return True
+
+    def remove_inactive(self, threshold):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cutoff = threshold.timestamp()
+            room_ids = [row[0] for row in conn.execute("SELECT room_id FROM rooms WHERE last_activity < ?", (cutoff,))]
+            conn.execute("DELETE FROM rooms WHERE last_activity < ?", (cutoff,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        with games_lock:
+            for room_id in room_ids:
+                games.pop(room_id, None)
+        return room_ids
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM rooms").fetchone()[0]
+
+    def wait_for_journal(self):
+        pass
+
+    def recover(self):
+        return []
+
+    def start_journal(self):
+        pass
+
+def create_state_store(backend=STATE_BACKEND):
+    if backend == 'sqlite':
+        if JOURNAL_DIR:
+            logger.warning("JOURNAL_DIR is ignored with the sqlite backend")
+        return SQLiteStateStore(STATE_DB_PATH)
+    if backend == 'memory':
+        return InMemoryStateStore(RoomJournal(JOURNAL_DIR) if JOURNAL_DIR else None)
+    raise ValueError(f"Unknown STATE_BACKEND: {backend}")
+
+state_store = create_state_store()
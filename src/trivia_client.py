@@ -0,0 +1,296 @@
+import random
+import threading
+import time
+
+import requests
+
+from src.config import (TRIVIA_API_URL, TRIVIA_API_RATE, TRIVIA_API_BURST,
+                        TRIVIA_API_FAILURE_THRESHOLD, TRIVIA_API_RESET_TIMEOUT)
+from src.metrics import registry, add_request_time
+
+OPENTDB_RATE_LIMITED = 5 # opentdb response_code for "too many requests"
+REQUEST_TIMEOUT = 10 # Seconds per HTTP call to opentdb
+
+UPSTREAM_LATENCY = registry.histogram('trivia_api_request_duration_seconds', 'Latency of HTTP calls to opentdb.')
+# outcome: ok, rate_limited (429 or response_code 5), timeout, connection_error, http_error,
+# bad_response (not opentdb's JSON, e.g. an HTML error page from a proxy)
+UPSTREAM_REQUESTS = registry.counter('trivia_api_requests_total', 'HTTP calls to opentdb by outcome.', ('outcome',))
+# reason: circuit_open, rate_limit (our own token bucket); no HTTP call was made
+UPSTREAM_REJECTED = registry.counter('trivia_api_rejected_total', 'Calls failed fast without contacting opentdb.', ('reason',))
+
+class TriviaUnavailableError(requests.exceptions.RequestException):
+    """Raised without calling opentdb; `retry_after` is a hint in seconds."""
+
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitOpenError(TriviaUnavailableError):
+    pass
+
+class RateLimitedError(TriviaUnavailableError):
+    pass
+
+class InvalidResponseError(requests.exceptions.RequestException):
+    """opentdb answered, but not with its JSON format."""
+
+def upstream_outcome(error):
+    if isinstance(error, RateLimitedError):
+        return 'rate_limited'
+    if isinstance(error, InvalidResponseError):
+        return 'bad_response'
+    if isinstance(error, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(error, requests.exceptions.ConnectionError):
+        return 'connection_error'
+    return 'http_error'
+
+def retry_after_header(response, default=5.0):
+    try:
+        return float(response.headers.get('Retry-After', default))
+    except ValueError:
+        return default # An HTTP date; not worth parsing for a hint
+
+def read_results(response):
+    """The results of an opentdb response ([] when it has nothing for the filter).
+
+    Works on requests and httpx responses alike. Raises RateLimitedError,
+    requests.exceptions.HTTPError or InvalidResponseError.
+    """
+    if response.status_code == 429:
+        raise RateLimitedError("Trivia API returned 429", retry_after_header(response))
+    if response.status_code >= 400:
+        raise requests.exceptions.HTTPError(f"Trivia API returned HTTP {response.status_code}", response=response)
+    try:
+        data = response.json()
+        response_code = data['response_code']
+        results = data['results'] if response_code == 0 else []
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidResponseError(f"Unreadable response from trivia API: {e!r}") from e
+    if response_code == OPENTDB_RATE_LIMITED:
+        raise RateLimitedError("Trivia API rate limited the request", 5)
+    return results or []
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate # Tokens added per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        # Caller holds self.lock
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available. Returns 0 on success, else seconds until the next token."""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def wait_time(self):
+        """Seconds until a token is available, without taking one."""
+        with self.lock:
+            self._refill()
+            return max(0, (1 - self.tokens) / self.rate)
+
+    def acquire(self, max_wait=0):
+        """Take a token, sleeping up to `max_wait` seconds for one. Returns False if none came."""
+        deadline = time.monotonic() + max_wait
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one probe through after `reset_timeout`."""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return 'closed'
+            if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def allow(self):
+        """Returns 0 if a call may go ahead, else seconds until the breaker will try again."""
+        with self.lock:
+            if self.opened_at is None:
+                return 0
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self.probing:
+                return max(remaining, 1)
+            self.probing = True # Half-open: exactly one caller probes the API
+            return 0
+
+    def release(self):
+        """Give back a half-open probe slot without judging the API."""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+class _Call:
+    def __init__(self, max_wait):
+        self.max_wait = max_wait # How long the leader may wait for a rate-limit token
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class TriviaClient:
+    """The one place that talks to opentdb.
+
+    Identical concurrent requests share one HTTP call, calls are paced by a
+    token bucket matching opentdb's limits, a circuit breaker fails fast
+    while the API is erroring or rate limiting us, and transient errors are
+    retried with jittered exponential backoff.
+    """
+
+    def __init__(self, retries=2, backoff=0.5):
+        self.session = requests.Session() # Keep-alive connection reuse
+        self.bucket = TokenBucket(TRIVIA_API_RATE, TRIVIA_API_BURST)
+        self.breaker = CircuitBreaker(TRIVIA_API_FAILURE_THRESHOLD, TRIVIA_API_RESET_TIMEOUT)
+        self.retries = retries
+        self.backoff = backoff
+        self.in_flight = {} # params key -> _Call
+        self.lock = threading.Lock()
+
+    def fetch(self, amount, difficulty='any', category='any', question_type='multiple', max_wait=0):
+        """Return opentdb results ([] when it has nothing for this filter).
+
+        `max_wait` is how long the caller is willing to wait for a rate-limit
+        token; request handlers should keep it at 0 and fall back instead.
+        """
+        params = {
+            "amount": amount,
+            "type": question_type
+        }
+        if difficulty != 'any':
+            params["difficulty"] = difficulty
+        if category != 'any':
+            params["category"] = category
+        started = time.perf_counter()
+        try:
+            return self._fetch_coalesced(params, max_wait)
+        finally:
+            # Charged to the calling request even when it only waited on another thread's call
+            add_request_time('upstream', time.perf_counter() - started)
+
+    def _fetch_coalesced(self, params, max_wait):
+        # Concurrent callers with the same parameters share one HTTP call
+        key = tuple(sorted(params.items()))
+
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = _Call(max_wait)
+
+        if not leader:
+            if call.max_wait > max_wait:
+                # The leader (say, the pool refiller) may sit out the rate limit longer
+                # than this caller would; it makes its own call or fails fast instead
+                return self._fetch(params, max_wait)
+            # Waiting for the leader's token is within this caller's own max_wait; then one HTTP call
+            if not call.done.wait(max_wait + REQUEST_TIMEOUT):
+                raise requests.exceptions.Timeout("Timed out waiting for a shared Trivia API call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._fetch(params, max_wait)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.done.set()
+
+    def admit(self, max_wait=0):
+        """Get past the circuit breaker and take a rate-limit token, or raise without calling opentdb."""
+        retry_after = self.breaker.allow()
+        if retry_after:
+            UPSTREAM_REJECTED.labels('circuit_open').inc()
+            raise CircuitOpenError("Trivia API circuit is open", retry_after)
+        if not self.bucket.acquire(max_wait):
+            self.breaker.release() # Nothing was sent, so this was not a probe
+            UPSTREAM_REJECTED.labels('rate_limit').inc()
+            raise RateLimitedError("Trivia API rate limit reached", self.bucket.wait_time())
+
+    def record_failure(self, outcome, attempt, status=None):
+        """Count a failed call and tell the breaker. Returns seconds to back off before retrying, or None to give up."""
+        UPSTREAM_REQUESTS.labels(outcome).inc()
+        if outcome == 'rate_limited':
+            # Retrying sooner than opentdb's window only extends the ban
+            self.breaker.record_failure()
+            return None
+        if status is not None and status < 500:
+            self.breaker.release()
+            return None # Our request was bad; retrying won't help and the API is fine
+        self.breaker.record_failure()
+        if attempt == self.retries:
+            return None
+        # Full jitter: sleep a random time up to the exponential backoff
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def record_success(self):
+        UPSTREAM_REQUESTS.labels('ok').inc()
+        self.breaker.record_success()
+
+    def _fetch(self, params, max_wait):
+        for attempt in range(self.retries + 1):
+            self.admit(max_wait)
+            started = time.perf_counter()
+            try:
+                try:
+                    response = self.session.get(TRIVIA_API_URL, params=params, timeout=REQUEST_TIMEOUT)
+                finally:
+                    UPSTREAM_LATENCY.observe(time.perf_counter() - started)
+                results = read_results(response)
+            except requests.exceptions.RequestException as e:
+                status = e.response.status_code if isinstance(e, requests.exceptions.HTTPError) and e.response is not None else None
+                delay = self.record_failure(upstream_outcome(e), attempt, status)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release() # Never leave the half-open probe slot taken
+                raise
+            self.record_success()
+            return results
+
+trivia_client = TriviaClient()
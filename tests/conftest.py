@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from bench.fake_opentdb import FakeOpenTDB
+
+# src.config reads the environment at import, so the fake API and test settings
+# go in before any test module imports the app
+fake_opentdb = FakeOpenTDB(seed=1).start()
+os.environ.update(
+    TRIVIA_API_URL=fake_opentdb.url,
+    TRIVIA_API_RATE='1000',
+    TRIVIA_API_BURST='1000',
+    ROUND_TIME_LIMIT='0',
+    ADMISSION_ENABLED='0',
+    LOG_LEVEL='WARNING'
+)
+for name in ('STATE_BACKEND', 'JOURNAL_DIR', 'QUESTION_BANK_PATH', 'DATABASE_URL', 'QUESTION_POOL_SNAPSHOT', 'ADMIN_TOKEN'):
+    os.environ.pop(name, None)
+
+@pytest.fixture(scope='session')
+def app():
+    from src.main import app
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def create_room(client, players=1, **settings):
+    """Create a room with `players` players. Returns (room_id, [player_id, ...])."""
+    response = client.post('/create_room', json=dict({"player_name": "player-0"}, **settings))
+    assert response.status_code == 201, response.get_json()
+    room_id = response.get_json()['room_id']
+    player_ids = [response.get_json()['player_id']]
+    for i in range(1, players):
+        response = client.post('/join_room', json={"room_id": room_id, "player_name": f"player-{i}"})
+        assert response.status_code == 200, response.get_json()
+        player_ids.append(response.get_json()['player_id'])
+    return room_id, player_ids
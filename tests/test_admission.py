@@ -0,0 +1,66 @@
+import threading
+import time
+
+import pytest
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import src.routes.game as game_routes
+from src.admission import AdmissionController, BucketTable
+from tests.conftest import create_room
+
+POLL_BURST = 2
+
+@pytest.fixture
+def admission(monkeypatch):
+    admission = AdmissionController(enabled=True)
+    admission.tables['poll'] = (BucketTable(0.01, POLL_BURST), BucketTable(1000, 1000))
+    monkeypatch.setattr(game_routes, 'admission', admission)
+    return admission
+
+def poll(client, room_id, name, address='10.0.0.1', forwarded_for=None):
+    headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else {}
+    return client.get(f'/room_state/{room_id}?player_name={name}', headers=headers,
+                      environ_base={"REMOTE_ADDR": address}).status_code
+
+def test_rotating_player_names_shares_one_bucket(client, admission):
+    room_id, _ = create_room(client, players=POLL_BURST + 1)
+    statuses = [poll(client, room_id, f'player-{i}') for i in range(POLL_BURST + 1)]
+    assert statuses == [200] * POLL_BURST + [429]
+    assert poll(client, room_id, 'player-0', address='10.0.0.2') == 200 # Another address has its own bucket
+
+def test_forwarded_for_is_ignored_without_trusted_proxies(client, admission):
+    room_id, _ = create_room(client)
+    statuses = [poll(client, room_id, 'player-0', forwarded_for=f'192.0.2.{i}') for i in range(POLL_BURST + 1)]
+    assert statuses[-1] == 429
+
+def test_trusted_proxy_supplies_the_client_address(app, client, admission, monkeypatch):
+    monkeypatch.setattr(app, 'wsgi_app', ProxyFix(app.wsgi_app, x_for=1))
+    room_id, _ = create_room(client)
+    # Only the entry the proxy appended counts; the forged one before it is not trusted
+    for i in range(POLL_BURST):
+        assert poll(client, room_id, 'player-0', forwarded_for=f'192.0.2.{i}, 203.0.113.7') == 200
+    assert poll(client, room_id, 'player-0', forwarded_for='192.0.2.99, 203.0.113.7') == 429
+    assert poll(client, room_id, 'player-0', forwarded_for='203.0.113.8') == 200
+
+def test_parked_long_polls_and_streams_are_not_in_flight(app, client, admission, monkeypatch):
+    monkeypatch.setattr('src.admission.ADMISSION_MAX_INFLIGHT', 2)
+    room_id, _ = create_room(client)
+    version = int(client.get(f'/room_state/{room_id}').headers['X-Room-Version'])
+    statuses = []
+    def long_poll(i):
+        statuses.append(app.test_client().get(f'/room_state/{room_id}?since={version}&timeout=5',
+                                              environ_base={"REMOTE_ADDR": f'10.1.0.{i}'}).status_code)
+    pollers = [threading.Thread(target=long_poll, args=(i,)) for i in range(4)]
+    for thread in pollers:
+        thread.start()
+    stream = client.get(f'/room_events/{room_id}', buffered=False, environ_base={"REMOTE_ADDR": '10.2.0.1'})
+    next(stream.response)
+    time.sleep(0.3) # Let the long-polls park on the room
+
+    assert admission.inflight == 0
+    assert poll(client, room_id, 'player-0', address='10.3.0.1') == 200
+    client.post('/join_room', json={"room_id": room_id, "player_name": "wakes-the-pollers"})
+    for thread in pollers:
+        thread.join()
+    stream.close()
+    assert statuses == [200] * 4
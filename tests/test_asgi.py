@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import httpx
+
+from src.asgi import get_question, trivia_client
+from src.trivia_client import trivia_client as sync_client, CircuitOpenError
+from tests.conftest import fake_opentdb
+
+async def request_question(query):
+    sent = []
+    async def send(message):
+        sent.append(message)
+    await get_question({"query_string": query.encode()}, send)
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+def run_with_client(make_coroutine):
+    async def main():
+        await trivia_client.start()
+        try:
+            return await make_coroutine()
+        finally:
+            await trivia_client.close()
+    return asyncio.run(main())
+
+def test_concurrent_misses_for_one_filter_share_one_upstream_call():
+    before = fake_opentdb.get_stats()["requests"]
+    burst = lambda: asyncio.gather(*(request_question('difficulty=hard&category=27&type=boolean') for _ in range(50)))
+    responses = run_with_client(burst)
+    assert all(status == 200 for status, _ in responses)
+    assert fake_opentdb.get_stats()["requests"] - before == 1
+
+def test_async_client_retries_server_errors_and_leaves_client_errors_alone(monkeypatch):
+    calls = []
+    def reply(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(400)
+    async def main():
+        trivia_client.client = httpx.AsyncClient(transport=httpx.MockTransport(reply))
+        try:
+            return await request_question('difficulty=medium&category=28&type=boolean')
+        finally:
+            await trivia_client.close()
+    monkeypatch.setattr(sync_client, 'backoff', 0)
+    failures = sync_client.breaker.failures
+    status, body = asyncio.run(main())
+    assert status == 500 and '400' in body["error"]
+    assert len(calls) == 2 # The 503 was retried; the 400 was not
+    assert sync_client.breaker.failures == failures + 1
+    assert not sync_client.breaker.probing
+
+def test_unavailable_upstream_sends_retry_after(monkeypatch):
+    async def circuit_open(*args):
+        raise CircuitOpenError("Trivia API circuit is open", 7)
+    monkeypatch.setattr(trivia_client, 'fetch', circuit_open)
+    sent = []
+    async def send(message):
+        sent.append(message)
+    asyncio.run(get_question({"query_string": b'difficulty=easy&category=29&type=boolean'}, send))
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"8") in sent[0]["headers"]
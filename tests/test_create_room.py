@@ -0,0 +1,25 @@
+import pytest
+
+from src.models.game import games
+from tests.conftest import create_room
+
+@pytest.mark.parametrize('time_limit', ['30', -1, 2, 10 ** 6, True, None, [30], float('nan')])
+def test_bad_time_limits_are_rejected(client, time_limit):
+    response = client.post('/create_room', json={"player_name": "host", "time_limit": time_limit})
+    assert response.status_code == 400
+    assert 'time_limit' in response.get_json()['error']
+
+@pytest.mark.parametrize('time_limit', [0, 5, 12.5, 3600])
+def test_valid_time_limits_are_kept(client, time_limit):
+    room_id, _ = create_room(client, time_limit=time_limit)
+    assert games[room_id].time_limit == time_limit
+
+@pytest.mark.parametrize('num_questions', ['5', 0, -3, 101, 2.5, True, None, [5]])
+def test_bad_question_counts_are_rejected(client, num_questions):
+    response = client.post('/create_room', json={"player_name": "host", "num_questions": num_questions})
+    assert response.status_code == 400
+    assert 'num_questions' in response.get_json()['error']
+
+def test_valid_question_counts_start(client):
+    room_id, _ = create_room(client, num_questions=1)
+    assert client.post('/start_game', json={"room_id": room_id}).status_code == 200
@@ -0,0 +1,89 @@
+import pickle
+
+import pytest
+
+from src.models.game import Game, Player, games, NOT_AN_OPTION
+from src.question_pool import build_question
+from src.question_table import question_table
+from src.state_store import dump_room, restore_room
+from tests.conftest import create_room
+
+def opentdb_question(text, correct='Yes'):
+    return {"category": "General Knowledge", "type": "multiple", "difficulty": "easy", "question": text,
+            "correct_answer": correct, "incorrect_answers": ["No", "Maybe", "Never"]}
+
+def test_rooms_and_players_have_no_instance_dict():
+    game = Game('R00001', 'host', 'Host')
+    game.add_player('Guest', 'guest')
+    for obj in (game, game.players['guest']):
+        assert not hasattr(obj, '__dict__')
+    with pytest.raises(AttributeError):
+        game.unknown_field = 1
+
+def test_the_same_question_is_stored_once():
+    first = build_question(opentdb_question('Shared &amp; stored once?'))
+    again = build_question(opentdb_question('Shared &amp; stored once?'))
+    assert first is again
+    assert question_table.get(first['id']) is first
+
+def test_answers_are_packed_per_round():
+    question = build_question(opentdb_question('Packed?'))
+    game = Game('R00002', 'host', 'Host')
+    game.add_player('Guest', 'guest')
+    game.set_current_question(question, 'instance-1')
+    assert game.submit_answer('host', 'instance-1', 'Yes')
+    assert not game.submit_answer('host', 'instance-1', 'Yes') # One answer per round
+    assert not game.submit_answer('guest', 'stale-id', 'Yes')
+    assert game.submit_answer('guest', 'instance-1', 'not an option')
+    assert game.answers == bytearray([question['options'].index('Yes') + 1, NOT_AN_OPTION])
+    assert game.all_players_answered()
+    assert game.get_player_scores() == {'Host': 1, 'Guest': 0}
+
+    game.set_current_question(build_question(opentdb_question('Next round?')), 'instance-2')
+    assert game.answers == bytearray(2) and game.answered_count == 0
+
+def test_saved_rooms_carry_their_questions_but_not_renderings():
+    question = build_question(opentdb_question('Saved with the room?'))
+    queued = build_question(opentdb_question('Queued for later?'))
+    game = Game('R00003', 'host', 'Host')
+    game.question_queue.append(queued['id'])
+    game.set_current_question(question, 'instance-1')
+
+    state = pickle.loads(dump_room(game))
+    assert {q['id'] for q in state['questions']} == {question['id'], queued['id']}
+    assert all('json' not in q and 'public_body' not in q for q in state['questions'])
+
+    del question_table.questions[question['id']] # As in a fresh process
+    restored = restore_room(state)
+    assert restored.get_current_question()['question'] == 'Saved with the room?'
+    assert restored.question_instance == 'instance-1'
+
+def test_room_json_only_swaps_in_the_room_question_id(client):
+    room_id, player_ids = create_room(client, players=2)
+    client.post('/start_game', json={"room_id": room_id})
+    question = client.get(f'/room_state/{room_id}').get_json()['current_question']
+    shared = games[room_id].get_current_question()
+    assert question['id'] == games[room_id].question_instance != shared['id']
+    assert 'correct_answer' not in question
+    assert question['question'] == shared['question'] and question['options'] == shared['options']
+
+def test_memory_report_counts_the_question_table_once(client):
+    create_room(client, players=3)
+    report = client.get('/debug/memory').get_json()
+    assert report['question_table']['questions'] == len(question_table)
+    assert report['bytes_per_room'] > 0
+
+def test_memory_report_walks_large_rooms(client):
+    # The leaderboard's skip list is deeper than the recursion limit long before 1000 players
+    room_id, _ = create_room(client, players=1000)
+    report = client.get('/debug/memory').get_json()
+    room = next(room for room in report['largest_rooms'] if room['room_id'] == room_id)
+    assert room['players'] == 1000 and room['total_bytes'] > 0
+
+def test_player_names_are_unique_per_room(client):
+    room_id, player_ids = create_room(client, players=2)
+    response = client.post('/join_room', json={"room_id": room_id, "player_name": "player-1"})
+    assert response.status_code == 409
+    assert [p['name'] for p in client.get(f'/room_state/{room_id}').get_json()['players']] == ['player-0', 'player-1']
+    assert games[room_id].players_by_name['player-1'].player_id == player_ids[1]
+    assert not games[room_id].add_player('player-1', 'another-id')
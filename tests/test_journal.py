@@ -0,0 +1,77 @@
+import pytest
+
+import src.routes.game as game_routes
+from src.journal import RoomJournal
+from src.models.game import Game, games
+from src.question_pool import build_question
+from src.state_store import InMemoryStateStore, dump_changes, room_state
+from tests.conftest import create_room
+from tests.test_game_model import opentdb_question
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = InMemoryStateStore(RoomJournal(str(tmp_path)))
+    store.start_journal()
+    monkeypatch.setattr(game_routes, 'state_store', store)
+    return store
+
+def answer_round(client, room_id, player_ids):
+    question = client.get(f'/room_state/{room_id}').get_json()['current_question']
+    for player_id in player_ids:
+        client.post('/submit_answer', json={
+            "room_id": room_id,
+            "player_id": player_id,
+            "question_id": question['id'],
+            "answer": question['options'][0]
+        })
+
+def comparable(game):
+    state = room_state(game)
+    state['players'] = {p.player_id: (p.name, p.score, p.seat) for p in game.players.values()}
+    state['players_by_name'] = {name: p.player_id for name, p in game.players_by_name.items()}
+    return state
+
+def recover(store, tmp_path):
+    store.journal.commit()
+    return {game.room_id: game for game in InMemoryStateStore(RoomJournal(str(tmp_path))).recover()}
+
+def play_some_rooms(client):
+    lobby, _ = create_room(client, players=3)
+    mid_round, mid_players = create_room(client, players=3, num_questions=3)
+    client.post('/start_game', json={"room_id": mid_round})
+    answer_round(client, mid_round, mid_players)
+    answer_round(client, mid_round, mid_players[:2])
+    ended, ended_players = create_room(client, players=2, num_questions=2)
+    client.post('/start_game', json={"room_id": ended})
+    answer_round(client, ended, ended_players)
+    answer_round(client, ended, ended_players)
+    assert games[ended].game_ended
+    return [lobby, mid_round, ended]
+
+def test_replayed_changes_rebuild_every_room(client, store, tmp_path):
+    room_ids = play_some_rooms(client)
+    expected = {room_id: comparable(games[room_id]) for room_id in room_ids}
+    recovered = recover(store, tmp_path)
+    assert {room_id: comparable(recovered[room_id]) for room_id in room_ids} == expected
+
+def test_changes_after_a_snapshot_replay_on_top_of_it(client, store, tmp_path):
+    room_id, player_ids = create_room(client, players=3, num_questions=3)
+    client.post('/start_game', json={"room_id": room_id})
+    store.journal.snapshot()
+    answer_round(client, room_id, player_ids)
+    client.post('/join_room', json={"room_id": room_id, "player_name": "late"})
+    expected = comparable(games[room_id])
+    assert comparable(recover(store, tmp_path)[room_id]) == expected
+
+def test_an_answer_record_does_not_grow_with_the_room():
+    question = build_question(opentdb_question('Journaled per answer?'))
+    sizes = []
+    for players in (2, 2000):
+        game = Game('R00010', 'host', 'Host')
+        for i in range(1, players):
+            game.add_player(f'player-{i}', f'id-{i}')
+        game.set_current_question(question, 'instance-1')
+        game.changes = []
+        game.submit_answer('id-1', 'instance-1', 'Yes')
+        sizes.append(len(dump_changes(game)))
+    assert sizes[0] == sizes[1] < 200
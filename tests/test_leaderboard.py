@@ -0,0 +1,99 @@
+import bisect
+import random
+
+import pytest
+
+from src.leaderboard import SkipList, Leaderboard, HallOfFame
+from src.models.game import Player, games
+from tests.conftest import create_room
+
+def test_skip_list_matches_a_sorted_list():
+    rng = random.Random(7)
+    skip_list, reference = SkipList(seed=7), []
+    for _ in range(2000):
+        key = rng.randrange(500)
+        if key in reference:
+            skip_list.remove(key)
+            reference.remove(key)
+        else:
+            skip_list.insert(key, str(key))
+            bisect.insort(reference, key)
+        probe = rng.randrange(500)
+        assert skip_list.count_less(probe) == bisect.bisect_left(reference, probe)
+    assert len(skip_list) == len(reference)
+    assert [key for key, _ in skip_list.items()] == reference
+    assert list(skip_list.items(3)) == [(key, str(key)) for key in reference[:3]]
+    assert skip_list.last() == (reference[-1], str(reference[-1]))
+    with pytest.raises(KeyError):
+        skip_list.remove(501)
+
+def test_ties_share_a_rank():
+    board = Leaderboard()
+    for member, score in [('a', 3), ('b', 2), ('c', 2), ('d', 0)]:
+        board.update(member, score)
+    assert board.top(10) == [(1, 'a', 3), (2, 'b', 2), (2, 'c', 2), (4, 'd', 0)]
+    assert [board.rank(member) for member in 'abcd'] == [1, 2, 2, 4]
+    assert board.top(2) == [(1, 'a', 3), (2, 'b', 2)]
+
+def test_updates_and_removals_reorder_the_board():
+    board = Leaderboard()
+    for member in 'abc':
+        board.update(member, 1)
+    board.update('c', 5)
+    board.update('a', 1) # Unchanged score keeps its place
+    assert board.top(10) == [(1, 'c', 5), (2, 'a', 1), (2, 'b', 1)]
+    board.remove('c')
+    board.remove('missing')
+    assert 'c' not in board and len(board) == 2
+    assert board.rank('b') == 1 and board.score('c') is None and board.rank('c') is None
+
+def test_a_full_board_keeps_only_the_best():
+    board = Leaderboard(capacity=3)
+    for member, score in [('a', 1), ('b', 4), ('c', 2), ('d', 3), ('e', 1)]:
+        board.update(member, score)
+    assert board.top(10) == [(1, 'b', 4), (2, 'd', 3), (3, 'c', 2)]
+    assert 'a' not in board and 'e' not in board
+
+def test_hall_of_fame_evicts_the_lowest_score():
+    hall = HallOfFame(size=2)
+    players = [Player(f'id-{i}', f'name-{i}', i) for i in range(4)]
+    for player, score in zip(players, [2, 0, 5, 3]):
+        player.score = score
+        hall.record('R00020', player)
+    assert [(entry['player_name'], entry['score']) for entry in hall.top(10)] == [('name-2', 5), ('name-3', 3)]
+    assert hall.rank('R00020', players[0]) is None
+    assert len(hall) == 2
+
+def play_scores(client, scores):
+    """Play a room so that player i ends on scores[i] points."""
+    room_id, player_ids = create_room(client, players=len(scores), num_questions=max(scores))
+    client.post('/start_game', json={"room_id": room_id})
+    for round_number in range(max(scores)):
+        question = client.get(f'/room_state/{room_id}').get_json()['current_question']
+        correct = games[room_id].get_current_question()['correct_answer']
+        wrong = next(option for option in question['options'] if option != correct)
+        for player_id, score in zip(player_ids, scores):
+            client.post('/submit_answer', json={"room_id": room_id, "player_id": player_id, "question_id": question['id'],
+                                                "answer": correct if round_number < score else wrong})
+    return room_id, player_ids
+
+def test_leaderboard_endpoints(client):
+    room_id, player_ids = play_scores(client, [3, 2, 2, 0])
+    board = client.get(f'/leaderboard/{room_id}').get_json()
+    assert [(p['rank'], p['player_name'], p['score']) for p in board['players']] == [
+        (1, 'player-0', 3), (2, 'player-1', 2), (2, 'player-2', 2), (4, 'player-3', 0)]
+    assert board['total_players'] == 4
+    assert len(client.get(f'/leaderboard/{room_id}?limit=1').get_json()['players']) == 1
+
+    rank = client.get(f'/leaderboard/{room_id}/rank?player_name=player-2').get_json()
+    assert (rank['rank'], rank['score'], rank['player_id']) == (2, 2, player_ids[2])
+    assert rank['hall_of_fame_rank'] is not None
+    assert client.get(f'/leaderboard/{room_id}/rank?player_name=nobody').status_code == 404
+    assert client.get(f'/leaderboard/{room_id}/rank').status_code == 400
+    assert client.get('/leaderboard/ZZZZZZ').status_code == 404
+
+    hall = client.get('/hall_of_fame?limit=100').get_json()
+    scores = [entry['score'] for entry in hall['entries']]
+    assert scores == sorted(scores, reverse=True)
+    ours = {entry['player_name']: entry['score'] for entry in hall['entries'] if entry['room_id'] == room_id}
+    assert ours == {'player-0': 3, 'player-1': 2, 'player-2': 2} # Zero scores are not recorded
@@ -0,0 +1,54 @@
+import pytest
+import requests
+
+from src.question_bank import QuestionBank
+from src.question_pool import question_pool, parse_filter, InvalidFilterError
+from src.trivia_client import trivia_client
+from tests.conftest import create_room
+
+@pytest.mark.parametrize('query', ['category=science', 'category=999', 'difficulty=impossible', 'type=essay'])
+def test_unknown_filters_are_rejected_before_touching_the_pool(client, query):
+    buffers = set(question_pool.buffers)
+    pending = len(question_pool.pending)
+    response = client.get(f'/question?{query}')
+    assert response.status_code == 400
+    assert set(question_pool.buffers) == buffers
+    assert len(question_pool.pending) == pending
+
+def test_known_filters_are_served(client):
+    response = client.get('/question?category=9&difficulty=easy&type=boolean')
+    assert response.status_code == 200
+    assert response.get_json()['type'] == 'boolean'
+
+def test_parse_filter_normalizes_category_ids():
+    assert parse_filter('easy', 9) == ('easy', '9', 'multiple')
+    assert parse_filter(None, '', None) == ('any', 'any', 'multiple')
+    with pytest.raises(InvalidFilterError):
+        parse_filter('any', 'science')
+
+def test_create_room_rejects_unknown_category(client):
+    response = client.post('/create_room', json={"player_name": "host", "category": "science"})
+    assert response.status_code == 400
+
+def test_failed_question_load_leaves_the_room_in_the_lobby(client, monkeypatch):
+    room_id, _ = create_room(client, category=23)
+    def failing_fetch(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("opentdb is down")
+    monkeypatch.setattr(trivia_client, 'fetch', failing_fetch)
+    assert client.post('/start_game', json={"room_id": room_id}).status_code == 500
+    state = client.get(f'/room_state/{room_id}').get_json()
+    assert not state['game_started'] and not state['game_ended']
+
+    monkeypatch.undo()
+    response = client.post('/start_game', json={"room_id": room_id})
+    assert response.status_code == 200
+    assert response.get_json()['question']['question']
+
+def test_bank_has_no_match_for_a_category_name(tmp_path):
+    bank = QuestionBank(str(tmp_path / 'questions.db'))
+    bank.add_questions([{
+        "category": "History", "type": "multiple", "difficulty": "easy", "question": "Q?",
+        "correct_answer": "A", "incorrect_answers": ["B", "C", "D"]
+    }])
+    assert bank.draw(1, 'any', 'science') == []
+    assert len(bank.draw(1, 'any', '23')) == 1
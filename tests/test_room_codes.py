@@ -0,0 +1,26 @@
+import pytest
+
+from src.room_codes import RoomCodeAllocator, CODE_ALPHABET, SEQUENCE_SPACE, shard_of
+
+def test_codes_carry_their_shard():
+    for shard_id in (0, 7, 35):
+        allocator = RoomCodeAllocator(shard_id)
+        for _ in range(100):
+            code = allocator.allocate()
+            assert len(code) == 6 and set(code) <= set(CODE_ALPHABET)
+            assert code[0] == CODE_ALPHABET[shard_id] and shard_of(code) == shard_id
+
+def test_codes_do_not_repeat_within_a_shard():
+    # Started just before the sequence wraps, to cover the modular step too
+    allocator = RoomCodeAllocator(3, start=SEQUENCE_SPACE - 100000)
+    codes = [allocator.allocate() for _ in range(200000)]
+    assert len(set(codes)) == len(codes)
+
+@pytest.mark.parametrize('shard_id', [-1, 36])
+def test_shard_ids_outside_the_alphabet_are_rejected(shard_id):
+    with pytest.raises(ValueError):
+        RoomCodeAllocator(shard_id)
+
+@pytest.mark.parametrize('room_id', [None, '', 'ABC', 'ABCDEFG', '-BCDEF'])
+def test_foreign_codes_have_no_shard(room_id):
+    assert shard_of(room_id) is None
@@ -0,0 +1,48 @@
+import pytest
+
+import src.routes.game as game_routes
+from src.config import ROOM_TTLS
+from src.models.game import games
+from src.room_expiry import RoomExpiry
+from tests.conftest import create_room
+
+@pytest.fixture
+def expiry(monkeypatch):
+    expiry = RoomExpiry()
+    monkeypatch.setattr(game_routes, 'room_expiry', expiry)
+    return expiry
+
+def play_to_the_end(client, room_id, player_ids):
+    client.post('/start_game', json={"room_id": room_id})
+    while True:
+        state = client.get(f'/room_state/{room_id}').get_json()
+        if state['game_ended']:
+            return
+        for player_id in player_ids:
+            client.post('/submit_answer', json={
+                "room_id": room_id,
+                "player_id": player_id,
+                "question_id": state['current_question']['id'],
+                "answer": state['current_question']['options'][0]
+            })
+
+def test_ended_rooms_expire_on_the_ended_ttl(client, expiry):
+    assert ROOM_TTLS['ended'] < ROOM_TTLS['lobby']
+    room_id, player_ids = create_room(client, players=2, num_questions=2)
+    play_to_the_end(client, room_id, player_ids)
+    ended_at = games[room_id].last_activity.timestamp()
+
+    assert expiry.tick(now=ended_at + ROOM_TTLS['ended'] - 1) == 0
+    assert room_id in games
+    assert expiry.tick(now=ended_at + ROOM_TTLS['ended'] + 1) == 1
+    assert room_id not in games
+
+def test_superseded_entries_are_skipped(client, expiry):
+    room_id, player_ids = create_room(client, num_questions=1)
+    play_to_the_end(client, room_id, player_ids)
+    assert expiry.get_stats()['tracked'] == 1
+    assert len(expiry.heap) == 2 # The lobby entry is still queued behind the ended one
+
+    expiry.tick(now=games[room_id].last_activity.timestamp() + max(ROOM_TTLS.values()) + 1)
+    assert expiry.heap == [] and expiry.scheduled == {}
+    assert expiry.get_stats()['rescheduled_total'] == 0
@@ -0,0 +1,42 @@
+import threading
+import time
+
+import requests
+
+from src.trivia_client import trivia_client
+from tests.conftest import create_room
+
+def polls_per_second(client, room_ids, seconds=0.5):
+    polls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        response = client.get(f'/room_state/{room_ids[polls % len(room_ids)]}')
+        assert response.status_code == 200
+        polls += 1
+    return polls / (time.perf_counter() - started)
+
+def test_polling_other_rooms_stays_flat_while_one_room_waits_on_opentdb(app, client, monkeypatch):
+    stuck_room, _ = create_room(client)
+    other_rooms = [create_room(client)[0] for _ in range(20)]
+    baseline = polls_per_second(client, other_rooms)
+
+    fetching = threading.Event()
+    release = threading.Event()
+    def slow_fetch(*args, **kwargs):
+        # Stands in for opentdb hanging until the 10 s timeout, while start_game holds the room lock
+        fetching.set()
+        release.wait(10)
+        raise requests.exceptions.Timeout("opentdb did not answer")
+    monkeypatch.setattr(trivia_client, 'fetch', slow_fetch)
+
+    starter = threading.Thread(target=app.test_client().post, args=('/start_game',), kwargs={"json": {"room_id": stuck_room}})
+    starter.start()
+    try:
+        assert fetching.wait(5)
+        during = polls_per_second(client, other_rooms)
+        assert starter.is_alive() # Still stuck for the whole measurement
+    finally:
+        release.set()
+        starter.join(10)
+
+    assert during >= 0.5 * baseline, f"{during:.0f} polls/s while one room was stuck vs {baseline:.0f} before"
@@ -0,0 +1,45 @@
+import threading
+import time
+
+from tests.conftest import create_room
+
+def test_unchanged_room_answers_304(client):
+    room_id, _ = create_room(client)
+    first = client.get(f'/room_state/{room_id}')
+    etag = first.headers['ETag']
+    again = client.get(f'/room_state/{room_id}', headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b''
+    assert again.headers['ETag'] == etag
+
+    client.post('/join_room', json={"room_id": room_id, "player_name": "newcomer"})
+    changed = client.get(f'/room_state/{room_id}', headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert 'newcomer' in [p['name'] for p in changed.get_json()['players']]
+
+def test_long_poll_returns_on_change(app, client):
+    room_id, _ = create_room(client)
+    version = int(client.get(f'/room_state/{room_id}').headers['X-Room-Version'])
+    timer = threading.Timer(0.2, lambda: app.test_client().post('/join_room', json={"room_id": room_id, "player_name": "late"}))
+    timer.start()
+
+    started = time.monotonic()
+    response = client.get(f'/room_state/{room_id}?since={version}&timeout=10')
+    assert time.monotonic() - started < 5
+    assert int(response.headers['X-Room-Version']) > version
+    assert 'late' in [p['name'] for p in response.get_json()['players']]
+    timer.join()
+
+def test_long_poll_times_out_unchanged(client):
+    room_id, _ = create_room(client)
+    version = int(client.get(f'/room_state/{room_id}').headers['X-Room-Version'])
+    started = time.monotonic()
+    response = client.get(f'/room_state/{room_id}?since={version}&timeout=0.3')
+    assert 0.3 <= time.monotonic() - started < 3
+    assert response.status_code == 200 and int(response.headers['X-Room-Version']) == version
+
+def test_stale_since_answers_at_once(client):
+    room_id, _ = create_room(client)
+    version = int(client.get(f'/room_state/{room_id}').headers['X-Room-Version'])
+    started = time.monotonic()
+    response = client.get(f'/room_state/{room_id}?since={version - 1}&timeout=10')
+    assert time.monotonic() - started < 1 and response.status_code == 200
@@ -0,0 +1,32 @@
+import time
+
+import src.routes.game as game_routes
+from src.models.game import games
+from tests.conftest import create_room
+
+def events(game, name):
+    return [data for _, event, data in game.events if event == name]
+
+def test_deadlines_advance_rounds_and_end_the_game(client):
+    room_id, player_ids = create_room(client, players=3, num_questions=2, time_limit=5)
+    client.post('/start_game', json={"room_id": room_id})
+    state = client.get(f'/room_state/{room_id}').get_json()
+    assert 0 < state['round_deadline'] - time.time() <= 5
+    client.post('/submit_answer', json={"room_id": room_id, "player_id": player_ids[0],
+                                        "question_id": state['current_question']['id'],
+                                        "answer": state['current_question']['options'][0]})
+
+    game_routes.expire_round(room_id, 1) # What the round timer calls once the deadline passes
+    game = games[room_id]
+    assert game.current_question_index == 2 and not game.game_ended
+    assert events(game, 'round_timeout') == [{"current_question_index": 1, "missed": ['player-1', 'player-2']}]
+    assert events(game, 'question')[-1]['current_question_index'] == 2
+
+    version = game.version
+    game_routes.expire_round(room_id, 1) # A stale entry for a round that already moved on
+    assert game.version == version
+
+    game_routes.expire_round(room_id, 2)
+    assert game.game_ended
+    assert events(game, 'round_timeout')[-1]['missed'] == ['player-0', 'player-1', 'player-2']
+    assert client.get(f'/room_state/{room_id}').get_json()['game_ended']
@@ -0,0 +1,81 @@
+import importlib
+import json
+import sys
+
+import pytest
+import requests
+
+from src.room_codes import RoomCodeAllocator
+
+BACKENDS = ['http://node-0', 'http://node-1', 'http://node-2']
+
+class FakeSession:
+    """Answers /submit_answers like a backend would, noting which node got each item."""
+
+    def __init__(self, down=()):
+        self.down = set(down)
+        self.calls = []
+
+    def post(self, url, **kwargs):
+        backend = url[:-len('/submit_answers')]
+        self.calls.append(backend)
+        if backend in self.down:
+            raise requests.exceptions.ConnectionError(f"{backend} is down")
+        response = requests.Response()
+        response.status_code = 200
+        results = [{"status": 200, "backend": backend, "item": item} for item in kwargs['json']['answers']]
+        response._content = json.dumps({"results": results}).encode()
+        return response
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr('src.config.ROUTER_BACKENDS', BACKENDS)
+    monkeypatch.delitem(sys.modules, 'src.router', raising=False)
+    router = importlib.import_module('src.router')
+    yield router
+    sys.modules.pop('src.router', None)
+
+def test_rooms_go_to_the_node_in_their_code(router):
+    for shard_id, backend in enumerate(BACKENDS):
+        assert router.backend_for_room(RoomCodeAllocator(shard_id).allocate()) == backend
+    # Codes for shards the router does not have, or from before sharding, still land somewhere stable
+    for room_id in (RoomCodeAllocator(20).allocate(), 'legacy-room'):
+        assert router.backend_for_room(room_id) == router.backend_for_room(room_id) in BACKENDS
+
+def test_the_ring_spreads_keys_and_moves_few_when_a_node_joins(router):
+    keys = [f'10.0.{i // 256}.{i % 256}' for i in range(3000)]
+    before = {key: router.ring.node_for(key) for key in keys}
+    counts = {backend: list(before.values()).count(backend) for backend in BACKENDS}
+    assert all(count > 600 for count in counts.values()) # Roughly a third each
+    grown = router.HashRing(BACKENDS + ['http://node-3'])
+    moved = [key for key in keys if grown.node_for(key) != before[key]]
+    assert all(grown.node_for(key) == 'http://node-3' for key in moved)
+    assert len(moved) < len(keys) / 2
+
+def submit(router, session, items, monkeypatch):
+    monkeypatch.setattr(router, 'session', lambda: session)
+    response = router.app.test_client().post('/submit_answers', json={"answers": items})
+    assert response.status_code == 200
+    return response.get_json()['results']
+
+def test_batches_are_split_per_node_and_merged_in_order(router, monkeypatch):
+    rooms = [RoomCodeAllocator(shard_id).allocate() for shard_id in (0, 1, 2)]
+    items = [
+        {"room_id": rooms[1], "player_id": "a"},
+        {"room_id": rooms[0], "player_id": "b"},
+        "not an object",
+        {"room_id": rooms[2], "player_id": "c"},
+        {"room_id": [rooms[1]], "player_id": "d"},
+        {"room_id": rooms[1], "player_id": "e"}
+    ]
+    session = FakeSession()
+    results = submit(router, session, items, monkeypatch)
+    assert [result['item'] for result in results] == items
+    assert [result['backend'] for result in results] == [BACKENDS[i] for i in (1, 0, 0, 2, 0, 1)]
+    assert sorted(session.calls) == BACKENDS # One request per node
+
+def test_an_unreachable_node_only_fails_its_own_items(router, monkeypatch):
+    rooms = [RoomCodeAllocator(shard_id).allocate() for shard_id in (0, 1)]
+    items = [{"room_id": rooms[0]}, {"room_id": rooms[1]}, {"room_id": rooms[0]}]
+    results = submit(router, FakeSession(down=[BACKENDS[1]]), items, monkeypatch)
+    assert [result['status'] for result in results] == [200, 502, 200]
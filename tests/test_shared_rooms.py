@@ -0,0 +1,64 @@
+import pickle
+import threading
+import time
+
+import pytest
+
+import src.routes.game as game_routes
+from src.state_store import SQLiteStateStore, dump_room, restore_room
+from tests.conftest import create_room
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = SQLiteStateStore(str(tmp_path / 'rooms.db'))
+    monkeypatch.setattr(game_routes, 'state_store', store)
+    monkeypatch.setattr(game_routes, 'REMOTE_CHANGE_POLL', 0.05)
+    return store
+
+def join_from_another_worker(store, room_id, name):
+    # What a second worker's join_room leaves in the database, without touching this worker's copy
+    version, data = store._conn().execute("SELECT version, data FROM rooms WHERE room_id = ?", (room_id,)).fetchone()
+    game = restore_room(pickle.loads(data))
+    game.add_player(name, f'{name}-id')
+    game.version = version + 1
+    store._conn().execute("UPDATE rooms SET version = ?, data = ? WHERE room_id = ?", (game.version, dump_room(game), room_id))
+    return game.version
+
+def later(delay, fn, *args):
+    timer = threading.Timer(delay, fn, args)
+    timer.start()
+    return timer
+
+def test_long_poll_wakes_on_another_workers_change(client, store):
+    room_id, _ = create_room(client)
+    version = int(client.get(f'/room_state/{room_id}').headers['X-Room-Version'])
+    later(0.2, join_from_another_worker, store, room_id, 'remote')
+
+    started = time.monotonic()
+    response = client.get(f'/room_state/{room_id}?since={version}&timeout=10')
+    assert time.monotonic() - started < 2
+    assert int(response.headers['X-Room-Version']) == version + 1
+    assert 'remote' in [p['name'] for p in response.get_json()['players']]
+
+def test_reloaded_room_sends_a_snapshot_instead_of_an_empty_chunk(client, store):
+    room_id, _ = create_room(client)
+    version = int(client.get(f'/room_state/{room_id}').headers['X-Room-Version'])
+    join_from_another_worker(store, room_id, 'remote')
+
+    response = client.get(f'/room_events/{room_id}', headers={"Last-Event-ID": str(version)}, buffered=False)
+    chunk = next(response.response).decode()
+    response.close()
+    assert 'event: snapshot' in chunk and 'remote' in chunk
+
+def test_event_stream_wakes_on_another_workers_change(client, store):
+    room_id, _ = create_room(client)
+    version = int(client.get(f'/room_state/{room_id}').headers['X-Room-Version'])
+    later(0.2, join_from_another_worker, store, room_id, 'remote')
+
+    started = time.monotonic()
+    # The test client runs the stream up to its first chunk before returning
+    response = client.get(f'/room_events/{room_id}', headers={"Last-Event-ID": str(version)}, buffered=False)
+    chunk = next(response.response).decode()
+    response.close()
+    assert time.monotonic() - started < 2
+    assert f'id: {version + 1}' in chunk and 'remote' in chunk
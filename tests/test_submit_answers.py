@@ -0,0 +1,55 @@
+from src.models.game import games
+from tests.conftest import create_room
+
+def started_room(client, players=3):
+    room_id, player_ids = create_room(client, players=players, num_questions=3)
+    client.post('/start_game', json={"room_id": room_id})
+    question = client.get(f'/room_state/{room_id}').get_json()['current_question']
+    return room_id, player_ids, question
+
+def answer(room_id, player_id, question, **overrides):
+    return dict({"room_id": room_id, "player_id": player_id, "question_id": question['id'],
+                 "answer": question['options'][0]}, **overrides)
+
+def submit(client, items):
+    response = client.post('/submit_answers', json={"answers": items})
+    assert response.status_code == 200
+    return [result['status'] for result in response.get_json()['results']]
+
+def test_results_follow_request_order_across_rooms(client):
+    room_a, players_a, question_a = started_room(client)
+    room_b, players_b, question_b = started_room(client)
+    versions = {room_id: games[room_id].version for room_id in (room_a, room_b)}
+    statuses = submit(client, [
+        answer(room_a, players_a[0], question_a),
+        answer(room_b, players_b[0], question_b),
+        answer(room_a, 'nobody', question_a),
+        answer(room_b, players_b[0], question_b), # Already answered
+        answer('ZZZZZZ', players_a[1], question_a),
+        answer(room_a, players_a[1], question_a)
+    ])
+    assert statuses == [200, 200, 404, 400, 404, 200]
+    assert games[room_a].answered_count == 2 and games[room_b].answered_count == 1
+    # Each accepted answer publishes one change; rejected items leave the rooms alone
+    assert games[room_a].version == versions[room_a] + 2 and games[room_b].version == versions[room_b] + 1
+
+def test_malformed_items_are_rejected_one_by_one(client):
+    room_id, player_ids, question = started_room(client)
+    version = games[room_id].version
+    statuses = submit(client, [
+        answer(room_id, player_ids[0], question),
+        answer(room_id, [player_ids[1]], question),
+        answer([room_id], player_ids[1], question),
+        answer(room_id, player_ids[1], question, answer={"option": 1}),
+        answer(room_id, player_ids[1], question, question_id=True),
+        {"room_id": room_id},
+        "not an object",
+        answer(room_id, player_ids[1], question)
+    ])
+    assert statuses == [200, 400, 400, 400, 400, 400, 400, 200]
+    assert games[room_id].answered_count == 2
+    assert games[room_id].version == version + 2
+
+def test_batch_limits(client):
+    assert client.post('/submit_answers', json={"answers": {}}).status_code == 400
+    assert client.post('/submit_answers', json={"answers": [{}] * 5001}).status_code == 413
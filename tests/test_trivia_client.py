@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+import src.routes.game as game_routes
+from src.trivia_client import TriviaClient, TokenBucket, InvalidResponseError, CircuitOpenError, RateLimitedError
+from tests.conftest import create_room
+
+def opentdb_response(status=200, body=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+    return response
+
+class StubSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+def half_open_client(*responses):
+    client = TriviaClient(retries=0)
+    client.session = StubSession(*responses)
+    client.breaker.record_failure()
+    client.breaker.opened_at = time.monotonic() - client.breaker.reset_timeout - 1 # Due for a probe
+    return client
+
+GOOD = {"response_code": 0, "results": [{"question": "Q?"}]}
+
+@pytest.mark.parametrize('bad', [
+    opentdb_response(200, '<html>Bad gateway</html>'),
+    opentdb_response(200, {"results": []}), # No response_code
+    opentdb_response(200, ["not", "an", "object"])
+])
+def test_unreadable_probe_reopens_the_breaker_instead_of_wedging_it(bad):
+    client = half_open_client(bad, opentdb_response(200, GOOD))
+    with pytest.raises(InvalidResponseError):
+        client.fetch(1)
+    assert not client.breaker.probing
+    assert client.breaker.state == 'open'
+
+    client.breaker.opened_at -= client.breaker.reset_timeout + 1
+    assert client.fetch(1) == GOOD["results"]
+    assert client.breaker.state == 'closed'
+
+def test_unreadable_responses_are_retried_like_server_errors():
+    client = TriviaClient(retries=1, backoff=0)
+    client.session = StubSession(opentdb_response(200, '<html></html>'), opentdb_response(200, GOOD))
+    assert client.fetch(1) == GOOD["results"]
+    assert client.session.calls == 2
+
+def test_client_errors_do_not_count_against_the_breaker():
+    client = TriviaClient(retries=2, backoff=0)
+    client.session = StubSession(opentdb_response(400, {}))
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.fetch(1)
+    assert client.session.calls == 1
+    assert client.breaker.failures == 0
+
+class BlockingSession(StubSession):
+    """Holds every call until `release` is set."""
+
+    def __init__(self, *responses):
+        super().__init__(*responses)
+        self.release = threading.Event()
+
+    def get(self, url, params=None, timeout=None):
+        self.release.wait(5)
+        return super().get(url, params, timeout)
+
+def start_leader(client, max_wait):
+    leader = threading.Thread(target=client.fetch, args=(1,), kwargs={"max_wait": max_wait})
+    leader.start()
+    while not client.in_flight:
+        time.sleep(0.01)
+    return leader
+
+def test_followers_do_not_wait_out_a_longer_rate_limit_wait():
+    client = TriviaClient(retries=0)
+    client.session = StubSession(opentdb_response(200, GOOD))
+    client.bucket = TokenBucket(1, 1)
+    client.bucket.try_acquire() # Next token in a second
+    leader = start_leader(client, max_wait=2) # Like the pool refiller
+
+    started = time.monotonic()
+    with pytest.raises(RateLimitedError):
+        client.fetch(1) # A request handler: max_wait=0
+    assert time.monotonic() - started < 0.5
+    leader.join()
+
+def test_followers_give_up_after_their_own_deadline(monkeypatch):
+    monkeypatch.setattr('src.trivia_client.REQUEST_TIMEOUT', 0.2)
+    client = TriviaClient(retries=0)
+    client.session = BlockingSession(opentdb_response(200, GOOD))
+    leader = start_leader(client, max_wait=0)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        client.fetch(1)
+    client.session.release.set()
+    leader.join()
+
+def test_start_game_reports_a_failing_fast_upstream_as_unavailable(client, monkeypatch):
+    def circuit_open(game):
+        raise CircuitOpenError("Trivia API circuit is open", 7)
+    monkeypatch.setattr(game_routes, 'reserve_questions', circuit_open)
+    monkeypatch.setattr(game_routes, 'fallback_question', lambda game: None)
+    room_id, _ = create_room(client)
+    response = client.post('/start_game', json={"room_id": room_id})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '8'